@@ -8,10 +8,17 @@ import os
 # 必须在导入 transformers 之前设置
 os.environ["HF_ENDPOINT"] = "https://hf-mirror.com"
 
-import tempfile
-from PIL import Image
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from PIL import Image, ImageOps
 import numpy as np
 
+from . import config
+from .services import clip_onnx
+from .services.batching import MicroBatcher
+
 # [优化] 延迟导入: 不要在文件开头导入 PyTorch/NudeNet/Transformers
 # 否则会导致服务启动极慢，甚至在低内存服务器上直接 OOM
 # from nudenet import NudeDetector
@@ -34,6 +41,29 @@ _openai_clip_model = None
 _openai_clip_processor = None
 # 参考地图缓存
 _reference_map = None
+# CLIP 标签文本向量缓存: {(模型 ID, 标签列表哈希): 归一化后的文本向量矩阵}
+# 标签是常量，文本塔只需在加载模型时计算一次，之后每张图片只跑图像塔
+_text_embedding_cache = {}
+
+# ONNX 图像塔 (AUDIT_CLIP_BACKEND=onnx): {模型 ID: OnnxVisionTower，加载失败时为 False 表示回退 torch}
+_onnx_towers = {}
+_onnx_lock = threading.Lock()
+
+# 推理微批处理器 (按模型懒加载)，并发审核时合并为一次批量前向
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+# 模型加载锁: 并发的首次调用只有一个线程加载，其余等待同一个结果
+_load_locks = {name: threading.Lock() for name in ("nudenet", "chinese_clip", "openai_clip")}
+
+# 启动预热 (AUDIT_PRELOAD_MODELS): 各模型的状态与耗时，预热结束后置位 _models_ready
+_model_status = {}
+_model_status_lock = threading.Lock()
+_models_ready = threading.Event()
+_warmup_thread = None
+
+CHINESE_CLIP_MODEL_ID = "OFA-Sys/chinese-clip-vit-base-patch16"
+OPENAI_CLIP_MODEL_ID = "openai/clip-vit-base-patch32"
 
 UNSAFE_NUDENET_LABELS = {
     "BUTTOCKS_EXPOSED",
@@ -85,6 +115,13 @@ CHINESE_UNSAFE_LABELS = [
 
 CHINESE_ALL_LABELS = CHINESE_SAFE_LABELS + CHINESE_UNSAFE_LABELS
 
+# [Fix] 分类别阈值：地图检测更敏感，旗帜检测更严格 (TOP 标签为不安全标签且概率超过阈值时拦截)
+CHINESE_THRESHOLDS = {
+    "一张缺少台湾的错误中国地图": 0.40,  # 地图检测需要更敏感
+    "台独港独藏独旗帜": 0.60,            # 旗帜检测保持严格
+}
+CHINESE_DEFAULT_THRESHOLD = 0.50
+
 # ==================== OpenAI CLIP 标签 (通用内容检测 - 英文) ====================
 OPENAI_SAFE_LABELS = [
     "a natural landscape photo",
@@ -117,6 +154,70 @@ OPENAI_UNSAFE_LABELS = [
 ]
 
 OPENAI_ALL_LABELS = OPENAI_SAFE_LABELS + OPENAI_UNSAFE_LABELS
+OPENAI_THRESHOLD = 0.50
+
+# ==================== 级联预筛原型 (OpenAI CLIP) ====================
+# 与 OpenAI 标签一起计算，覆盖 NudeNet / Chinese-CLIP 负责的风险类别；
+# 这些原型加上 OPENAI_UNSAFE_LABELS 的概率之和即预筛得分，得分很低的图片可以跳过重模型
+PRESCREEN_UNSAFE_LABELS = [
+    "a nude or sexually explicit photo",
+    "a photo of exposed breasts or genitals",
+    "a person in underwear or swimwear",
+    "a separatist independence flag",
+    "a political protest or propaganda poster",
+]
+OPENAI_SCREEN_LABELS = OPENAI_ALL_LABELS + PRESCREEN_UNSAFE_LABELS
+
+def verdict_version() -> str:
+    """
+    审核结论的版本: AUDIT_MODEL_VERSION + 模型 ID 与标签集的哈希
+
+    模型或标签变化时版本随之变化，结论缓存中旧版本的条目不再命中；
+    阈值 / 判定逻辑变化时手动递增 AUDIT_MODEL_VERSION。
+    """
+    signature = "\n".join([
+        "nudenet", *sorted(UNSAFE_NUDENET_LABELS),
+        CHINESE_CLIP_MODEL_ID, *CHINESE_ALL_LABELS, *CHINESE_UNSAFE_LABELS,
+        OPENAI_CLIP_MODEL_ID, *OPENAI_ALL_LABELS, *OPENAI_UNSAFE_LABELS, *PRESCREEN_UNSAFE_LABELS,
+        f"cascade={config.AUDIT_CASCADE_ENABLED}:{config.AUDIT_CASCADE_SAFE_THRESHOLD}",
+    ])
+    return f"{config.AUDIT_MODEL_VERSION}-{clip_onnx.labels_hash([signature])[:12]}"
+
+def is_cacheable_result(result: dict) -> bool:
+    """模型出错时的结果 (details 含 *_error) 不缓存，下次上传时重新审核"""
+    return not any(key.endswith("_error") for key in result.get("details", {}))
+
+# 预处理后短边不小于该值: CLIP 缩放到短边 224，NudeNet 缩放到长边 320，留 2 倍余量减小二次缩放的误差
+PREPROCESS_MIN_SIDE = 448
+# 小于该尺寸的图片跳过审核 (CLIP 处理 1x1 这类图片会报错)
+MIN_AUDIT_SIZE = 10
+
+@dataclass
+class PreparedImage:
+    """解码一次、各审核阶段共用的图片"""
+    array: np.ndarray           # RGB uint8 (H, W, 3)，已按 EXIF 方向旋转并缩小
+    original_size: tuple        # 原图 (宽, 高)
+
+    def bgr(self) -> np.ndarray:
+        """NudeNet (OpenCV 约定) 使用的 BGR 连续数组"""
+        return np.ascontiguousarray(self.array[:, :, ::-1])
+
+def prepare_image(content) -> PreparedImage:
+    """
+    解码图片一次: JPEG 用 draft 在 DCT 阶段按 1/2~1/8 缩小解码，其他格式解码后用 reduce 整数倍缩小，
+    再应用 EXIF 方向并转为 RGB。缩小后短边不小于 PREPROCESS_MIN_SIDE。
+    """
+    image = Image.open(io.BytesIO(content))
+    original_size = image.size
+    if image.format == "JPEG":
+        image.draft("RGB", (PREPROCESS_MIN_SIDE, PREPROCESS_MIN_SIDE))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    factor = min(image.size) // PREPROCESS_MIN_SIDE
+    if factor >= 2:
+        image = image.reduce(factor)
+    return PreparedImage(array=np.asarray(image), original_size=original_size)
 
 def check_taiwan_region(image: Image.Image) -> dict:
     """
@@ -213,13 +314,15 @@ def check_taiwan_region(image: Image.Image) -> dict:
 def get_nude_detector():
     global _nude_detector
     if _nude_detector is None:
-        print("⏳ [系统] 初始化 NudeNet...", flush=True)
-        try:
-            from nudenet import NudeDetector
-            _nude_detector = NudeDetector()
-        except ImportError as e:
-            print(f"❌ [系统] NudeNet 导入失败: {e}", flush=True)
-            return None
+        with _load_locks["nudenet"]:
+            if _nude_detector is None:
+                print("⏳ [系统] 初始化 NudeNet...", flush=True)
+                try:
+                    from nudenet import NudeDetector
+                    _nude_detector = NudeDetector()
+                except ImportError as e:
+                    print(f"❌ [系统] NudeNet 导入失败: {e}", flush=True)
+                    return None
     return _nude_detector
 
 def get_chinese_clip():
@@ -227,44 +330,50 @@ def get_chinese_clip():
     global _chinese_clip_model, _chinese_clip_processor
     
     if _chinese_clip_model is None or _chinese_clip_processor is None:
-        print("⏳ [系统] 初始化 Chinese-CLIP (阿里达摩院版)...", flush=True)
-        try:
-            import torch
+        with _load_locks["chinese_clip"]:
+            if _chinese_clip_model is not None and _chinese_clip_processor is not None:
+                return _chinese_clip_model, _chinese_clip_processor
+            print("⏳ [系统] 初始化 Chinese-CLIP (阿里达摩院版)...", flush=True)
             try:
-                # 优先尝试官方推荐的专用类
-                from transformers import ChineseCLIPProcessor, ChineseCLIPModel
-                ModelClass = ChineseCLIPModel
-                ProcessorClass = ChineseCLIPProcessor
-            except ImportError:
-                # 兼容旧版本 transformers：尝试使用 Auto 类
-                print("⚠️ [系统] transformers 版本不支持 ChineseCLIPProcessor，尝试使用 AutoProcessor...", flush=True)
-                from transformers import AutoProcessor, AutoModel
-                ModelClass = AutoModel
-                ProcessorClass = AutoProcessor
-
-            model_id = "OFA-Sys/chinese-clip-vit-base-patch16"
-            # [Fix] 使用临时变量，确保加载完全成功后再赋值给全局变量
-            # [Fix 2] 添加 attn_implementation='eager' 解决 transformers 4.50+ 的 meta device bug
-            # [Fix 3] 强制 device_map="cpu"，防止权重停留在 meta device
-            model = ModelClass.from_pretrained(
-                model_id, 
-                low_cpu_mem_usage=True, 
-                device_map="cpu",
-                attn_implementation="eager"
-            )
-            processor = ProcessorClass.from_pretrained(model_id)
+                import torch
+                try:
+                    # 优先尝试官方推荐的专用类
+                    from transformers import ChineseCLIPProcessor, ChineseCLIPModel
+                    ModelClass = ChineseCLIPModel
+                    ProcessorClass = ChineseCLIPProcessor
+                except ImportError:
+                    # 兼容旧版本 transformers：尝试使用 Auto 类
+                    print("⚠️ [系统] transformers 版本不支持 ChineseCLIPProcessor，尝试使用 AutoProcessor...", flush=True)
+                    from transformers import AutoProcessor, AutoModel
+                    ModelClass = AutoModel
+                    ProcessorClass = AutoProcessor
+
+                model_id = CHINESE_CLIP_MODEL_ID
+                # [Fix] 使用临时变量，确保加载完全成功后再赋值给全局变量
+                # [Fix 2] 添加 attn_implementation='eager' 解决 transformers 4.50+ 的 meta device bug
+                # [Fix 3] 强制 device_map="cpu"，防止权重停留在 meta device
+                model = ModelClass.from_pretrained(
+                    model_id, 
+                    low_cpu_mem_usage=True, 
+                    device_map="cpu",
+                    attn_implementation="eager"
+                )
+                processor = ProcessorClass.from_pretrained(model_id)
             
-            _chinese_clip_model = model
-            _chinese_clip_processor = processor
-            print("✅ [系统] Chinese-CLIP 加载完成 (中国政治内容检测)", flush=True)
-        except Exception as e:
-            # 降级处理：不影响主流程，只打印警告
-            print(f"⚠️ [系统] Chinese-CLIP 加载失败: {e}", flush=True)
-            print("   (将跳过中国政治内容检测，仅使用 OpenAI CLIP)", flush=True)
-            # 确保全局变量重置为 None，防止部分加载
-            _chinese_clip_model = None
-            _chinese_clip_processor = None
-            return None, None
+                # [Perf] 加载时预先计算标签文本向量
+                get_label_text_embeddings(model, processor, CHINESE_CLIP_MODEL_ID, CHINESE_ALL_LABELS)
+            
+                _chinese_clip_model = model
+                _chinese_clip_processor = processor
+                print("✅ [系统] Chinese-CLIP 加载完成 (中国政治内容检测)", flush=True)
+            except Exception as e:
+                # 降级处理：不影响主流程，只打印警告
+                print(f"⚠️ [系统] Chinese-CLIP 加载失败: {e}", flush=True)
+                print("   (将跳过中国政治内容检测，仅使用 OpenAI CLIP)", flush=True)
+                # 确保全局变量重置为 None，防止部分加载
+                _chinese_clip_model = None
+                _chinese_clip_processor = None
+                return None, None
     return _chinese_clip_model, _chinese_clip_processor
 
 def get_openai_clip():
@@ -272,84 +381,294 @@ def get_openai_clip():
     global _openai_clip_model, _openai_clip_processor
         
     if _openai_clip_model is None or _openai_clip_processor is None:
-        print("⏳ [系统] 初始化 OpenAI CLIP...", flush=True)
-        try:
-            # [Lazy Import]
-            from transformers import CLIPProcessor, CLIPModel
-            import torch
-
-            model_id = "openai/clip-vit-base-patch32"
-            # [FIX] 使用临时变量，防止部分加载导致全局状态不一致
-            # 添加 device_map="cpu" 强制加载到 CPU，避免 meta device 错误
-            model = CLIPModel.from_pretrained(
-                model_id, 
-                low_cpu_mem_usage=True, 
-                device_map="cpu"
-            )
-            # model.to('cpu') # 不需要手动 to('cpu')，device_map 会处理
-            processor = CLIPProcessor.from_pretrained(model_id)
+        with _load_locks["openai_clip"]:
+            if _openai_clip_model is not None and _openai_clip_processor is not None:
+                return _openai_clip_model, _openai_clip_processor
+            print("⏳ [系统] 初始化 OpenAI CLIP...", flush=True)
+            try:
+                # [Lazy Import]
+                from transformers import CLIPProcessor, CLIPModel
+                import torch
+
+                model_id = OPENAI_CLIP_MODEL_ID
+                # [FIX] 使用临时变量，防止部分加载导致全局状态不一致
+                # 添加 device_map="cpu" 强制加载到 CPU，避免 meta device 错误
+                model = CLIPModel.from_pretrained(
+                    model_id, 
+                    low_cpu_mem_usage=True, 
+                    device_map="cpu"
+                )
+                # model.to('cpu') # 不需要手动 to('cpu')，device_map 会处理
+                processor = CLIPProcessor.from_pretrained(model_id)
             
-            _openai_clip_model = model
-            _openai_clip_processor = processor
-            print("✅ [系统] OpenAI CLIP 加载完成 (通用内容检测)", flush=True)
-        except Exception as e:
-            print(f"❌ [系统] OpenAI CLIP 加载失败: {e}", flush=True)
-            _openai_clip_model = None
-            _openai_clip_processor = None
-            return None, None
+                # [Perf] 加载时预先计算标签文本向量
+                get_label_text_embeddings(model, processor, OPENAI_CLIP_MODEL_ID, OPENAI_SCREEN_LABELS)
+            
+                _openai_clip_model = model
+                _openai_clip_processor = processor
+                print("✅ [系统] OpenAI CLIP 加载完成 (通用内容检测)", flush=True)
+            except Exception as e:
+                print(f"❌ [系统] OpenAI CLIP 加载失败: {e}", flush=True)
+                _openai_clip_model = None
+                _openai_clip_processor = None
+                return None, None
     return _openai_clip_model, _openai_clip_processor
 
-def check_image_safety(content: bytes, threshold: float = 0.50) -> dict:
-    # 强制打印，确保用户能看到
-    print("\n🔍 [Audit] 开始新一轮图片审计 (Powered by NudeNet & CLIP & 地图检测)...", flush=True)
-    
-    # [FIX] 解决 check_image_safety 中使用 torch.no_grad() 但未导入 torch 的问题
+def get_label_text_embeddings(model, processor, model_id: str, labels: list):
+    """
+    获取标签列表的归一化文本向量 (按模型 ID + 标签列表哈希缓存)
+
+    标签列表变化时哈希随之变化，自动重新计算。
+    """
+    import torch
+
+    key = (model_id, clip_onnx.labels_hash(labels))
+    text_embeds = _text_embedding_cache.get(key)
+    if text_embeds is None:
+        inputs = processor(text=labels, return_tensors="pt", padding=True)
+        with torch.no_grad():
+            text_embeds = model.get_text_features(**inputs)
+        text_embeds = text_embeds / text_embeds.norm(p=2, dim=-1, keepdim=True)
+        _text_embedding_cache[key] = text_embeds
+    return text_embeds
+
+def encode_texts(name: str, texts: list):
+    """
+    任意文本的归一化 CLIP 文本向量 np.ndarray [N, dim] (图库语义搜索用，不缓存)
+
+    name: 向量存储名 (chinese_clip / openai_clip)。只运行文本塔；ONNX 后端下会按需重新加载 torch 模型。
+    """
+    import torch
+
+    model, processor = (get_chinese_clip if name == "chinese_clip" else get_openai_clip)()
+    if model is None:
+        raise RuntimeError(f"{name} 加载失败，无法计算文本向量")
+    inputs = processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+    with torch.no_grad():
+        text_embeds = model.get_text_features(**inputs)
+    return (text_embeds / text_embeds.norm(p=2, dim=-1, keepdim=True)).numpy()
+
+def clip_scores_batch(model, processor, model_id: str, images: list, labels: list) -> tuple:
+    """
+    批量计算多张图片在各标签上的概率 (每张与 model(text=labels, images=image) 的 logits_per_image.softmax 等价)
+
+    只运行图像塔，再与缓存的文本向量做矩阵乘法并乘以 logit_scale。
+
+    Returns:
+        (概率列表, 归一化图像向量 np.ndarray [N, dim])
+    """
+    import torch
+
+    text_embeds = get_label_text_embeddings(model, processor, model_id, labels)
+    inputs = processor(images=images, return_tensors="pt")
+    with torch.no_grad():
+        image_embeds = model.get_image_features(**inputs)
+        image_embeds = image_embeds / image_embeds.norm(p=2, dim=-1, keepdim=True)
+        logits_per_image = model.logit_scale.exp() * image_embeds @ text_embeds.t()
+    return logits_per_image.softmax(dim=1).tolist(), image_embeds.numpy()
+
+def clip_label_probs_batch(model, processor, model_id: str, images: list, labels: list) -> list:
+    """批量计算多张图片在各标签上的概率"""
+    return clip_scores_batch(model, processor, model_id, images, labels)[0]
+
+def clip_label_probs(model, processor, model_id: str, image: Image.Image, labels: list) -> list:
+    """计算单张图片在各标签上的概率"""
+    return clip_label_probs_batch(model, processor, model_id, [image], labels)[0]
+
+def _release_torch_clip(model_id: str):
+    """ONNX 图像塔就绪后释放对应的 torch 模型 (导出时加载的)，降低常驻内存"""
+    global _chinese_clip_model, _chinese_clip_processor, _openai_clip_model, _openai_clip_processor
+    if model_id == CHINESE_CLIP_MODEL_ID:
+        _chinese_clip_model = _chinese_clip_processor = None
+    else:
+        _openai_clip_model = _openai_clip_processor = None
+    for key in [k for k in _text_embedding_cache if k[0] == model_id]:
+        del _text_embedding_cache[key]
+
+def get_onnx_vision_tower(model_id: str):
+    """
+    获取 ONNX 图像塔 (AUDIT_CLIP_BACKEND=onnx 时)，未启用或加载失败时返回 None，调用方使用 torch 路径
+    """
+    if config.AUDIT_CLIP_BACKEND != "onnx":
+        return None
+    tower = _onnx_towers.get(model_id)
+    if tower is None:
+        with _onnx_lock:
+            tower = _onnx_towers.get(model_id)
+            if tower is None:
+                loader, labels = {
+                    CHINESE_CLIP_MODEL_ID: (get_chinese_clip, CHINESE_ALL_LABELS),
+                    OPENAI_CLIP_MODEL_ID: (get_openai_clip, OPENAI_SCREEN_LABELS),
+                }[model_id]
+                try:
+                    tower = clip_onnx.load_vision_tower(
+                        model_id, labels, loader,
+                        lambda model, processor: get_label_text_embeddings(model, processor, model_id, labels),
+                        config.AUDIT_ONNX_QUANTIZE,
+                    )
+                except Exception as e:
+                    print(f"⚠️ [系统] {model_id} ONNX 后端加载失败，回退到 torch: {e}", flush=True)
+                    tower = None
+                if tower is not None:
+                    _release_torch_clip(model_id)
+                _onnx_towers[model_id] = tower or False
+    return tower or None
+
+def clip_available(model_id: str) -> bool:
+    """CLIP 模型是否可用 (ONNX 图像塔或 torch 模型，按需加载)"""
+    if get_onnx_vision_tower(model_id) is not None:
+        return True
+    loader = get_chinese_clip if model_id == CHINESE_CLIP_MODEL_ID else get_openai_clip
+    model, processor = loader()
+    return bool(model and processor)
+
+def _chinese_clip_batch(images: list) -> list:
+    """每张图片返回 (CHINESE_ALL_LABELS 上的概率, 归一化图像向量)"""
+    tower = get_onnx_vision_tower(CHINESE_CLIP_MODEL_ID)
+    if tower is not None:
+        probs, embeds = tower.scores(images)
+    else:
+        model, processor = get_chinese_clip()
+        probs, embeds = clip_scores_batch(model, processor, CHINESE_CLIP_MODEL_ID, images, CHINESE_ALL_LABELS)
+    return list(zip(probs, embeds))
+
+def _openai_clip_batch(images: list) -> list:
+    """每张图片返回 (OPENAI_SCREEN_LABELS (通用标签 + 预筛原型) 上的概率, 归一化图像向量)"""
+    tower = get_onnx_vision_tower(OPENAI_CLIP_MODEL_ID)
+    if tower is not None:
+        probs, embeds = tower.scores(images)
+    else:
+        model, processor = get_openai_clip()
+        probs, embeds = clip_scores_batch(model, processor, OPENAI_CLIP_MODEL_ID, images, OPENAI_SCREEN_LABELS)
+    return list(zip(probs, embeds))
+
+def _nudenet_batch(images: list) -> list:
+    """images: BGR 数组列表 (NudeNet 接受内存中的数组，不再经过临时文件)"""
+    detector = get_nude_detector()
+    if hasattr(detector, "detect_batch"):
+        return detector.detect_batch(images, batch_size=len(images))
+    return [detector.detect(image) for image in images]
+
+# 预热顺序与各模型的 (加载, 空跑一次推理)
+_WARMUP_STEPS = (
+    ("nudenet", lambda: get_nude_detector() is not None, lambda image: _nudenet_batch([image.bgr()])),
+    ("chinese_clip", lambda: clip_available(CHINESE_CLIP_MODEL_ID), lambda image: _chinese_clip_batch([image.array])),
+    ("openai_clip", lambda: clip_available(OPENAI_CLIP_MODEL_ID), lambda image: _openai_clip_batch([image.array])),
+)
+
+def _set_model_status(name: str, **fields):
+    with _model_status_lock:
+        _model_status.setdefault(name, {"state": "not_loaded"}).update(fields)
+
+def get_model_status() -> dict:
+    """各模型的预热状态: {模型: {state, load_seconds, warmup_seconds, error}}，未预热的模型不出现"""
+    with _model_status_lock:
+        return {name: dict(status) for name, status in _model_status.items()}
+
+def warmup_models(dummy_pass: bool = True) -> dict:
+    """
+    依次加载全部审核模型，dummy_pass=True 时再用一张灰色图片空跑一次推理
+    (首次前向的图优化 / 内存分配不落在第一张真实图片上)，CLIP 按 AUDIT_CLIP_BACKEND 选择后端。
+    加载或推理失败的模型记为 failed，审核时按原有逻辑降级。返回 get_model_status()。
+    """
+    dummy = PreparedImage(array=np.full((224, 224, 3), 128, dtype=np.uint8), original_size=(224, 224))
     try:
-        import torch
-    except ImportError:
-        print("❌ [系统] 无法导入 torch, AI 审核将受限", flush=True)
+        for name, load, infer in _WARMUP_STEPS:
+            _set_model_status(name, state="loading", error=None)
+            started = time.perf_counter()
+            try:
+                loaded, error = load(), "模型加载失败"
+            except Exception as e:
+                loaded, error = False, f"{type(e).__name__}: {e}"
+            _set_model_status(name, load_seconds=round(time.perf_counter() - started, 2))
+            if not loaded:
+                _set_model_status(name, state="failed", error=error)
+                continue
 
-    result = {"safe": True, "score": 0.0, "reason": "Pass", "details": {}}
-    
-    # --- 0. 图片尺寸预检查 (跳过极小图片) ---
-    # CLIP 处理极小图片（如 1x1）时会报错，提前跳过
+            if dummy_pass:
+                _set_model_status(name, state="warming")
+                started = time.perf_counter()
+                try:
+                    infer(dummy)
+                except Exception as e:
+                    _set_model_status(name, state="failed", error=f"预热推理失败: {type(e).__name__}: {e}")
+                    continue
+                _set_model_status(name, warmup_seconds=round(time.perf_counter() - started, 2))
+            _set_model_status(name, state="ready")
+            print(f"✅ [系统] {name} 已就绪", flush=True)
+    finally:
+        _models_ready.set()
+    return get_model_status()
+
+def preload_models():
+    """预先加载全部审核模型，不空跑推理"""
+    return warmup_models(dummy_pass=False)
+
+def start_background_warmup():
+    """在后台线程中加载并预热全部模型 (AUDIT_PRELOAD_MODELS)，重复调用无效果"""
+    global _warmup_thread
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=warmup_models, name="model-warmup", daemon=True)
+        _warmup_thread.start()
+
+def warmup_pending() -> bool:
+    """后台预热已启动但尚未结束 (期间审核队列不领取任务，避免与预热线程争用 CPU)"""
+    return _warmup_thread is not None and not _models_ready.is_set()
+
+def get_batcher(name: str) -> MicroBatcher:
+    """获取指定模型的微批处理器 (chinese_clip / openai_clip / nudenet)"""
+    batcher = _batchers.get(name)
+    if batcher is None:
+        batch_fn = {"chinese_clip": _chinese_clip_batch, "openai_clip": _openai_clip_batch, "nudenet": _nudenet_batch}[name]
+        with _batchers_lock:
+            batcher = _batchers.setdefault(
+                name, MicroBatcher(name, batch_fn, config.AUDIT_BATCH_MAX_SIZE, config.AUDIT_BATCH_MAX_WAIT_MS)
+            )
+    return batcher
+
+def get_batcher_stats() -> dict:
+    """各微批处理器的统计，供 /admin/perf/stats 使用"""
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
+
+class AuditStageTimeout(Exception):
+    """审核阶段超出时间预算 (任务交回审核队列按退避重试，不占住 worker)，stage 为超时的阶段名"""
+
+    def __init__(self, stage: str, budget: float = None):
+        super().__init__(f"{stage} 超出时间预算 ({budget}s)")
+        self.stage = stage
+        self.budget = budget
+
+def _submit(stage: str, item):
+    """
+    提交到对应模型的微批处理器，等待不超过该阶段的时间预算
+
+    预算从该图片所在批次开始推理时计时: 在微批队列中排在其他批次之后的时间不计入
+    (排队上限 AUDIT_MODEL_TIMEOUT_SECONDS)；模型在提交前由各阶段在调用方线程加载，加载时间也不计入。
+    """
+    budget = config.AUDIT_STAGE_BUDGETS.get(stage) or None
     try:
-        pre_check_image = Image.open(io.BytesIO(content))
-        img_width, img_height = pre_check_image.size
-        MIN_SIZE = 10  # 最小尺寸阈值
-        if img_width < MIN_SIZE or img_height < MIN_SIZE:
-            logger.info(f"⚠️ [Audit] 跳过极小图片 ({img_width}x{img_height}), 直接放行")
-            return {"safe": True, "score": 0.0, "reason": f"图片过小 ({img_width}x{img_height}), 跳过审核", "details": {}}
-    except Exception as e:
-        logger.warning(f"⚠️ [Audit] 图片预检查失败: {e}")
-        # 预检查失败不阻断流程，继续后续审核
-    
-    # --- 地图检测 (已禁用 - 误判率太高) ---
-    # 模板匹配方案无法可靠检测地图，暂时禁用
-    # 如需启用，请使用 Vision API 方案
-    # try:
-    #     image = Image.open(io.BytesIO(content))
-    #     map_result = check_taiwan_region(image)
-    #     ...
-    # except Exception as e:
-    #     print(f"⚠️ [地图检测] 跳过: {e}", flush=True)
-    # --- 1. NudeNet 检测 (逻辑不变) ---
+        return get_batcher(stage).submit(item, timeout=budget, queue_timeout=config.AUDIT_MODEL_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        raise AuditStageTimeout(stage, budget) from None
+
+def _record_stage(result: dict, stage: str, outcome: str, started: float):
+    """记录阶段结果 (pass / reject / early_exit / error)，审核队列据此统计各阶段的通过率"""
+    result["details"].setdefault("stages", []).append(
+        {"stage": stage, "outcome": outcome, "ms": round((time.perf_counter() - started) * 1000, 1)}
+    )
+
+def _rejection(result: dict, score: float, reason: str, details: dict) -> dict:
+    details["stages"] = result["details"].get("stages", [])
+    return {"safe": False, "score": score, "reason": reason, "details": details, "embeddings": result["embeddings"]}
+
+def _stage_nudenet(prepared: PreparedImage, result: dict):
+    """NudeNet 裸露检测，违规时返回拒绝结果"""
+    started = time.perf_counter()
     try:
-        temp_path = None
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            # [FIX] 使用 Pillow 统一转换为 JPG，防止 OpenCV 读取 WebP/AVIF 失败导致 NoneType 错误
-            try:
-                img_pil = Image.open(io.BytesIO(content))
-                if img_pil.mode != "RGB":
-                    img_pil = img_pil.convert("RGB")
-                img_pil.save(tmp, format="JPEG")
-            except Exception:
-                # 如果转换失败（极少情况），尝试直接写入原数据
-                tmp.write(content)
-            temp_path = tmp.name
-        
-        detector = get_nude_detector()
-        detections = detector.detect(temp_path)
+        if get_nude_detector() is None:
+            raise RuntimeError("NudeNet 不可用")
+        # [Perf] 直接传入已解码的 BGR 数组 (由 Pillow 解码，WebP/AVIF 同样可用)；与其他并发审核合并为一次批量检测
+        detections = _submit("nudenet", prepared.bgr())
         
         unsafe_items = []
         max_score = 0.0
@@ -368,36 +687,28 @@ def check_image_safety(content: bytes, threshold: float = 0.50) -> dict:
         
         if unsafe_items:
             print(f"🚫 [NudeNet] 拦截: {', '.join(unsafe_items)}")
-            if os.path.exists(temp_path): os.remove(temp_path)
-            return {
-                "safe": False,
-                "score": max_score,
-                "reason": f"包含裸露内容: {', '.join(unsafe_items)}",
-                "details": {"nudenet": detections}
-            }
-        else:
-            print("✅ [NudeNet] 通过")
+            _record_stage(result, "nudenet", "reject", started)
+            return _rejection(result, max_score, f"包含裸露内容: {', '.join(unsafe_items)}", {"nudenet": detections})
+        print("✅ [NudeNet] 通过")
+        _record_stage(result, "nudenet", "pass", started)
             
+    except AuditStageTimeout:
+        raise
     except Exception as e:
         error_msg = f"NudeNet Error: {str(e)}"
         print(f"❌ [NudeNet] 错误: {e}")
         result["details"]["nudenet_error"] = error_msg
-    finally:
-        if temp_path and os.path.exists(temp_path): os.remove(temp_path)
+        _record_stage(result, "nudenet", "error", started)
+    return None
 
-    # --- 2. Chinese-CLIP 检测 (中国政治内容) ---
-    # [Lazy Import] 移除全局 HAS_CLIP 检查
+def _stage_chinese_clip(prepared: PreparedImage, result: dict):
+    """Chinese-CLIP 中国政治内容检测，违规时返回拒绝结果"""
+    started = time.perf_counter()
     try:
-        model, processor = get_chinese_clip()
-        if model and processor:
-                image = Image.open(io.BytesIO(content))
-                inputs = processor(text=CHINESE_ALL_LABELS, images=image, return_tensors="pt", padding=True)
-                
-                with torch.no_grad():
-                    outputs = model(**inputs)
-                
-                probs = outputs.logits_per_image.softmax(dim=1)
-                probs_list = probs[0].tolist()
+        if clip_available(CHINESE_CLIP_MODEL_ID):
+                # [Perf] 标签文本向量已缓存，只运行图像塔；并发审核合并为一次批量前向
+                probs_list, embedding = _submit("chinese_clip", prepared.array)
+                result["embeddings"]["chinese_clip"] = embedding
                 
                 sorted_probs = sorted(zip(CHINESE_ALL_LABELS, probs_list), key=lambda x: x[1], reverse=True)
                 print("-" * 30)
@@ -408,48 +719,48 @@ def check_image_safety(content: bytes, threshold: float = 0.50) -> dict:
                 max_prob = sorted_probs[0][1]
                 max_label = sorted_probs[0][0]
                 
-                # [Fix] 分类别阈值：地图检测更敏感，旗帜检测更严格
-                THRESHOLDS = {
-                    "一张缺少台湾的错误中国地图": 0.40,  # 地图检测需要更敏感
-                    "台独港独藏独旗帜": 0.60,            # 旗帜检测保持严格
-                }
-                
                 if max_label in CHINESE_UNSAFE_LABELS:
-                    threshold = THRESHOLDS.get(max_label, 0.50)  # 默认0.50
+                    threshold = CHINESE_THRESHOLDS.get(max_label, CHINESE_DEFAULT_THRESHOLD)
                     if max_prob > threshold:
                         print(f"🚫 [Chinese-CLIP] 政治问题! 命中: {max_label} (Score: {max_prob:.2f}, 阈值: {threshold})", flush=True)
-                        return {
-                            "safe": False,
-                            "score": max_prob,
-                            "reason": f"政治敏感: {max_label}",
-                            "details": {"chinese_clip": dict(zip(CHINESE_ALL_LABELS, probs_list))}
-                        }
+                        _record_stage(result, "chinese_clip", "reject", started)
+                        return _rejection(result, max_prob, f"政治敏感: {max_label}",
+                                          {"chinese_clip": dict(zip(CHINESE_ALL_LABELS, probs_list))})
                     else:
                         print(f"📊 [Chinese-CLIP] 未达阈值 (TOP: {max_label}, Score: {max_prob:.2f} < {threshold})", flush=True)
                 else:
                     print(f"📊 [Chinese-CLIP] 通过 (TOP: {max_label})", flush=True)
                 result["details"]["chinese_clip"] = dict(zip(CHINESE_ALL_LABELS, probs_list))
+                _record_stage(result, "chinese_clip", "pass", started)
                     
+    except AuditStageTimeout:
+        raise
     except Exception as e:
         error_msg = f"Chinese-CLIP Error: {str(e)}"
         print(f"❌ [Chinese-CLIP] 错误: {e}", flush=True)
         import traceback
         traceback.print_exc()
         result["details"]["chinese_clip_error"] = error_msg
+        _record_stage(result, "chinese_clip", "error", started)
+    return None
 
-    # --- 3. OpenAI CLIP 检测 (通用内容: 恐怖/暴力/毒品) ---
-    # [Lazy Import] 移除全局 HAS_CLIP 检查
+def _stage_openai_clip(prepared: PreparedImage, result: dict):
+    """
+    OpenAI CLIP 通用内容检测 (恐怖/暴力/毒品)，违规时返回拒绝结果
+
+    同一次前向还给出预筛得分 (result["details"]["prescreen_unsafe"])：全部标签 (含预筛原型) 上不安全原型的概率之和。
+    通用检测的概率是在 OPENAI_ALL_LABELS 子集上重新归一化的结果，与只用这些标签计算完全相同。
+    """
+    started = time.perf_counter()
     try:
-        model, processor = get_openai_clip()
-        if model and processor:
-                image = Image.open(io.BytesIO(content))
-                inputs = processor(text=OPENAI_ALL_LABELS, images=image, return_tensors="pt", padding=True)
-                
-                with torch.no_grad():
-                    outputs = model(**inputs)
-                
-                probs = outputs.logits_per_image.softmax(dim=1)
-                probs_list = probs[0].tolist()
+        if clip_available(OPENAI_CLIP_MODEL_ID):
+                # [Perf] 标签文本向量已缓存，只运行图像塔；并发审核合并为一次批量前向
+                screen_probs, embedding = _submit("openai_clip", prepared.array)
+                result["embeddings"]["openai_clip"] = embedding
+                screen = dict(zip(OPENAI_SCREEN_LABELS, screen_probs))
+                result["details"]["prescreen_unsafe"] = sum(screen[l] for l in PRESCREEN_UNSAFE_LABELS + OPENAI_UNSAFE_LABELS)
+                subset_total = sum(screen[l] for l in OPENAI_ALL_LABELS)
+                probs_list = [screen[l] / subset_total for l in OPENAI_ALL_LABELS]
                 
                 sorted_probs = sorted(zip(OPENAI_ALL_LABELS, probs_list), key=lambda x: x[1], reverse=True)
                 print("-" * 30)
@@ -460,24 +771,89 @@ def check_image_safety(content: bytes, threshold: float = 0.50) -> dict:
                 max_prob = sorted_probs[0][1]
                 max_label = sorted_probs[0][0]
                 
-                GENERAL_THRESHOLD = 0.50
-                if max_label in OPENAI_UNSAFE_LABELS and max_prob > GENERAL_THRESHOLD:
+                if max_label in OPENAI_UNSAFE_LABELS and max_prob > OPENAI_THRESHOLD:
                     print(f"🚫 [OpenAI-CLIP] 危险内容! 命中: {max_label} (Score: {max_prob:.2f})", flush=True)
-                    return {
-                        "safe": False,
-                        "score": max_prob,
-                        "reason": f"危险内容: {max_label}",
-                        "details": {"openai_clip": dict(zip(OPENAI_ALL_LABELS, probs_list))}
-                    }
+                    _record_stage(result, "openai_clip", "reject", started)
+                    return _rejection(result, max_prob, f"危险内容: {max_label}",
+                                      {"openai_clip": dict(zip(OPENAI_ALL_LABELS, probs_list))})
                 else:
                     print(f"📊 [OpenAI-CLIP] 通过 (TOP: {max_label})", flush=True)
                     result["details"]["openai_clip"] = dict(zip(OPENAI_ALL_LABELS, probs_list))
+                    _record_stage(result, "openai_clip", "pass", started)
                     
+    except AuditStageTimeout:
+        raise
     except Exception as e:
         error_msg = f"OpenAI-CLIP Error: {str(e)}"
         print(f"❌ [OpenAI-CLIP] 错误: {e}", flush=True)
         import traceback
         traceback.print_exc()
         result["details"]["openai_clip_error"] = error_msg
+        _record_stage(result, "openai_clip", "error", started)
+    return None
+
+def check_image_safety(content: bytes, threshold: float = 0.50) -> dict:
+    """
+    审核图片
+
+    默认依次运行 NudeNet → Chinese-CLIP → OpenAI CLIP。启用级联 (AUDIT_CASCADE_ENABLED) 时先运行最轻的
+    OpenAI CLIP，其预筛得分低于 AUDIT_CASCADE_SAFE_THRESHOLD 的图片直接放行，其余再经过两个重模型。
+    每个阶段有独立的时间预算，超时抛出 AuditStageTimeout (由审核队列重试)。
+    """
+    # 强制打印，确保用户能看到
+    print("\n🔍 [Audit] 开始新一轮图片审计 (Powered by NudeNet & CLIP & 地图检测)...", flush=True)
+    
+    # [FIX] 解决 check_image_safety 中使用 torch.no_grad() 但未导入 torch 的问题
+    try:
+        import torch
+    except ImportError:
+        print("❌ [系统] 无法导入 torch, AI 审核将受限", flush=True)
+
+    # embeddings: 各 CLIP 的归一化图像向量，由审核队列取出存入向量存储 (不进入结论缓存)
+    result = {"safe": True, "score": 0.0, "reason": "Pass", "details": {}, "embeddings": {}}
+    
+    # --- 0. 预处理: 只解码一次，各阶段共用 ---
+    try:
+        prepared = prepare_image(content)
+    except Exception as e:
+        logger.warning(f"⚠️ [Audit] 图片解码失败: {e}")
+        result["details"]["preprocess_error"] = f"Preprocess Error: {str(e)}"
+        return result
+
+    # 跳过极小图片 (CLIP 处理 1x1 这类图片会报错)
+    img_width, img_height = prepared.original_size
+    if img_width < MIN_AUDIT_SIZE or img_height < MIN_AUDIT_SIZE:
+        logger.info(f"⚠️ [Audit] 跳过极小图片 ({img_width}x{img_height}), 直接放行")
+        return {"safe": True, "score": 0.0, "reason": f"图片过小 ({img_width}x{img_height}), 跳过审核", "details": {}}
+    
+    # --- 地图检测 (已禁用 - 误判率太高) ---
+    # 模板匹配方案无法可靠检测地图，暂时禁用
+    # 如需启用，请使用 Vision API 方案
+    # try:
+    #     image = Image.open(io.BytesIO(content))
+    #     map_result = check_taiwan_region(image)
+    #     ...
+    # except Exception as e:
+    #     print(f"⚠️ [地图检测] 跳过: {e}", flush=True)
+
+    if config.AUDIT_CASCADE_ENABLED:
+        # --- 级联: OpenAI CLIP 兼作预筛，明确安全的图片不再经过重模型 ---
+        prescreen_started = time.perf_counter()
+        rejection = _stage_openai_clip(prepared, result)
+        if rejection:
+            return rejection
+        prescreen = result["details"].get("prescreen_unsafe")
+        if prescreen is not None and prescreen < config.AUDIT_CASCADE_SAFE_THRESHOLD:
+            print(f"⏩ [Cascade] 预筛得分 {prescreen:.4f} < {config.AUDIT_CASCADE_SAFE_THRESHOLD}，提前放行", flush=True)
+            _record_stage(result, "prescreen", "early_exit", prescreen_started)
+            return result
+        _record_stage(result, "prescreen", "pass", prescreen_started)
+        stages = (_stage_nudenet, _stage_chinese_clip)
+    else:
+        stages = (_stage_nudenet, _stage_chinese_clip, _stage_openai_clip)
 
+    for stage in stages:
+        rejection = stage(prepared, result)
+        if rejection:
+            return rejection
     return result
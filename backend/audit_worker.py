@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+独立审核进程入口
+
+用法: python -m backend.audit_worker
+
+处理 audit_jobs 队列中的审核任务，模型加载在 AUDIT_MODEL_WORKERS 个模型进程中 (未配置时按 CPU 核数的一半)，
+图片经共享内存传给模型进程。配合 web 进程的 AUDIT_WORKER_CONCURRENCY=0，uvicorn 可以使用多个
+不加载 torch 的 worker，例如:
+
+    AUDIT_WORKER_CONCURRENCY=0 uvicorn backend.main:app --workers 4
+    AUDIT_MODEL_WORKERS=2 python -m backend.audit_worker
+
+两者需共享同一个 DATA_DIR (SQLite 队列) 与 MinIO 配置。
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from . import config
+from . import database
+from . import executors
+from .logging_config import setup_logging
+from .services import audit_pool, audit_queue
+
+logger = logging.getLogger(__name__)
+
+
+async def serve() -> None:
+    database.init_db()
+
+    workers = config.AUDIT_MODEL_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+    await executors.run_io(audit_pool.start_pool, workers)
+    # 每个模型进程同一时间只处理一个任务，并发数与模型进程数相同
+    audit_queue.start_workers(concurrency=workers)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info(f"🧾 [AuditWorker] 已启动 (模型进程 {workers} 个)，等待审核任务...")
+    await stop.wait()
+
+    await audit_queue.stop_workers()
+    await executors.run_io(audit_pool.stop_pool)
+    executors.shutdown_executors()
+    logger.info("👋 [AuditWorker] 已停止")
+
+
+def main() -> None:
+    setup_logging(log_file="audit_worker.log")
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -70,6 +70,7 @@ UPLOAD_LIMIT_VIP = 999999       # VIP 用户（相当于无限）
 # ==================== 文件配置 ====================
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 免费/匿名用户最大文件大小：10MB
 MAX_FILE_SIZE_VIP = 50 * 1024 * 1024  # VIP用户最大文件大小：50MB
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", 1024 * 1024))  # 上传内容超过 1MB 后从内存转存到临时文件
 ALLOWED_EXTENSIONS = {
     '.jpg', '.jpeg', '.png', '.gif', '.webp', 
     '.avif', '.heic', '.heif', '.bmp', '.svg', '.ico'
@@ -144,3 +145,120 @@ if _cors_origins_str == "*":
 else:
     CORS_ALLOWED_ORIGINS = [origin.strip() for origin in _cors_origins_str.split(",") if origin.strip()]
 
+
+# ==================== 图片缓存配置 ====================
+# MinIO 前的两级读穿缓存: 小对象放进程内存 LRU，大对象放本地磁盘 LRU
+# 对象键是内容哈希，内容不可变，只需在删除时失效
+_data_root = DATA_DIR or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR") or os.path.join(_data_root, "cache", "images")
+IMAGE_CACHE_MEMORY_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MEMORY_MAX_BYTES", 64 * 1024 * 1024))   # 内存层总容量：64MB
+IMAGE_CACHE_MEMORY_MAX_OBJECT = int(os.getenv("IMAGE_CACHE_MEMORY_MAX_OBJECT", 512 * 1024))       # 进入内存层的单个对象上限：512KB
+IMAGE_CACHE_DISK_MAX_BYTES = int(os.getenv("IMAGE_CACHE_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024)) # 磁盘层总容量：2GB
+IMAGE_CACHE_DISK_MAX_OBJECT = int(os.getenv("IMAGE_CACHE_DISK_MAX_OBJECT", 64 * 1024 * 1024))     # 进入磁盘层的单个对象上限：64MB
+IMAGE_CACHE_FRESH_SECONDS = int(os.getenv("IMAGE_CACHE_FRESH_SECONDS", 600))       # 新鲜期：期间直接命中
+IMAGE_CACHE_STALE_SECONDS = int(os.getenv("IMAGE_CACHE_STALE_SECONDS", 86400))     # 过期后仍可返回旧副本的窗口 (后台重新验证)
+# 跨进程失效: 删除对象时登记到 deleted_objects 表，各进程每隔该秒数读取并清理自己的缓存 (多 worker / 独立审核进程)
+IMAGE_CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv("IMAGE_CACHE_INVALIDATION_POLL_SECONDS", 1))
+
+# 负缓存: 记录已知不存在的对象键，挡住扫描器的随机键请求
+NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", 60))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", 10000))
+
+# ==================== 图片分发配置 ====================
+# 分发模式:
+# - proxy: 由应用代理图片字节 (默认，MinIO 不对公网开放时使用)
+# - redirect: 鉴权后 302/307 跳转到 S3 预签名 URL，应用不再传输图片字节
+# - accel: 返回 X-Accel-Redirect 头，由 nginx 用 sendfile 发送本地缓存文件或内部 MinIO location
+# - sendfile: 返回 X-Sendfile 头 (Apache mod_xsendfile / lighttpd)，指向本地缓存文件
+IMAGE_DELIVERY_MODE = os.getenv("IMAGE_DELIVERY_MODE", "proxy").lower()
+IMAGE_REDIRECT_STATUS = int(os.getenv("IMAGE_REDIRECT_STATUS", 302))       # 302 或 307
+PRESIGNED_URL_EXPIRES = int(os.getenv("PRESIGNED_URL_EXPIRES", 900))       # 预签名 URL 有效期 (秒)
+PRESIGNED_URL_REFRESH_MARGIN = int(os.getenv("PRESIGNED_URL_REFRESH_MARGIN", 120))  # 到期前多久重新签名 (秒)
+PRESIGNED_URL_CACHE_SIZE = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", 10000))
+# 浏览器可访问的 MinIO 地址 (签名中包含 Host，需与客户端实际访问的地址一致)，默认同 MINIO_ENDPOINT
+MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT", "")
+
+# accel 模式: nginx 中映射到 IMAGE_CACHE_DIR 的 internal location 前缀
+ACCEL_REDIRECT_CACHE_PREFIX = os.getenv("ACCEL_REDIRECT_CACHE_PREFIX", "/_image_cache/")
+# accel 模式: nginx 中反向代理到 MinIO 的 internal location 前缀 (留空则先回源写入本地缓存)
+ACCEL_REDIRECT_MINIO_PREFIX = os.getenv("ACCEL_REDIRECT_MINIO_PREFIX", "")
+
+# ==================== 并发执行配置 ====================
+# MinIO (S3) 阻塞 I/O 使用独立的有界线程池，不占用 AnyIO 默认线程池 (默认 40 个槽位)，
+# 慢客户端下载图片时不会拖慢其他同步接口
+S3_IO_WORKERS = int(os.getenv("S3_IO_WORKERS", 32))
+IMAGE_STREAM_CHUNK_SIZE = int(os.getenv("IMAGE_STREAM_CHUNK_SIZE", 64 * 1024))  # 代理图片时每次从 S3 读取的块大小：64KB
+# 上传流水线中的 CPU 密集步骤 (整文件哈希、图片解析) 使用的线程数，默认与 CPU 核数相同 (最多 8 个)
+UPLOAD_CPU_WORKERS = int(os.getenv("UPLOAD_CPU_WORKERS", min(8, os.cpu_count() or 2)))
+
+# ==================== 分片上传配置 ====================
+# 超过阈值的文件使用 S3 分片上传 (多连接并发，失败只重传单个分片)，小文件仍为单次 PUT
+MULTIPART_THRESHOLD = int(os.getenv("MULTIPART_THRESHOLD", 16 * 1024 * 1024))   # 分片上传阈值：16MB
+MULTIPART_CHUNK_SIZE = int(os.getenv("MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024))  # 分片大小：8MB (S3 要求至少 5MB)
+MULTIPART_MAX_CONCURRENCY = int(os.getenv("MULTIPART_MAX_CONCURRENCY", 4))      # 单个文件的并发分片数
+MULTIPART_SWEEP_INTERVAL_SECONDS = int(os.getenv("MULTIPART_SWEEP_INTERVAL_SECONDS", 3600))  # 遗留分片清理周期，0 表示关闭
+MULTIPART_ABANDON_SECONDS = int(os.getenv("MULTIPART_ABANDON_SECONDS", 86400))  # 发起超过该时长仍未完成的分片上传视为遗留
+
+# ==================== 断点续传配置 ====================
+# 大文件分块上传: 会话状态存 SQLite，分块数据追加写入本地暂存文件，完成后走与 /upload 相同的入库流程
+UPLOAD_SESSION_DIR = os.getenv("UPLOAD_SESSION_DIR") or os.path.join(_data_root, "uploads")
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", 86400))            # 会话空闲多久后过期 (每次写入分块后续期)
+UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv("UPLOAD_SESSION_CHUNK_SIZE", 4 * 1024 * 1024))   # 建议客户端使用的分块大小：4MB
+UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS", 600))  # 过期会话清理周期
+
+# ==================== 审核任务队列配置 ====================
+# 上传后的 AI 审核登记到 SQLite 任务队列 (audit_jobs)，由 worker 按对象键从存储读取内容审核；
+# 进程重启后未完成的任务会继续处理，失败按指数退避重试，超过次数进入 dead 等待管理员处理
+AUDIT_WORKER_CONCURRENCY = int(os.getenv("AUDIT_WORKER_CONCURRENCY", 2))          # 本进程并发处理的任务数，0 表示不在本进程处理
+AUDIT_JOB_LEASE_SECONDS = int(os.getenv("AUDIT_JOB_LEASE_SECONDS", 300))          # 任务租约时长，处理期间每 1/3 租约续租一次
+AUDIT_JOB_MAX_ATTEMPTS = int(os.getenv("AUDIT_JOB_MAX_ATTEMPTS", 5))              # 最大尝试次数，超过后进入 dead
+AUDIT_JOB_RETRY_BASE_SECONDS = int(os.getenv("AUDIT_JOB_RETRY_BASE_SECONDS", 30)) # 重试退避基数 (30s, 60s, 120s ...)
+AUDIT_JOB_RETRY_MAX_SECONDS = int(os.getenv("AUDIT_JOB_RETRY_MAX_SECONDS", 3600)) # 重试退避上限
+AUDIT_QUEUE_POLL_SECONDS = float(os.getenv("AUDIT_QUEUE_POLL_SECONDS", 5))        # 队列空闲时的轮询间隔 (本进程登记的任务会立即唤醒 worker)
+# 审核模型进程池: > 0 时模型只加载在独立进程中，图片经共享内存传递；web 进程可设 AUDIT_WORKER_CONCURRENCY=0，
+# 由单独的 `python -m backend.audit_worker` 进程处理队列，这样 uvicorn 可以开多个不加载 torch 的 worker
+AUDIT_MODEL_WORKERS = int(os.getenv("AUDIT_MODEL_WORKERS", 0))                    # 本进程启动的模型进程数，0 表示在本进程线程中审核
+AUDIT_MODEL_TIMEOUT_SECONDS = float(os.getenv("AUDIT_MODEL_TIMEOUT_SECONDS", 600)) # 单次审核超时 (含首次加载模型)，超时后重启该模型进程
+# 推理微批处理: 并发审核的图片合并为一次批量前向 (CLIP / NudeNet)，收到第一张后最多等待 MAX_WAIT_MS 凑批
+AUDIT_BATCH_MAX_SIZE = int(os.getenv("AUDIT_BATCH_MAX_SIZE", 8))                  # 单批最多图片数，1 表示不合并
+AUDIT_BATCH_MAX_WAIT_MS = float(os.getenv("AUDIT_BATCH_MAX_WAIT_MS", 20))         # 凑批的最长等待时间 (毫秒)
+# CLIP 推理后端: torch (默认) 或 onnx (图像塔导出为 ONNX 由 onnxruntime 运行，首次使用时导出，失败自动回退 torch)
+AUDIT_CLIP_BACKEND = os.getenv("AUDIT_CLIP_BACKEND", "torch").lower()
+AUDIT_ONNX_QUANTIZE = os.getenv("AUDIT_ONNX_QUANTIZE", "true").lower() == "true"  # 使用动态 int8 量化的图像塔
+AUDIT_ONNX_DIR = os.getenv("AUDIT_ONNX_DIR") or os.path.join(_data_root, "models", "onnx")  # 导出文件目录
+# 审核结论缓存的版本号: 调整阈值或判定逻辑后递增，旧结论不再命中 (模型 ID / 标签变化会自动失效)
+AUDIT_MODEL_VERSION = os.getenv("AUDIT_MODEL_VERSION", "1")
+# 级联审核: 先运行最轻的 OpenAI CLIP 预筛，不安全原型的概率之和低于阈值的图片直接放行，不再经过 NudeNet / Chinese-CLIP
+AUDIT_CASCADE_ENABLED = os.getenv("AUDIT_CASCADE_ENABLED", "false").lower() == "true"
+AUDIT_CASCADE_SAFE_THRESHOLD = float(os.getenv("AUDIT_CASCADE_SAFE_THRESHOLD", 0.05))
+# 各审核阶段的时间预算 (秒，0 表示不限)，超时后任务交回审核队列按退避重试；
+# 从该阶段的推理开始执行时计时，不含在微批队列中排队与首次加载模型的时间
+AUDIT_STAGE_BUDGETS = {
+    "nudenet": float(os.getenv("AUDIT_BUDGET_NUDENET_SECONDS", 60)),
+    "chinese_clip": float(os.getenv("AUDIT_BUDGET_CHINESE_CLIP_SECONDS", 60)),
+    "openai_clip": float(os.getenv("AUDIT_BUDGET_OPENAI_CLIP_SECONDS", 60)),
+}
+# CLIP 图像向量存储: 审核时保存各图片的图像向量 (float16，每张约 2KB)，标签变化后用 tools/rescore_audit_labels.py 离线重评
+AUDIT_EMBEDDING_STORE_ENABLED = os.getenv("AUDIT_EMBEDDING_STORE_ENABLED", "true").lower() == "true"
+AUDIT_EMBEDDING_DIR = os.getenv("AUDIT_EMBEDDING_DIR") or os.path.join(_data_root, "embeddings")
+# 图库语义搜索的向量索引 (/admin/images/search): 向量数不超过 BRUTE_FORCE_MAX 时暴力扫描，更多时使用 IVF 倒排索引
+VECTOR_INDEX_BRUTE_FORCE_MAX = int(os.getenv("VECTOR_INDEX_BRUTE_FORCE_MAX", 50000))
+VECTOR_INDEX_MAX_LISTS = int(os.getenv("VECTOR_INDEX_MAX_LISTS", 1024))            # IVF 簇数上限 (默认取 sqrt(向量数))
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", 16))                    # 每次查询扫描的簇数，越大召回越高、越慢
+VECTOR_INDEX_TAIL_MAX = int(os.getenv("VECTOR_INDEX_TAIL_MAX", 20000))             # 新增向量累计到该数量后并入倒排表 (之前暴力扫描)
+# 感知哈希 (dHash): 上传时计算并存入 history.phash，用于近重复查询 (/admin/images/similar)
+PHASH_ENABLED = os.getenv("PHASH_ENABLED", "true").lower() == "true"
+# 近重复关联: 新上传的图片与已通过审核的图片汉明距离不超过 RADIUS 时记为暂定通过 (audit_status=provisional)，
+# 仍照常排队审核，审核结论覆盖暂定状态
+PHASH_LINK_ENABLED = os.getenv("PHASH_LINK_ENABLED", "false").lower() == "true"
+PHASH_LINK_RADIUS = int(os.getenv("PHASH_LINK_RADIUS", 4))
+# 感知哈希黑名单: 管理员删除 / 审核清理的违规图片自动登记，上传时在写入存储与审核之前比对
+PHASH_BLOCKLIST_ENABLED = os.getenv("PHASH_BLOCKLIST_ENABLED", "true").lower() == "true"
+PHASH_BLOCKLIST_RADIUS = int(os.getenv("PHASH_BLOCKLIST_RADIUS", 6))                  # 命中的汉明距离上限
+PHASH_BLOCKLIST_ACTION = os.getenv("PHASH_BLOCKLIST_ACTION", "reject").lower()        # reject: 拒绝上传；review: 照常入库并登记举报等待复核
+PHASH_BLOCKLIST_REFRESH_SECONDS = float(os.getenv("PHASH_BLOCKLIST_REFRESH_SECONDS", 5))  # 检查其他进程增删条目的间隔
+# 启动预热: 启动后在后台线程 (或模型进程) 中加载各审核模型并空跑一次推理，/ready 在完成前返回 503，
+# 期间审核任务留在队列中等待；关闭时模型在第一次审核时加载
+AUDIT_PRELOAD_MODELS = os.getenv("AUDIT_PRELOAD_MODELS", "false").lower() == "true"
@@ -15,6 +15,11 @@
 #   ├── sessions.py       # 会话管理
 #   ├── vip.py            # VIP 系统
 #   ├── notifications.py  # 通知系统
+#   ├── upload_sessions.py # 断点续传会话
+#   ├── audit_jobs.py     # 审核任务队列
+#   ├── audit_verdicts.py # 审核结论缓存
+#   ├── phash_blocklist.py # 感知哈希黑名单
+#   ├── deleted_objects.py # 已删除对象日志 (跨进程缓存失效)
 #   └── admin.py          # 管理员功能
 # ============================================================
 
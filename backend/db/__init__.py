@@ -10,12 +10,18 @@ from .connection import get_db_connection, init_db, DB_PATH, get_db
 from .images import (
     save_to_db,
     get_history_list,
+    get_history_by_hashes,
     delete_history_items,
     clear_all_history,
     rename_history_item,
     delete_image_by_hash_system,
     get_image_by_hash,
+    get_image_owners_by_hash,
     get_image_by_url,
+    get_audited_image_by_hash,
+    set_audit_status,
+    get_phash_entries_since,
+    set_phash,
 )
 
 # 用户操作
@@ -67,6 +73,49 @@ from .notifications import (
     cleanup_old_notifications,
 )
 
+# 断点续传
+from .upload_sessions import (
+    create_upload_session,
+    get_upload_session,
+    advance_upload_session,
+    delete_upload_session,
+    pop_expired_upload_sessions,
+    get_upload_session_ids,
+)
+
+# 审核任务队列
+from .audit_jobs import (
+    enqueue_audit_job,
+    claim_audit_jobs,
+    heartbeat_audit_job,
+    complete_audit_job,
+    fail_audit_job,
+    release_audit_jobs,
+    retry_dead_audit_jobs,
+    get_audit_queue_stats,
+)
+
+# 审核结论缓存
+from .audit_verdicts import (
+    get_audit_verdict,
+    save_audit_verdict,
+)
+
+# 感知哈希黑名单
+from .phash_blocklist import (
+    add_blocked_phash,
+    remove_blocked_phash,
+    get_blocked_phashes,
+    get_phash_blocklist_version,
+    list_blocked_phashes,
+)
+
+# 已删除对象日志 (跨进程缓存失效)
+from .deleted_objects import (
+    record_deleted_object,
+    get_deleted_objects_since,
+)
+
 # 管理员功能
 from .admin import (
     get_admin_stats,
@@ -89,8 +138,9 @@ __all__ = [
     # 连接
     'get_db_connection', 'init_db', 'DB_PATH', 'get_db',
     # 图片
-    'save_to_db', 'get_history_list', 'delete_history_items', 'clear_all_history',
-    'rename_history_item', 'delete_image_by_hash_system', 'get_image_by_hash', 'get_image_by_url',
+    'save_to_db', 'get_history_list', 'get_history_by_hashes', 'delete_history_items', 'clear_all_history',
+    'rename_history_item', 'delete_image_by_hash_system', 'get_image_by_hash', 'get_image_owners_by_hash', 'get_image_by_url',
+    'get_audited_image_by_hash', 'set_audit_status', 'get_phash_entries_since', 'set_phash',
     # 用户
     'create_user', 'get_user_by_username', 'get_user_by_google_id', 'create_google_user',
     'get_user_by_email', 'save_verification_code', 'get_valid_verification_code', 'delete_verification_code',
@@ -104,6 +154,19 @@ __all__ = [
 
     # 通知
     'create_notification', 'get_notifications', 'mark_notification_read', 'cleanup_old_notifications',
+    # 断点续传
+    'create_upload_session', 'get_upload_session', 'advance_upload_session', 'delete_upload_session',
+    'pop_expired_upload_sessions', 'get_upload_session_ids',
+    # 审核任务队列
+    'enqueue_audit_job', 'claim_audit_jobs', 'heartbeat_audit_job', 'complete_audit_job',
+    'fail_audit_job', 'release_audit_jobs', 'retry_dead_audit_jobs', 'get_audit_queue_stats',
+    # 审核结论缓存
+    'get_audit_verdict', 'save_audit_verdict',
+    # 感知哈希黑名单
+    'add_blocked_phash', 'remove_blocked_phash', 'get_blocked_phashes', 'get_phash_blocklist_version',
+    'list_blocked_phashes',
+    # 已删除对象日志
+    'record_deleted_object', 'get_deleted_objects_since',
     # 管理员
     'get_admin_stats', 'create_abuse_report', 'get_abuse_reports', 'resolve_abuse_report',
     'get_pending_reports_count', 'batch_resolve_reports', 'batch_delete_images_by_hashes', 'create_auto_admin',
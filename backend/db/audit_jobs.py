@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# backend/db/audit_jobs.py
+# 审核任务队列数据库操作 - 持久化待审核的上传，进程重启后继续处理
+#
+# 状态流转: pending → running → done
+#                      ↓ (失败)
+#                   pending (退避重试) → ... → dead (超过最大尝试次数)
+# running 状态的任务持有租约 (lease_owner / lease_expires_at)，处理期间定期续租；
+# 进程崩溃后租约过期，任务会被其他 worker 重新领取。
+
+import sqlite3
+import logging
+from typing import Dict, Any, List, Optional
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_audit_job(content_hash: str, object_name: str, filename: str = None,
+                      user_id: int = None, device_id: str = None) -> bool:
+    """
+    登记审核任务 (以内容哈希去重)
+
+    同一内容已有待处理 / 处理中的任务时不重复登记；已结束 (done / dead) 的任务重新置为 pending，
+    例如违规图片被删除后又被重新上传。
+
+    Returns:
+        是否新登记或重新排队了任务
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    INSERT INTO audit_jobs (content_hash, object_name, filename, user_id, device_id)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(content_hash) DO UPDATE SET
+                        object_name = excluded.object_name,
+                        filename = excluded.filename,
+                        user_id = excluded.user_id,
+                        device_id = excluded.device_id,
+                        status = 'pending',
+                        attempts = 0,
+                        verdict = NULL,
+                        last_error = NULL,
+                        lease_owner = NULL,
+                        lease_expires_at = NULL,
+                        run_after = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE audit_jobs.status IN ('done', 'dead')
+                """, (content_hash, object_name, filename, user_id, device_id))
+                return c.rowcount == 1
+    except Exception as e:
+        logger.error(f"Enqueue audit job failed: {e}")
+        return False
+
+
+def claim_audit_jobs(worker_id: str, limit: int, lease_seconds: int, max_attempts: int) -> List[Dict[str, Any]]:
+    """
+    领取可执行的任务并加租约
+
+    可领取: 到达重试时间的 pending 任务，以及租约已过期的 running 任务 (持有者已崩溃)。
+    尝试次数在领取时累加，处理过程中反复崩溃的任务同样会进入 dead。
+    多个进程同时领取时以条件更新的 rowcount 为准，不会重复领取。
+    """
+    claimed = []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    UPDATE audit_jobs SET status = 'dead', last_error = 'lease expired', lease_owner = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE status = 'running' AND lease_expires_at <= CURRENT_TIMESTAMP AND attempts >= ?
+                """, (max_attempts,))
+                if c.rowcount:
+                    logger.warning(f"Audit jobs moved to dead after lease expiry: {c.rowcount}")
+
+                c.execute("""
+                    SELECT id FROM audit_jobs
+                    WHERE (status = 'pending' AND run_after <= CURRENT_TIMESTAMP)
+                       OR (status = 'running' AND lease_expires_at <= CURRENT_TIMESTAMP)
+                    ORDER BY run_after, id LIMIT ?
+                """, (limit,))
+                candidates = [row["id"] for row in c.fetchall()]
+
+                for job_id in candidates:
+                    c.execute("""
+                        UPDATE audit_jobs SET status = 'running', attempts = attempts + 1,
+                            lease_owner = ?, lease_expires_at = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ? AND ((status = 'pending' AND run_after <= CURRENT_TIMESTAMP)
+                           OR (status = 'running' AND lease_expires_at <= CURRENT_TIMESTAMP))
+                    """, (worker_id, f"+{lease_seconds} seconds", job_id))
+                    if c.rowcount == 1:
+                        c.execute("SELECT * FROM audit_jobs WHERE id = ?", (job_id,))
+                        claimed.append(dict(c.fetchone()))
+    except Exception as e:
+        logger.error(f"Claim audit jobs failed: {e}")
+    return claimed
+
+
+def heartbeat_audit_job(job_id: int, worker_id: str, lease_seconds: int) -> bool:
+    """续租，返回 False 表示租约已经不属于当前 worker"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    UPDATE audit_jobs SET lease_expires_at = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'running' AND lease_owner = ?
+                """, (f"+{lease_seconds} seconds", job_id, worker_id))
+                return c.rowcount == 1
+    except Exception as e:
+        logger.error(f"Heartbeat audit job failed: {e}")
+        return False
+
+
+def complete_audit_job(job_id: int, worker_id: str, verdict: str) -> bool:
+    """任务完成，记录审核结论 (passed / rejected / missing)"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    UPDATE audit_jobs SET status = 'done', verdict = ?, last_error = NULL,
+                        lease_owner = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'running' AND lease_owner = ?
+                """, (verdict, job_id, worker_id))
+                return c.rowcount == 1
+    except Exception as e:
+        logger.error(f"Complete audit job failed: {e}")
+        return False
+
+
+def fail_audit_job(job_id: int, worker_id: str, error: str, max_attempts: int, retry_delay: int) -> Optional[str]:
+    """
+    任务失败: 未超过最大尝试次数时在 retry_delay 秒后重试，否则进入 dead
+
+    Returns:
+        任务的新状态 ('pending' / 'dead')，租约已不属于当前 worker 时返回 None
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    UPDATE audit_jobs SET
+                        status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END,
+                        run_after = datetime('now', ?), last_error = ?,
+                        lease_owner = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'running' AND lease_owner = ?
+                """, (max_attempts, f"+{retry_delay} seconds", error[:1000], job_id, worker_id))
+                if c.rowcount != 1:
+                    return None
+                c.execute("SELECT status FROM audit_jobs WHERE id = ?", (job_id,))
+                return c.fetchone()[0]
+    except Exception as e:
+        logger.error(f"Fail audit job failed: {e}")
+        return None
+
+
+def release_audit_jobs(worker_id: str) -> int:
+    """进程正常退出时交还持有的任务 (不计入尝试次数)，重启后无需等待租约过期"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    UPDATE audit_jobs SET status = 'pending', attempts = MAX(attempts - 1, 0),
+                        lease_owner = NULL, lease_expires_at = NULL, run_after = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE status = 'running' AND lease_owner = ?
+                """, (worker_id,))
+                return c.rowcount
+    except Exception as e:
+        logger.error(f"Release audit jobs failed: {e}")
+        return 0
+
+
+def retry_dead_audit_jobs() -> int:
+    """将所有 dead 任务重新排队 (尝试次数清零)，返回数量"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    UPDATE audit_jobs SET status = 'pending', attempts = 0, run_after = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE status = 'dead'
+                """)
+                return c.rowcount
+    except Exception as e:
+        logger.error(f"Retry dead audit jobs failed: {e}")
+        return 0
+
+
+def get_audit_queue_stats() -> Dict[str, Any]:
+    """各状态的任务数量，以及最早一个待处理任务的排队时间"""
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT status, COUNT(*) FROM audit_jobs GROUP BY status")
+            counts = {status: count for status, count in c.fetchall()}
+            c.execute("""
+                SELECT CAST((julianday('now') - julianday(MIN(created_at))) * 86400 AS INTEGER)
+                FROM audit_jobs WHERE status IN ('pending', 'running')
+            """)
+            oldest = c.fetchone()[0]
+            return {
+                "pending": counts.get("pending", 0),
+                "running": counts.get("running", 0),
+                "done": counts.get("done", 0),
+                "dead": counts.get("dead", 0),
+                "oldest_pending_seconds": oldest or 0,
+            }
+    except Exception as e:
+        logger.error(f"Get audit queue stats failed: {e}")
+        return {}
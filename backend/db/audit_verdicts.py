@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# backend/db/audit_verdicts.py
+# 审核结论缓存数据库操作 - 按内容哈希保存模型审核结果，相同内容再次上传时不再运行模型
+#
+# 每条结论带有模型 / 标签集版本 (audit.verdict_version())，版本不一致的条目视为未命中，
+# 下次审核后被覆盖 (惰性失效，无需批量清理)。
+
+import json
+import sqlite3
+import logging
+from typing import Dict, Any, Optional
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def get_audit_verdict(content_hash: str, version: str) -> Optional[Dict[str, Any]]:
+    """
+    查找指定版本的审核结论
+
+    Returns:
+        与 audit.check_image_safety 相同结构的结果字典 (safe / score / reason / details)，
+        未命中或版本不一致时返回 None
+    """
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("SELECT * FROM audit_verdicts WHERE content_hash = ? AND version = ?", (content_hash, version))
+            row = c.fetchone()
+            if row:
+                return {
+                    "safe": bool(row["safe"]),
+                    "score": row["score"],
+                    "reason": row["reason"],
+                    "details": json.loads(row["details"] or "{}"),
+                }
+    except Exception as e:
+        logger.error(f"Get audit verdict failed: {e}")
+    return None
+
+
+def save_audit_verdict(content_hash: str, version: str, result: Dict[str, Any]) -> bool:
+    """保存审核结论 (同一哈希只保留最新版本)"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    INSERT INTO audit_verdicts (content_hash, version, safe, score, reason, details)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(content_hash) DO UPDATE SET
+                        version = excluded.version,
+                        safe = excluded.safe,
+                        score = excluded.score,
+                        reason = excluded.reason,
+                        details = excluded.details,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (
+                    content_hash, version, 1 if result["safe"] else 0, float(result.get("score") or 0.0),
+                    result.get("reason"), json.dumps(result.get("details") or {}, ensure_ascii=False),
+                ))
+            return True
+    except Exception as e:
+        logger.error(f"Save audit verdict failed: {e}")
+        return False
@@ -90,7 +90,9 @@ def migrate_tables(conn: sqlite3.Connection) -> None:
         "device_id": "TEXT",
         "is_shared": "INTEGER DEFAULT 0",
         "user_id": "INTEGER",
-        "ip_address": "TEXT"
+        "ip_address": "TEXT",
+        "audit_status": "TEXT",  # passed / provisional (近重复暂定通过，仍在排队审核) / NULL (待审核或旧数据)
+        "phash": "TEXT"  # 64 位 dHash 十六进制 (services/phash.py)，旧数据用 tools/backfill_phash.py 补算
     }
     
     for col, dtype in history_updates.items():
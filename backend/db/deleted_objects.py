@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# backend/db/deleted_objects.py
+# 已删除对象日志 - 跨进程的缓存失效信号
+#
+# 审核清理 / 管理员删除只能清掉执行删除的那个进程的图片缓存；其他 uvicorn worker 与独立审核进程
+# 按 id 增量读取本表，把新删除的对象键从自己的缓存中移除 (见 storage.sync_deleted_objects)。
+# 超过缓存 stale 窗口的条目不再需要 (届时缓存条目本身已失效)，登记时顺带清理。
+
+import time
+import logging
+from typing import List, Tuple
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def record_deleted_object(object_key: str, retention_seconds: float) -> bool:
+    """登记已删除的对象键，并清理超过保留期的旧条目"""
+    now = time.time()
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("INSERT INTO deleted_objects (object_key, deleted_at) VALUES (?, ?)", (object_key, now))
+                c.execute("DELETE FROM deleted_objects WHERE deleted_at < ?", (now - retention_seconds,))
+            return True
+    except Exception as e:
+        logger.error(f"登记已删除对象失败: {e}")
+        return False
+
+
+def get_deleted_objects_since(last_id: int, limit: int = 1000) -> List[Tuple[int, str]]:
+    """id 大于 last_id 的已删除对象 [(id, object_key)]，按 id 升序"""
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT id, object_key FROM deleted_objects WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, limit),
+            )
+            return c.fetchall()
+    except Exception as e:
+        logger.error(f"读取已删除对象失败: {e}")
+        return []
@@ -43,9 +43,10 @@ def save_to_db(file_info: dict, device_id: str = None, user_id: int = None, is_s
                 if row_id:
                     # 已存在 -> 更新
                     update_fields = '''UPDATE history SET url=?, filename=?, service=?, width=?, height=?, size=?, content_type=?, 
-                                         created_at=CURRENT_TIMESTAMP'''
+                                         phash=COALESCE(?, phash), created_at=CURRENT_TIMESTAMP'''
                     params = [data.get("url"), data.get("filename"), data.get("service"),
-                              data.get("width"), data.get("height"), data.get("size"), data.get("content_type")]
+                              data.get("width"), data.get("height"), data.get("size"), data.get("content_type"),
+                              data.get("phash")]
                     
                     # 检查是否需要"认领"
                     should_claim = False
@@ -66,11 +67,12 @@ def save_to_db(file_info: dict, device_id: str = None, user_id: int = None, is_s
                     c.execute(update_fields, params)
                 else:
                     # 不存在 -> 插入新记录
-                    c.execute('''INSERT INTO history (url, filename, hash, service, width, height, size, content_type, device_id, user_id, is_shared, ip_address)
-                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    c.execute('''INSERT INTO history (url, filename, hash, service, width, height, size, content_type, device_id, user_id, is_shared, ip_address, audit_status, phash)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
                               (data.get("url"), data.get("filename"), data.get("hash"), data.get("service"),
                                data.get("width"), data.get("height"), data.get("size"), data.get("content_type"),
-                               device_id, user_id, 1 if is_shared else 0, ip_address))
+                               device_id, user_id, 1 if is_shared else 0, ip_address, data.get("audit_status"),
+                               data.get("phash")))
                     row_id = c.lastrowid
                 
             return {"success": True, "existing": bool(row_id is not None and c.lastrowid is None), "id": row_id}
@@ -79,6 +81,47 @@ def save_to_db(file_info: dict, device_id: str = None, user_id: int = None, is_s
         return {"success": False, "error": str(e)}
 
 
+def _visibility_conditions(view_mode: str, user_id: int = None, device_id: str = None,
+                           only_mine: bool = False) -> tuple:
+    """历史记录的可见性过滤条件 (WHERE 子句片段, 参数)，列表查询与语义搜索共用"""
+    conditions: list = []
+    params: list = []
+    if view_mode == "shared":
+        conditions.append("is_shared = 1")
+        if only_mine:
+            if user_id:
+                conditions.append("user_id = ?")
+                params.append(user_id)
+            elif device_id:
+                conditions.append("device_id = ?")
+                params.append(device_id)
+    elif view_mode == "admin_all":
+        pass
+    else:
+        if user_id:
+            conditions.append("user_id = ?")
+            conditions.append("is_shared = 0")
+            params.append(user_id)
+        else:
+            conditions.append("device_id = ?")
+            conditions.append("is_shared = 0")
+            conditions.append("user_id IS NULL")
+            params.append(device_id)
+    return conditions, params
+
+
+def _with_is_mine(item: dict, device_id: str = None, user_id: int = None, is_admin: bool = False) -> dict:
+    if is_admin:
+        item['is_mine'] = True
+    elif user_id:
+        item['is_mine'] = (item['user_id'] == user_id) or (item['user_id'] is None)
+    elif device_id:
+        item['is_mine'] = (item['device_id'] == device_id)
+    else:
+        item['is_mine'] = False
+    return item
+
+
 def get_history_list(page: int = 1, page_size: int = 20, keyword: str = "",
                      device_id: str = None, user_id: int = None, is_admin: bool = False, view_mode: str = "private",
                      only_mine: bool = False) -> Dict[str, Any]:
@@ -91,31 +134,8 @@ def get_history_list(page: int = 1, page_size: int = 20, keyword: str = "",
             offset = (page - 1) * page_size
             
             query = "SELECT * FROM history"
-            params: list = []
-            conditions: list = []
-
             # 核心过滤逻辑
-            if view_mode == "shared":
-                conditions.append("is_shared = 1")
-                if only_mine:
-                    if user_id:
-                        conditions.append("user_id = ?")
-                        params.append(user_id)
-                    elif device_id:
-                        conditions.append("device_id = ?")
-                        params.append(device_id)
-            elif view_mode == "admin_all":
-                pass 
-            else:
-                if user_id:
-                    conditions.append("user_id = ?")
-                    conditions.append("is_shared = 0")
-                    params.append(user_id)
-                else:
-                    conditions.append("device_id = ?")
-                    conditions.append("is_shared = 0")
-                    conditions.append("user_id IS NULL")
-                    params.append(device_id)
+            conditions, params = _visibility_conditions(view_mode, user_id, device_id, only_mine)
 
             if keyword:
                 conditions.append("(filename LIKE ? OR url LIKE ?)")
@@ -132,30 +152,7 @@ def get_history_list(page: int = 1, page_size: int = 20, keyword: str = "",
 
             # 获取总条数
             count_query = "SELECT COUNT(*) FROM history"
-            count_params: list = []
-            count_conditions: list = []
-
-            if view_mode == "shared":
-                count_conditions.append("is_shared = 1")
-                if only_mine:
-                    if user_id:
-                        count_conditions.append("user_id = ?")
-                        count_params.append(user_id)
-                    elif device_id:
-                        count_conditions.append("device_id = ?")
-                        count_params.append(device_id)
-            elif view_mode == "admin_all":
-                pass
-            else:
-                if user_id:
-                    count_conditions.append("user_id = ?")
-                    count_conditions.append("is_shared = 0")
-                    count_params.append(user_id)
-                else:
-                    count_conditions.append("device_id = ?")
-                    count_conditions.append("is_shared = 0")
-                    count_conditions.append("user_id IS NULL")
-                    count_params.append(device_id)
+            count_conditions, count_params = _visibility_conditions(view_mode, user_id, device_id, only_mine)
 
             if keyword:
                 count_conditions.append("(filename LIKE ? OR url LIKE ?)")
@@ -168,18 +165,7 @@ def get_history_list(page: int = 1, page_size: int = 20, keyword: str = "",
             total = c.fetchone()[0]
 
             # 转换结果格式
-            data = []
-            for row in rows:
-                item = dict(row)
-                if is_admin:
-                    item['is_mine'] = True
-                elif user_id:
-                    item['is_mine'] = (item['user_id'] == user_id) or (item['user_id'] is None)
-                elif device_id:
-                    item['is_mine'] = (item['device_id'] == device_id)
-                else:
-                    item['is_mine'] = False
-                data.append(item)
+            data = [_with_is_mine(dict(row), device_id, user_id, is_admin) for row in rows]
             
             return {"success": True, "data": data, "total": total, "page": page, "page_size": page_size}
     except Exception as e:
@@ -187,6 +173,25 @@ def get_history_list(page: int = 1, page_size: int = 20, keyword: str = "",
         return {"success": False, "error": str(e)}
 
 
+def get_history_by_hashes(hashes: List[str], device_id: str = None, user_id: int = None, is_admin: bool = False,
+                          view_mode: str = "private", only_mine: bool = False) -> List[Dict[str, Any]]:
+    """按内容哈希批量查询历史记录 (可见性规则与 get_history_list 相同)，同一哈希可能有多条记录"""
+    if not hashes:
+        return []
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            conditions, params = _visibility_conditions(view_mode, user_id, device_id, only_mine)
+            conditions.append(f"hash IN ({','.join('?' * len(hashes))})")
+            params.extend(hashes)
+            c.execute("SELECT * FROM history WHERE " + " AND ".join(conditions) + " ORDER BY created_at DESC", params)
+            return [_with_is_mine(dict(row), device_id, user_id, is_admin) for row in c.fetchall()]
+    except Exception as e:
+        logger.error(f"按哈希查询历史记录失败: {e}")
+        return []
+
+
 def delete_history_items(ids: List[int], device_id: str = None, user_id: int = None, is_admin: bool = False) -> Dict[str, Any]:
     """批量删除历史记录"""
     try:
@@ -355,6 +360,78 @@ def get_image_by_hash(file_hash: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+def get_image_owners_by_hash(file_hash: str) -> List[Dict[str, Any]]:
+    """同一内容的全部上传者 [{user_id, device_id, filename}] (每个用户 / 设备一条，用于违规清理后的通知)"""
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute(
+                """SELECT user_id, device_id, MIN(filename) AS filename FROM history
+                   WHERE hash = ? GROUP BY user_id, device_id""",
+                (file_hash,),
+            )
+            return [dict(row) for row in c.fetchall()]
+    except Exception as e:
+        logger.error(f"查找图片上传者失败(Hash): {e}")
+        return []
+
+
+def get_audited_image_by_hash(file_hash: str) -> Optional[Dict[str, Any]]:
+    """根据 Hash 查找已通过审核的图片记录 (audit_status 为 NULL 的旧数据视为未审核)"""
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("SELECT * FROM history WHERE hash = ? AND audit_status = 'passed' LIMIT 1", (file_hash,))
+            row = c.fetchone()
+            if row:
+                return dict(row)
+    except Exception as e:
+        logger.error(f"查找已审核图片失败(Hash): {e}")
+    return None
+
+
+def get_phash_entries_since(last_id: int, limit: int = 50000) -> List[tuple]:
+    """id 大于 last_id 且有感知哈希的记录 [(id, hash, phash)]，按 id 升序 (近重复索引增量同步用)"""
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT id, hash, phash FROM history WHERE id > ? AND phash IS NOT NULL ORDER BY id LIMIT ?",
+                (last_id, limit),
+            )
+            return c.fetchall()
+    except Exception as e:
+        logger.error(f"读取感知哈希失败: {e}")
+        return []
+
+
+def set_phash(file_hash: str, phash: str) -> bool:
+    """记录同一 Hash 所有图片记录的感知哈希 (补算旧数据用)"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                conn.execute("UPDATE history SET phash = ? WHERE hash = ?", (phash, file_hash))
+            return True
+    except Exception as e:
+        logger.error(f"更新感知哈希失败: {e}")
+        return False
+
+
+def set_audit_status(file_hash: str, status: str) -> bool:
+    """记录同一 Hash 所有图片记录的审核结论"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("UPDATE history SET audit_status = ? WHERE hash = ?", (status, file_hash))
+            return True
+    except Exception as e:
+        logger.error(f"更新审核状态失败: {e}")
+        return False
+
+
 def get_image_by_url(url: str) -> Optional[Dict[str, Any]]:
     """根据 URL 查找图片记录"""
     try:
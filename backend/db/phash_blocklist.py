@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# backend/db/phash_blocklist.py
+# 感知哈希黑名单数据库操作 - 被删除的违规图片的 dHash，上传时在内存中按汉明半径比对
+#
+# 条目在管理员以违规为由删除 / 批量删除 (block=true)、后台审核清理违规图片时自动登记，也可由管理员手动增删。
+# 各进程按 (条目数, 最大 id) 判断黑名单是否变化，变化时整体重新加载 (黑名单规模远小于图库)。
+
+import sqlite3
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def add_blocked_phash(phash: str, content_hash: str = None, reason: str = None,
+                      source: str = "manual", created_by: int = None) -> Optional[int]:
+    """登记感知哈希 (已存在时不重复登记)，返回条目 id"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute(
+                    """INSERT OR IGNORE INTO phash_blocklist (phash, content_hash, reason, source, created_by)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    (phash, content_hash, reason, source, created_by),
+                )
+                c.execute("SELECT id FROM phash_blocklist WHERE phash = ?", (phash,))
+                row = c.fetchone()
+                return row[0] if row else None
+    except Exception as e:
+        logger.error(f"登记感知哈希黑名单失败: {e}")
+        return None
+
+
+def remove_blocked_phash(entry_id: int) -> bool:
+    """移除黑名单条目，条目不存在时返回 False"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("DELETE FROM phash_blocklist WHERE id = ?", (entry_id,))
+                return c.rowcount > 0
+    except Exception as e:
+        logger.error(f"移除感知哈希黑名单失败: {e}")
+        return False
+
+
+def get_blocked_phashes() -> List[Tuple[int, str]]:
+    """全部黑名单条目 [(id, phash)]"""
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, phash FROM phash_blocklist")
+            return c.fetchall()
+    except Exception as e:
+        logger.error(f"读取感知哈希黑名单失败: {e}")
+        return []
+
+
+def get_phash_blocklist_version() -> Tuple[int, int]:
+    """(条目数, 最大 id)，任一变化说明黑名单有增删"""
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM phash_blocklist")
+            return tuple(c.fetchone())
+    except Exception as e:
+        logger.error(f"读取感知哈希黑名单版本失败: {e}")
+        return (-1, -1)
+
+
+def list_blocked_phashes(page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+    """分页列出黑名单条目 (新登记的在前)"""
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM phash_blocklist")
+            total = c.fetchone()[0]
+            c.execute(
+                "SELECT * FROM phash_blocklist ORDER BY id DESC LIMIT ? OFFSET ?",
+                (page_size, (page - 1) * page_size),
+            )
+            return {"success": True, "data": [dict(row) for row in c.fetchall()], "total": total,
+                    "page": page, "page_size": page_size}
+    except Exception as e:
+        logger.error(f"列出感知哈希黑名单失败: {e}")
+        return {"success": False, "error": str(e)}
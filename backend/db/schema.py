@@ -19,6 +19,8 @@ TABLES = {
             user_id INTEGER,
             is_shared INTEGER DEFAULT 0,
             ip_address TEXT,
+            audit_status TEXT,
+            phash TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY(user_id) REFERENCES users(id)
         )
@@ -110,6 +112,70 @@ TABLES = {
             resolved_at TIMESTAMP,
             FOREIGN KEY(reporter_id) REFERENCES users(id)
         )
+    """,
+    "upload_sessions": """
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            device_id TEXT,
+            ip_address TEXT,
+            filename TEXT NOT NULL,
+            content_type TEXT,
+            total_size INTEGER NOT NULL,
+            received INTEGER DEFAULT 0,
+            is_shared INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        )
+    """,
+    "audit_jobs": """
+        CREATE TABLE IF NOT EXISTS audit_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content_hash TEXT UNIQUE NOT NULL,
+            object_name TEXT NOT NULL,
+            filename TEXT,
+            user_id INTEGER,
+            device_id TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            verdict TEXT,
+            last_error TEXT,
+            lease_owner TEXT,
+            lease_expires_at TIMESTAMP,
+            run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "audit_verdicts": """
+        CREATE TABLE IF NOT EXISTS audit_verdicts (
+            content_hash TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            safe INTEGER NOT NULL,
+            score REAL,
+            reason TEXT,
+            details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "phash_blocklist": """
+        CREATE TABLE IF NOT EXISTS phash_blocklist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phash TEXT UNIQUE NOT NULL,
+            content_hash TEXT,
+            reason TEXT,
+            source TEXT,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "deleted_objects": """
+        CREATE TABLE IF NOT EXISTS deleted_objects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            object_key TEXT NOT NULL,
+            deleted_at REAL NOT NULL
+        )
     """
 }
 
@@ -120,6 +186,7 @@ INDEXES = [
     "CREATE INDEX IF NOT EXISTS idx_device_id ON history (device_id)",
     "CREATE INDEX IF NOT EXISTS idx_is_shared ON history (is_shared)",
     "CREATE INDEX IF NOT EXISTS idx_user_id ON history (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_hash ON history (hash)",
     "CREATE INDEX IF NOT EXISTS idx_username ON users (username)",
     "CREATE UNIQUE INDEX IF NOT EXISTS idx_google_id ON users (google_id)",
     "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)",
@@ -128,4 +195,7 @@ INDEXES = [
     "CREATE INDEX IF NOT EXISTS idx_notif_device ON user_notifications(device_id)",
     "CREATE INDEX IF NOT EXISTS idx_report_status ON abuse_reports(status)",
     "CREATE INDEX IF NOT EXISTS idx_report_hash ON abuse_reports(image_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires ON upload_sessions(expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_jobs_status ON audit_jobs(status, run_after)",
+    "CREATE INDEX IF NOT EXISTS idx_deleted_objects_at ON deleted_objects(deleted_at)",
 ]
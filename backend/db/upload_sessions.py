@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# backend/db/upload_sessions.py
+# 断点续传会话数据库操作 - 记录每个分块上传会话已接收的字节数
+
+import sqlite3
+import logging
+from typing import Dict, Any, List, Optional
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def create_upload_session(session_id: str, filename: str, total_size: int, ttl_seconds: int,
+                          content_type: str = None, is_shared: bool = False,
+                          user_id: int = None, device_id: str = None, ip_address: str = None) -> bool:
+    """创建断点续传会话"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    INSERT INTO upload_sessions
+                        (id, user_id, device_id, ip_address, filename, content_type, total_size, is_shared, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now', ?))
+                """, (session_id, user_id, device_id, ip_address, filename, content_type, total_size,
+                      1 if is_shared else 0, f"+{ttl_seconds} seconds"))
+            return True
+    except Exception as e:
+        logger.error(f"Create upload session failed: {e}")
+        return False
+
+
+def get_upload_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """获取未过期的断点续传会话"""
+    try:
+        with get_db_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("SELECT * FROM upload_sessions WHERE id = ? AND expires_at > datetime('now')", (session_id,))
+            row = c.fetchone()
+            return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"Get upload session failed: {e}")
+        return None
+
+
+def advance_upload_session(session_id: str, expected_offset: int, new_offset: int, ttl_seconds: int) -> bool:
+    """
+    推进会话的已接收字节数并续期
+
+    仅当当前偏移仍为 expected_offset 时更新，防止并发请求相互覆盖。
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("""
+                    UPDATE upload_sessions SET received = ?, expires_at = datetime('now', ?)
+                    WHERE id = ? AND received = ?
+                """, (new_offset, f"+{ttl_seconds} seconds", session_id, expected_offset))
+                return c.rowcount == 1
+    except Exception as e:
+        logger.error(f"Advance upload session failed: {e}")
+        return False
+
+
+def delete_upload_session(session_id: str) -> bool:
+    """删除断点续传会话"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("DELETE FROM upload_sessions WHERE id = ?", (session_id,))
+            return True
+    except Exception as e:
+        logger.error(f"Delete upload session failed: {e}")
+        return False
+
+
+def pop_expired_upload_sessions() -> List[str]:
+    """删除所有已过期的会话，返回被删除的会话 ID (用于清理暂存文件)"""
+    try:
+        with get_db_connection() as conn:
+            with conn:
+                c = conn.cursor()
+                c.execute("SELECT id FROM upload_sessions WHERE expires_at <= datetime('now')")
+                expired = [row[0] for row in c.fetchall()]
+                if expired:
+                    c.executemany("DELETE FROM upload_sessions WHERE id = ?", [(sid,) for sid in expired])
+                return expired
+    except Exception as e:
+        logger.error(f"Pop expired upload sessions failed: {e}")
+        return []
+
+
+def get_upload_session_ids() -> List[str]:
+    """获取所有会话 ID (含已过期)，用于识别没有会话记录的孤儿暂存文件"""
+    try:
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id FROM upload_sessions")
+            return [row[0] for row in c.fetchall()]
+    except Exception as e:
+        logger.error(f"Get upload session ids failed: {e}")
+        return []
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+阻塞 I/O 执行器模块
+
+boto3 是同步库，直接在 async 路由里调用会阻塞事件循环；放进 AnyIO 默认线程池又会
+在慢客户端下载大图时长期占用槽位，导致 /history 等同步接口排队。
+这里为 S3 I/O 提供独立的有界线程池，并把 StreamingBody 包装成按块读取的异步迭代器：
+每次只在线程池中读取一块，发送给客户端后才读取下一块 (背压)，线程不会在整个传输期间被占用。
+
+上传流水线中的 CPU 密集步骤 (整文件哈希、PIL 解析) 使用另一个更小的有界线程池，
+数量与 CPU 核数相当，避免大量并发上传时挤占 I/O 线程、也避免无限制地抢占 GIL。
+
+后台审核 (本进程推理或等待模型进程池) 使用第三个线程池，大小与审核并发数相同：
+一次审核 (含首次懒加载模型) 可能持续数十秒，不能占用上传请求路径上的 CPU / I/O 线程。
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+_audit_executor: Optional[ThreadPoolExecutor] = None
+_io_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """获取 S3 I/O 线程池 (懒加载)"""
+    global _io_executor
+    if _io_executor is None:
+        with _io_lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=max(1, config.S3_IO_WORKERS),
+                    thread_name_prefix="s3-io",
+                )
+    return _io_executor
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """获取 CPU 密集任务线程池 (懒加载)"""
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _io_lock:
+            if _cpu_executor is None:
+                _cpu_executor = ThreadPoolExecutor(
+                    max_workers=max(1, config.UPLOAD_CPU_WORKERS),
+                    thread_name_prefix="cpu",
+                )
+    return _cpu_executor
+
+
+def get_audit_executor(workers: Optional[int] = None) -> ThreadPoolExecutor:
+    """
+    获取审核线程池 (懒加载)，大小在首次创建时确定
+
+    Args:
+        workers: 线程数，默认 AUDIT_WORKER_CONCURRENCY (审核 worker 启动时传入实际并发数)
+    """
+    global _audit_executor
+    if _audit_executor is None:
+        with _io_lock:
+            if _audit_executor is None:
+                _audit_executor = ThreadPoolExecutor(
+                    max_workers=max(1, workers or config.AUDIT_WORKER_CONCURRENCY),
+                    thread_name_prefix="audit",
+                )
+    return _audit_executor
+
+
+async def run_io(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在 S3 I/O 线程池中执行阻塞调用 (MinIO 请求、SQLite 读写等)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def run_cpu(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在 CPU 线程池中执行计算密集的调用 (哈希、图片解码等)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def run_audit(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在审核线程池中执行审核调用 (模型推理、等待模型进程池)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_audit_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def iter_body(body, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    将 botocore StreamingBody 转为异步块迭代器
+
+    - 优先使用 iter_chunks，非 botocore 的文件对象退化为 read(chunk_size)
+    - 客户端断开时 Starlette 会取消迭代，finally 中立即关闭 S3 连接，不再继续拉取剩余数据
+    """
+    chunk_size = chunk_size or config.IMAGE_STREAM_CHUNK_SIZE
+    if hasattr(body, "iter_chunks"):
+        chunks = body.iter_chunks(chunk_size)
+        read_chunk = functools.partial(next, chunks, b"")
+    else:
+        read_chunk = functools.partial(body.read, chunk_size)
+
+    try:
+        while True:
+            chunk = await run_io(read_chunk)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
+
+def _pool_stats(executor: Optional[ThreadPoolExecutor], workers: int) -> Dict[str, Any]:
+    if executor is None:
+        return {"workers": workers, "threads": 0, "queued": 0}
+    return {
+        "workers": executor._max_workers,
+        "threads": len(executor._threads),
+        "queued": executor._work_queue.qsize(),
+    }
+
+
+def get_executor_stats() -> Dict[str, Any]:
+    """S3 I/O 线程池运行状态，供 /admin/perf/stats 使用"""
+    return _pool_stats(_io_executor, config.S3_IO_WORKERS)
+
+
+def get_cpu_executor_stats() -> Dict[str, Any]:
+    """CPU 线程池运行状态，供 /admin/perf/stats 使用"""
+    return _pool_stats(_cpu_executor, config.UPLOAD_CPU_WORKERS)
+
+
+def get_audit_executor_stats() -> Dict[str, Any]:
+    """审核线程池运行状态，供 /admin/perf/stats 使用"""
+    return _pool_stats(_audit_executor, config.AUDIT_WORKER_CONCURRENCY)
+
+
+def shutdown_executors() -> None:
+    """服务器关闭时释放线程池"""
+    global _io_executor, _cpu_executor, _audit_executor
+    with _io_lock:
+        if _io_executor is not None:
+            _io_executor.shutdown(wait=False, cancel_futures=True)
+            _io_executor = None
+            logger.info("🧵 [Executor] S3 I/O 线程池已关闭")
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=False, cancel_futures=True)
+            _cpu_executor = None
+            logger.info("🧵 [Executor] CPU 线程池已关闭")
+        if _audit_executor is not None:
+            _audit_executor.shutdown(wait=False, cancel_futures=True)
+            _audit_executor = None
+            logger.info("🧵 [Executor] 审核线程池已关闭")
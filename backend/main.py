@@ -33,17 +33,21 @@ from slowapi.middleware import SlowAPIMiddleware
 # 项目内部模块
 from . import database
 from . import storage
+from . import executors
+from . import audit
 from .limiter import limiter
 from .config import (
     SECRET_KEY, GOOGLE_CLIENT_ID,
-    DEFAULT_PORT, DEFAULT_HOST
+    DEFAULT_PORT, DEFAULT_HOST,
+    AUDIT_MODEL_WORKERS, AUDIT_WORKER_CONCURRENCY, AUDIT_PRELOAD_MODELS
 )
 from .global_state import SYSTEM_SETTINGS
+from .services import audit_pool, audit_queue, maintenance
 from .logging_config import setup_logging
 from .exceptions import ImageToolException
 
 # 路由模块
-from .routers import auth, upload, user, admin
+from .routers import auth, upload, resumable, user, admin
 from .routers import captcha, notifications, debug, pages
 
 
@@ -123,7 +127,19 @@ async def lifespan(_app: FastAPI):
     if not GOOGLE_CLIENT_ID:
         logger.info("💡 GOOGLE_CLIENT_ID 未配置，Google 登录功能将不可用。")
     
-    # 3. 打印启动提示
+    # 3. 启动定时维护任务 (遗留分片上传清理等)
+    maintenance.start_background_jobs()
+    
+    # 3.5 启动审核任务 worker (继续处理上次未完成的审核)
+    #      配置了模型进程池时模型只加载在子进程中，本进程不导入 torch
+    #      AUDIT_PRELOAD_MODELS 时模型在后台线程中加载并预热 (/ready 就绪前审核任务留在队列中)
+    if AUDIT_MODEL_WORKERS > 0 and AUDIT_WORKER_CONCURRENCY > 0:
+        await executors.run_io(audit_pool.start_pool, AUDIT_MODEL_WORKERS)
+    elif AUDIT_PRELOAD_MODELS and AUDIT_WORKER_CONCURRENCY > 0:
+        audit.start_background_warmup()
+    audit_queue.start_workers()
+    
+    # 4. 打印启动提示
     local_ip = get_local_ip()
     print("\n" + "=" * 60)
     print(f"✅ 服务器启动成功！ (Host IP: {local_ip})")
@@ -142,6 +158,10 @@ async def lifespan(_app: FastAPI):
 
     yield  # 服务器运行中...
 
+    await audit_queue.stop_workers()
+    await executors.run_io(audit_pool.stop_pool)
+    await maintenance.stop_background_jobs()
+    executors.shutdown_executors()
     logger.info("👋 服务器已停止")
 
 
@@ -206,6 +226,7 @@ async def image_tool_exception_handler(request: Request, exc: ImageToolException
 # 核心业务路由
 app.include_router(auth.router)
 app.include_router(upload.router)
+app.include_router(resumable.router)
 app.include_router(user.router)
 app.include_router(admin.router)
 
@@ -312,6 +333,37 @@ def health_check() -> Dict[str, Any]:
     return result
 
 
+@app.get("/ready", tags=["系统"])
+@app.get("/readyz", tags=["系统"])
+def readiness_check():
+    """
+    就绪检查接口 (审核模型)
+    
+    与 /health 分开: 模型加载期间服务仍然健康 (可以上传，审核任务在队列中等待)，只是尚未就绪。
+    未就绪时返回 503，可用作负载均衡 / K8s readinessProbe。
+    
+    Returns:
+        - ready: 审核模型是否已加载完成
+        - mode: "lazy" (首次审核时加载) | "preload" (本进程后台预热) |
+                "model_workers" (模型进程池) | "not_applicable" (本进程不处理审核)
+        - models: 各模型的 state ("loading" | "warming" | "ready" | "failed")、load_seconds、warmup_seconds、error
+        - workers: 模型进程池模式下各模型进程的就绪状态与其中各模型的状态
+    """
+    pool = audit_pool.get_pool()
+    if AUDIT_WORKER_CONCURRENCY <= 0:
+        result = {"ready": True, "mode": "not_applicable"}
+    elif pool is not None:
+        result = {"ready": pool.ready(), "mode": "model_workers", "workers": pool.readiness()}
+    elif AUDIT_PRELOAD_MODELS:
+        result = {"ready": not audit.warmup_pending(), "mode": "preload", "models": audit.get_model_status()}
+    else:
+        result = {"ready": True, "mode": "lazy", "models": audit.get_model_status()}
+    
+    if not result["ready"]:
+        return JSONResponse(status_code=503, content=result)
+    return result
+
+
 # ==================== 静态文件与首页 ====================
 
 # 挂载静态文件目录
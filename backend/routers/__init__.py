@@ -5,6 +5,7 @@
 包含所有 API 路由模块：
 - auth: 认证相关（登录、注册、密码重置等）
 - upload: 文件上传相关
+- resumable: 断点续传 (大文件分块上传)
 - user: 用户信息相关
 - admin: 管理员后台相关
 - captcha: 验证码相关
@@ -14,6 +15,7 @@
 """
 from . import auth
 from . import upload
+from . import resumable
 from . import user
 from . import admin
 from . import captcha
@@ -24,6 +26,7 @@ from . import pages
 __all__ = [
     "auth",
     "upload", 
+    "resumable",
     "user",
     "admin",
     "captcha",
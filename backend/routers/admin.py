@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import re
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
 from .. import database, schemas
@@ -26,6 +27,36 @@ async def get_stats(current_user: dict = Depends(get_current_admin)):
     """获取管理后台统计数据"""
     return database.get_admin_stats()
 
+@router.get("/perf/stats")
+async def get_perf_stats(current_user: dict = Depends(get_current_admin)):
+    """获取性能相关的运行时计数 (图片缓存命中率等)"""
+    from .. import audit, storage, executors
+    from ..services import audit_pool, audit_queue, metrics, phash, vector_index
+
+    pool = audit_pool.get_pool()
+    return {
+        "image_cache": storage.get_cache_stats(),
+        "io_executor": executors.get_executor_stats(),
+        "cpu_executor": executors.get_cpu_executor_stats(),
+        "audit_executor": executors.get_audit_executor_stats(),
+        "upload_pipeline": metrics.upload_stats.stats(),
+        "audit_queue": await executors.run_io(database.get_audit_queue_stats),
+        "audit_pool": pool.stats() if pool else None,
+        "audit_batching": audit.get_batcher_stats(),
+        "audit_stages": audit_queue.get_stage_stats(),
+        "vector_index": vector_index.get_index_stats(),
+        "near_duplicates": phash.get_near_duplicate_index().stats(),
+        "phash_blocklist": phash.get_blocklist().stats(),
+    }
+
+@router.post("/audit/jobs/retry-dead")
+async def retry_dead_audit_jobs(current_user: dict = Depends(get_current_admin)):
+    """将多次失败进入 dead 的审核任务重新排队"""
+    from .. import executors
+
+    count = await executors.run_io(database.retry_dead_audit_jobs)
+    return {"success": True, "count": count}
+
 @router.get("/reports")
 async def get_reports(
     page: int = 1, 
@@ -64,6 +95,94 @@ async def get_all_images(
         view_mode="admin_all"
     )
 
+@router.get("/images/search")
+async def search_images(
+    q: Optional[str] = None,
+    hash: Optional[str] = None,
+    model: str = Query("openai_clip", pattern="^(openai_clip|chinese_clip)$"),
+    top_k: int = Query(30, ge=1, le=200),
+    view_mode: str = Query("admin_all", pattern="^(admin_all|shared|private)$"),
+    only_mine: bool = False,
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    图库语义搜索: 以文搜图 (q) 或以图搜图 (hash，使用该图片已保存的 CLIP 向量)
+
+    结果按相似度降序，可见性规则与 /history 相同 (view_mode=admin_all / shared / private)。
+    中文描述建议使用 model=chinese_clip。
+    """
+    from .. import executors
+    from ..services import embedding_store, vector_index
+
+    if bool(q) == bool(hash):
+        raise HTTPException(status_code=400, detail="请提供 q (文本) 或 hash (图片) 其中之一")
+
+    if hash:
+        query = await executors.run_io(embedding_store.get_store(model).get, hash)
+        if query is None:
+            raise HTTPException(status_code=404, detail="该图片没有已保存的向量 (尚未完成审核)")
+    else:
+        try:
+            query = await executors.run_cpu(vector_index.encode_text, model, q)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"文本向量计算失败: {e}")
+
+    index = vector_index.get_index(model)
+    # 按可见性过滤后可能不足 top_k，候选数逐步放大
+    fetch = top_k * 4
+    while True:
+        hits = await executors.run_cpu(index.search, query, fetch)
+        scores = {h: s for h, s in hits if h != hash}
+        rows = await executors.run_io(
+            database.get_history_by_hashes, list(scores),
+            user_id=current_user["id"], is_admin=True, view_mode=view_mode, only_mine=only_mine,
+        )
+        # 同一哈希可能有多个上传者的记录，每张图片只保留最新的一条 (结果已按 created_at 降序)
+        unique = {}
+        for row in rows:
+            unique.setdefault(row["hash"], row)
+        rows = list(unique.values())
+        if len(rows) >= top_k or len(hits) < fetch or fetch >= 4096:
+            break
+        fetch *= 4
+
+    for row in rows:
+        row["score"] = round(scores[row["hash"]], 4)
+    rows.sort(key=lambda row: row["score"], reverse=True)
+    return {"success": True, "data": rows[:top_k], "index": index.stats()}
+
+@router.get("/images/similar")
+async def find_similar_images(
+    hash: str,
+    radius: int = Query(8, ge=0, le=16),
+    current_user: dict = Depends(get_current_admin)
+):
+    """近重复图片: 感知哈希 (dHash) 汉明距离不超过 radius 的其他图片，按距离升序"""
+    from .. import executors
+    from ..services import phash
+
+    image = await executors.run_io(database.get_image_by_hash, hash)
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not image.get("phash"):
+        raise HTTPException(status_code=404, detail="该图片没有感知哈希 (旧数据可用 tools/backfill_phash.py 补算)")
+
+    index = phash.get_near_duplicate_index()
+    hits = await executors.run_io(index.query, image["phash"], radius)
+    distances = {h: d for h, d in hits[:500] if h != hash}
+    rows = await executors.run_io(
+        database.get_history_by_hashes, list(distances), is_admin=True, view_mode="admin_all",
+    )
+    # 同一哈希可能有多个上传者的记录，每张图片只保留最新的一条
+    unique = {}
+    for row in rows:
+        unique.setdefault(row["hash"], row)
+    rows = list(unique.values())
+    for row in rows:
+        row["distance"] = distances[row["hash"]]
+    rows.sort(key=lambda row: row["distance"])
+    return {"success": True, "phash": image["phash"], "data": rows, "index": index.stats()}
+
 @router.post("/images/delete")
 async def admin_delete_image(
     data: schemas.AdminDeleteImage, 
@@ -71,6 +190,7 @@ async def admin_delete_image(
 ):
     """管理员强制删除图片"""
     from .. import storage
+    from ..services import phash
     
     # 1. 查找图片
     image = database.get_image_by_hash(data.hash)
@@ -94,8 +214,14 @@ async def admin_delete_image(
         # 这里最好不要乱删。如果 url 不对劲，可能不是 minio 的文件（例如外部链接）
         pass
     
-    # 3. 删库
-    success = database.delete_image_by_hash_system(data.hash)
+    # 3. 感知哈希加入黑名单 (需在删库之前读取)
+    # data.hash 可能只是 keyword 回退时的搜索词，统一使用查到的记录的真实哈希
+    image_hash = image["hash"]
+    if data.block:
+        phash.block_content(image_hash, "admin_delete", reason=data.reason, created_by=current_user["id"])
+
+    # 4. 删库
+    success = database.delete_image_by_hash_system(image_hash)
     
     if success:
         return {"success": True}
@@ -103,6 +229,59 @@ async def admin_delete_image(
         raise HTTPException(status_code=500, detail="Delete failed")
 
 
+@router.get("/phash-blocklist")
+async def get_phash_blocklist(
+    page: int = 1,
+    page_size: int = 50,
+    current_user: dict = Depends(get_current_admin)
+):
+    """感知哈希黑名单 (删除的违规图片自动登记，上传时拦截相似图片)"""
+    from .. import executors
+
+    return await executors.run_io(database.list_blocked_phashes, page, page_size)
+
+@router.post("/phash-blocklist")
+async def add_phash_blocklist_entry(
+    data: schemas.PhashBlocklistAdd,
+    current_user: dict = Depends(get_current_admin)
+):
+    """手动加入黑名单: 按图片内容哈希取其感知哈希，或直接提交 16 位十六进制 dHash"""
+    from .. import executors
+    from ..services import phash
+
+    value = (data.phash or "").strip().lower()
+    if data.hash and not value:
+        image = await executors.run_io(database.get_image_by_hash, data.hash)
+        if not image:
+            raise HTTPException(status_code=404, detail="Image not found")
+        value = image.get("phash") or ""
+    if not re.fullmatch(r"[0-9a-f]{16}", value):
+        raise HTTPException(status_code=400, detail="需要有效的 phash (16 位十六进制) 或带感知哈希的图片 hash")
+    if not phash.is_informative(phash.from_hex(value)):
+        raise HTTPException(status_code=400, detail="该哈希信息量过低 (纯色 / 低细节图片)，加入黑名单会误伤大量图片")
+
+    entry_id = await executors.run_io(
+        database.add_blocked_phash, value, data.hash, data.reason, "manual", current_user["id"],
+    )
+    if entry_id is None:
+        raise HTTPException(status_code=500, detail="Failed to add blocklist entry")
+    await executors.run_io(phash.get_blocklist().refresh, True)
+    return {"success": True, "id": entry_id, "phash": value}
+
+@router.delete("/phash-blocklist/{entry_id}")
+async def remove_phash_blocklist_entry(
+    entry_id: int,
+    current_user: dict = Depends(get_current_admin)
+):
+    """移除黑名单条目 (误判时使用)"""
+    from .. import executors
+    from ..services import phash
+
+    if not await executors.run_io(database.remove_blocked_phash, entry_id):
+        raise HTTPException(status_code=404, detail="Blocklist entry not found")
+    await executors.run_io(phash.get_blocklist().refresh, True)
+    return {"success": True}
+
 @router.post("/reports/batch-resolve")
 async def batch_resolve_reports(
     data: schemas.BatchResolveReports, 
@@ -122,13 +301,16 @@ async def batch_delete_images(
 ):
     """批量删除多张图片"""
     from .. import storage
+    from ..services import phash
     
-    # 1. 先删除 MinIO 文件
+    # 1. 先删除 MinIO 文件，感知哈希加入黑名单
     for h in data.hashes:
         image = database.get_image_by_hash(h)
         if image and image.get("url") and "/mycloud/" in image["url"]:
             object_key = image["url"].replace("/mycloud/", "")
             storage.delete_from_minio(object_key)
+        if image and data.block:
+            phash.block_content(h, "admin_batch_delete", reason="Admin Batch Deleted", created_by=current_user["id"])
     
     # 2. 批量删除数据库记录
     result = database.batch_delete_images_by_hashes(data.hashes)
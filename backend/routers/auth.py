@@ -18,6 +18,7 @@ from ..limiter import limiter
 
 
 from .. import database
+from .. import executors
 from .. import schemas
 from .. import email_utils
 from .. import captcha_utils  # 验证码工具
@@ -71,12 +72,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user_optional(token: str = Depends(oauth2_scheme)):
-    """
-    获取当前用户（如果 token 有效），否则返回 None。
-    """
-    if not token:
-        return None
+def _load_user_from_token(token: str) -> Optional[dict]:
+    """校验 token 并查询用户 (阻塞的 SQLite 调用)"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -95,6 +92,15 @@ async def get_current_user_optional(token: str = Depends(oauth2_scheme)):
     user = database.get_user_by_username(username)
     return user
 
+async def get_current_user_optional(token: str = Depends(oauth2_scheme)):
+    """
+    获取当前用户（如果 token 有效），否则返回 None。
+    数据库查询在 I/O 线程池执行，不阻塞事件循环。
+    """
+    if not token:
+        return None
+    return await executors.run_io(_load_user_from_token, token)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     强制认证：如果用户未登录则抛出 401 异常。
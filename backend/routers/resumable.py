@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+断点续传路由模块
+
+参考 tus 协议的简化版本，供弱网环境下上传大文件：
+1. POST   /upload/sessions                 创建会话 (文件名 / 总大小 / 上传模式)
+2. PUT    /upload/sessions/{id}            以 Upload-Offset 头指定偏移写入一个分块
+3. GET    /upload/sessions/{id}            查询已接收的偏移 (断线后从这里继续)
+4. POST   /upload/sessions/{id}/complete   全部接收后计算哈希，走与 /upload 相同的入库与审核任务登记流程
+5. DELETE /upload/sessions/{id}            取消上传
+
+会话 ID 是随机生成的 32 位十六进制串，登录用户创建的会话只能由本人继续。
+分块中途断开时已写入的字节仍然计入偏移，客户端重试时只需补发剩余部分。
+"""
+import asyncio
+import uuid
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+
+from .. import config
+from .. import database
+from .. import executors
+from .. import schemas
+from ..routers.auth import get_current_user_optional
+from ..routers.upload import check_upload_quota, get_max_upload_size, store_upload, validate_file_upload
+from ..services import metrics, upload_spool
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/upload/sessions", tags=["断点续传"])
+
+# 同一会话的请求在进程内排队执行；跨进程的互斥由暂存文件的 flock 保证 (见 _locked_staging_file)
+# 值为 [锁, 引用数]，没有请求使用时移除
+_session_locks: Dict[str, list] = {}
+
+
+@asynccontextmanager
+async def _session_lock(session_id: str):
+    entry = _session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _session_locks.pop(session_id, None)
+
+
+@asynccontextmanager
+async def _locked_staging_file(session_id: str, mode: str):
+    """打开会话暂存文件并持有独占 flock，另一个进程正在处理该会话时返回 409"""
+    try:
+        f = await executors.run_io(upload_spool.open_staging_file, session_id, mode)
+    except BlockingIOError:
+        raise HTTPException(status_code=409, detail="上传会话正在被另一个请求处理，请稍后重新查询偏移")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    try:
+        yield f
+    finally:
+        await executors.run_io(f.close)
+
+
+def _truncate_to(f, offset: int) -> None:
+    # 丢弃上次异常中断后可能残留的未确认数据
+    f.truncate(offset)
+    f.seek(offset)
+
+
+def _get_owned_session(session_id: str, current_user: Optional[dict]) -> dict:
+    """获取会话并校验归属，不存在、已过期或不属于当前用户时统一返回 404"""
+    session = database.get_upload_session(session_id) if len(session_id) == 32 else None
+    if session is None:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    if session["user_id"] and (not current_user or current_user["id"] != session["user_id"]):
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+    return session
+
+
+def _discard_session(session_id: str) -> None:
+    """删除会话记录和暂存文件 (审核任务按对象键读取内容，无法删除的文件由定时清理处理)"""
+    database.delete_upload_session(session_id)
+    upload_spool.remove_staging_file(session_id)
+
+
+def _offset_response(session: dict, offset: int, status_code: int = 200) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"session_id": session["id"], "offset": offset, "size": session["total_size"]},
+        headers={"Upload-Offset": str(offset), "Upload-Length": str(session["total_size"]), "Cache-Control": "no-store"},
+    )
+
+
+async def _timed_hash(staged) -> str:
+    with metrics.upload_stats.timed("session_hash"):
+        return await executors.run_cpu(upload_spool.hash_file, staged)
+
+
+@router.post("", status_code=201)
+async def create_upload_session(
+    req: schemas.UploadSessionCreate,
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+) -> dict:
+    """创建断点续传会话 (限额、大小与类型在开始传输前检查)"""
+    user_id = current_user['id'] if current_user else None
+    ip_address = request.client.host
+    device_id = request.cookies.get("device_id") if not user_id else None
+
+    # [Rule] 匿名用户只能用共享模式
+    if not user_id and not req.shared_mode:
+        raise HTTPException(status_code=403, detail="匿名用户只能使用共享模式。请登录后使用私有模式。")
+
+    await executors.run_io(check_upload_quota, current_user, ip_address, device_id)
+    if req.size <= 0:
+        raise HTTPException(status_code=400, detail="文件大小无效")
+    validate_file_upload(req.filename, req.size, get_max_upload_size(current_user))
+
+    session_id = uuid.uuid4().hex
+    await executors.run_io(upload_spool.create_staging_file, session_id)
+
+    if not await executors.run_io(
+        database.create_upload_session, session_id, req.filename, req.size, config.UPLOAD_SESSION_TTL_SECONDS,
+        content_type=req.content_type, is_shared=req.shared_mode,
+        user_id=user_id, device_id=device_id, ip_address=ip_address,
+    ):
+        upload_spool.remove_staging_file(session_id)
+        raise HTTPException(status_code=500, detail="创建上传会话失败")
+
+    logger.info(f"📤 [Resumable] 创建会话 {session_id}: {req.filename} ({req.size} bytes)")
+    return {
+        "session_id": session_id,
+        "offset": 0,
+        "size": req.size,
+        "chunk_size": config.UPLOAD_SESSION_CHUNK_SIZE,
+        "expires_in": config.UPLOAD_SESSION_TTL_SECONDS,
+    }
+
+
+@router.get("/{session_id}")
+def get_upload_offset(
+    session_id: str,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+) -> JSONResponse:
+    """查询会话已接收的字节数"""
+    session = _get_owned_session(session_id, current_user)
+    return _offset_response(session, session["received"])
+
+
+@router.put("/{session_id}")
+async def put_upload_chunk(
+    session_id: str,
+    request: Request,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+) -> JSONResponse:
+    """
+    写入一个分块 (请求体为原始字节，Upload-Offset 头为该分块的起始偏移)
+
+    偏移与服务端记录不一致时返回 409 及当前偏移，客户端据此重新对齐。
+    """
+    offset_header = request.headers.get("upload-offset", "")
+    if not offset_header.isdigit():
+        raise HTTPException(status_code=400, detail="缺少或无效的 Upload-Offset 头")
+    offset = int(offset_header)
+
+    async with _session_lock(session_id):
+        # 先校验归属，再加文件锁；持有锁之后读取的偏移不会再被其他进程改变
+        await executors.run_io(_get_owned_session, session_id, current_user)
+        async with _locked_staging_file(session_id, "r+b") as f:
+            session = await executors.run_io(_get_owned_session, session_id, current_user)
+            if offset != session["received"]:
+                return _offset_response(session, session["received"], status_code=409)
+
+            total_size = session["total_size"]
+            written = 0
+            disconnected = False
+            await executors.run_io(_truncate_to, f, offset)
+            try:
+                async for data in request.stream():
+                    if not data:
+                        continue
+                    if offset + written + len(data) > total_size:
+                        raise HTTPException(status_code=400, detail="分块超出文件声明的大小")
+                    await executors.run_io(f.write, data)
+                    written += len(data)
+            except ClientDisconnect:
+                # 弱网断线: 已写入的部分仍然有效，下次从新的偏移继续
+                disconnected = True
+            finally:
+                await executors.run_io(f.flush)
+
+            new_offset = offset + written
+            if written and not await executors.run_io(
+                database.advance_upload_session, session_id, offset, new_offset, config.UPLOAD_SESSION_TTL_SECONDS
+            ):
+                raise HTTPException(status_code=409, detail="上传会话状态已变化，请重新查询偏移")
+
+    if disconnected:
+        logger.info(f"📶 [Resumable] 会话 {session_id} 连接中断，已保存到 {new_offset}/{total_size}")
+    return _offset_response(session, new_offset)
+
+
+@router.post("/{session_id}/complete")
+async def complete_upload_session(
+    session_id: str,
+    request: Request,
+    response: Response,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+) -> JSONResponse:
+    """所有分块接收完成后入库 (哈希 → MinIO → 数据库 → 登记审核任务)"""
+    async with _session_lock(session_id):
+        session = await executors.run_io(_get_owned_session, session_id, current_user)
+        if session["received"] != session["total_size"]:
+            return _offset_response(session, session["received"], status_code=409)
+
+        # 限额在创建会话时检查过，这里再检查一次，防止同时开多个会话绕过
+        await executors.run_io(
+            check_upload_quota, current_user, request.client.host,
+            request.cookies.get("device_id") if not current_user else None,
+        )
+
+        async with _locked_staging_file(session_id, "rb") as staged:
+            upload = upload_spool.SpooledUpload(
+                file=staged,
+                filename=session["filename"],
+                content_type=session["content_type"] or "application/octet-stream",
+                size=session["total_size"],
+                sha256=await _timed_hash(staged),
+            )
+            try:
+                result = await store_upload(request, response, upload, bool(session["is_shared"]), current_user)
+            except HTTPException:
+                raise
+            except Exception as e:
+                # 会话保留，客户端可以重试 complete (放弃时由过期清理删除)
+                logger.error(f"续传入库异常 {session_id}: {e}", exc_info=True)
+                return JSONResponse(
+                    status_code=500,
+                    content={"success": False, "error": f"服务器内部错误: {str(e)}"}
+                )
+
+        # 200 已入库；403 (命中黑名单) 重试也不会通过，两种情况都结束会话
+        if result.status_code in (200, 403):
+            await executors.run_io(_discard_session, session_id)
+            if result.status_code == 200:
+                logger.info(f"✅ [Resumable] 会话 {session_id} 已完成")
+
+    return result
+
+
+@router.delete("/{session_id}")
+def cancel_upload_session(
+    session_id: str,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+) -> dict:
+    """取消上传并删除暂存数据"""
+    _get_owned_session(session_id, current_user)
+    _discard_session(session_id)
+    return {"success": True}
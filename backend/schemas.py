@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class DeleteRequest(BaseModel):
     ids: List[int]
@@ -78,6 +78,7 @@ class ResolveReport(BaseModel):
 class AdminDeleteImage(BaseModel):
     hash: str
     reason: str = "Admin Deleted"
+    block: bool = False  # 违规删除时设为 true: 感知哈希加入黑名单，拦截相似图片再次上传
 
 class BatchResolveReports(BaseModel):
     """批量处理举报的请求体"""
@@ -87,6 +88,13 @@ class BatchResolveReports(BaseModel):
 class BatchDeleteImages(BaseModel):
     """批量删除图片的请求体"""
     hashes: List[str]
+    block: bool = False  # 违规删除时设为 true: 感知哈希加入黑名单
+
+class PhashBlocklistAdd(BaseModel):
+    """加入感知哈希黑名单: 指定图片的内容哈希 (hash)，或直接给出 16 位十六进制 dHash (phash)"""
+    hash: Optional[str] = None
+    phash: Optional[str] = None
+    reason: Optional[str] = None
 
 class AdminPromoteUser(BaseModel):
     is_admin: bool
@@ -100,3 +108,15 @@ class AdminBanUser(BaseModel):
 class BatchDeleteUsers(BaseModel):
     """批量删除用户的请求体"""
     user_ids: List[int]
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    content_type: str = "application/octet-stream"
+    shared_mode: bool = False
+
+class UploadPrecheckRequest(BaseModel):
+    sha256: str
+    size: int
+    filename: str
+    shared_mode: bool = False
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+审核模型进程池模块
+
+NudeNet / Chinese-CLIP / OpenAI CLIP 只加载在独立的模型进程里，调用方进程 (web 或 audit worker) 不导入 torch：
+- 每个模型进程启动时加载一次模型 (AUDIT_PRELOAD_MODELS 时再空跑一次推理)，完成后通过 Pipe 回报各模型状态，
+  之后逐个接收任务；就绪之前分到该进程的任务等待就绪 (不计入审核超时，等待超时也不重启仍在加载的进程)，
+  语义搜索的文本查询在未就绪时直接失败
+- 图片内容放在 multiprocessing.shared_memory 中，Pipe 上只传共享内存名与长度；
+  从 MinIO / 缓存读取时直接写入共享内存，不经过中间 bytes，也不经过 pickle
+- 模型进程崩溃或超时会被重启，当前任务以异常结束，由审核队列按退避重试
+
+AUDIT_MODEL_WORKERS > 0 时审核队列通过进程池审核，否则沿用进程内审核。
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple
+
+from .. import audit
+from .. import config
+from .. import storage
+
+logger = logging.getLogger(__name__)
+
+_mp = get_context("spawn")  # 不继承父进程的线程 / 事件循环 / 数据库连接
+
+
+class ModelWorkerNotReady(Exception):
+    """模型进程仍在加载模型 (等待就绪超时或调用方不等待)，该进程不会因此被重启"""
+
+
+def _attach_shared_memory(name: str) -> SharedMemory:
+    """附加到父进程创建的共享内存 (不登记到 resource_tracker，生命周期归父进程管理)"""
+    try:
+        return SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _error_result(e: Exception) -> Dict[str, Any]:
+    """模型进程中的异常转为经 Pipe 传回的结构化结果 (阶段超时带上阶段名与预算，父进程据此重建异常)"""
+    return {
+        "error": f"{type(e).__name__}: {e}",
+        "error_type": type(e).__name__,
+        "stage": getattr(e, "stage", None),
+        "budget": getattr(e, "budget", None),
+    }
+
+
+def _model_worker_main(conn, torch_threads: int) -> None:
+    """模型进程入口: 加载模型后循环处理任务，收到 None 或父进程断开时退出"""
+    from . import clip_onnx
+
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    clip_onnx.set_threads(torch_threads)
+
+    status = audit.warmup_models(dummy_pass=config.AUDIT_PRELOAD_MODELS)
+    conn.send({"ready": status})
+    logger.info(f"🧠 [AuditPool] 模型进程 {os.getpid()} 已就绪 (torch 线程数 {torch_threads})")
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+
+        if message[0] == "encode_text":
+            # 语义搜索的文本查询: ("encode_text", 向量存储名, 文本列表)
+            _, name, texts = message
+            try:
+                result = {"embeddings": audit.encode_texts(name, texts)}
+            except Exception as e:
+                result = _error_result(e)
+            conn.send(result)
+            continue
+
+        shm_name, size = message
+        try:
+            shm = _attach_shared_memory(shm_name)
+            try:
+                view = shm.buf[:size]
+                try:
+                    result = audit.check_image_safety(view)
+                finally:
+                    view.release()
+            finally:
+                shm.close()
+        except Exception as e:
+            result = _error_result(e)
+        conn.send(result)
+
+
+class _ModelWorker:
+    """单个模型进程及其 Pipe (同一时间只处理一个任务)"""
+
+    def __init__(self, index: int, torch_threads: int):
+        self.index = index
+        self.torch_threads = torch_threads
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self.models: Dict[str, Any] = {}   # 就绪握手回报的各模型状态 (audit.get_model_status)
+        self.started_at = 0.0
+        self.ready_seconds: Optional[float] = None
+        self._ready = threading.Event()
+        self._ready_lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._ready_lock:
+            self._ready.clear()
+        self.models = {}
+        self.ready_seconds = None
+        self.started_at = time.monotonic()
+        parent_conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(
+            target=_model_worker_main,
+            args=(child_conn, self.torch_threads),
+            name=f"audit-model-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        threading.Thread(
+            target=self._wait_ready, args=(parent_conn,), name=f"audit-model-{self.index}-ready", daemon=True
+        ).start()
+
+    def _wait_ready(self, conn) -> None:
+        """等待模型进程的就绪握手；进程在加载阶段退出时同样结束等待，下一个任务会触发重启"""
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            message = {}
+        with self._ready_lock:
+            if conn is not self.conn:
+                return  # 进程已停止 / 重启，握手属于旧连接
+            self.models = message.get("ready", {})
+            self.ready_seconds = round(time.monotonic() - self.started_at, 2)
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def stop(self, timeout: float = 5) -> None:
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        with self._ready_lock:
+            self.conn = None
+        self.process = None
+
+    def restart(self) -> None:
+        self.restarts += 1
+        logger.warning(f"♻️ [AuditPool] 重启模型进程 {self.index} (第 {self.restarts} 次)")
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+        self.stop(timeout=1)
+        self.start()
+
+    def run(self, message: tuple, timeout: float) -> Dict[str, Any]:
+        """
+        发送任务并等待结果，超时或进程退出时抛出异常
+
+        模型仍在加载时先等待就绪 (最多 timeout 秒，不计入任务超时)，仍未就绪则抛出 ModelWorkerNotReady；
+        加载慢不是进程故障，不触发重启 (否则加载时间超过 timeout 的进程会被反复重启)
+        """
+        if not self._ready.wait(timeout):
+            raise ModelWorkerNotReady(f"模型进程 {self.index} 仍在加载模型 (已等待 {timeout}s)")
+        self.conn.send(message)
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"模型进程 {self.index} 审核超时 ({timeout}s)")
+        return self.conn.recv()
+
+
+def load_into_shared_memory(object_name: str) -> Tuple[SharedMemory, int]:
+    """
+    将对象内容读入新建的共享内存 (缓存命中时从缓存复制，否则从 MinIO 按块写入)
+
+    Returns:
+        (共享内存, 内容长度)，共享内存可能按页对齐大于内容长度，由调用方 close + unlink
+
+    Raises:
+        Exception: 对象不存在或读取失败时抛出 (同 storage.get_minio_object)
+    """
+    cached = storage.peek_cached_object(object_name)
+    if cached is not None and cached.data is not None:
+        shm = SharedMemory(create=True, size=max(1, cached.size))
+        shm.buf[:cached.size] = cached.data
+        return shm, cached.size
+
+    if cached is not None:
+        try:
+            with open(cached.path, "rb") as f:
+                shm = SharedMemory(create=True, size=max(1, cached.size))
+                try:
+                    f.readinto(shm.buf[:cached.size])
+                except BaseException:
+                    shm.close()
+                    shm.unlink()
+                    raise
+                return shm, cached.size
+        except FileNotFoundError:
+            pass  # 磁盘条目刚被淘汰，回源读取
+
+    obj = storage.get_minio_object(object_name)
+    body = obj["Body"]
+    size = obj.get("ContentLength") or 0
+    shm = SharedMemory(create=True, size=max(1, size))
+    try:
+        offset = 0
+        for chunk in body.iter_chunks(config.IMAGE_STREAM_CHUNK_SIZE):
+            shm.buf[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        if offset != size:
+            raise IOError(f"读取对象不完整: {offset}/{size}")
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    finally:
+        body.close()
+    return shm, size
+
+
+class AuditPool:
+    """审核模型进程池: 空闲进程放在队列中，调用方线程取出一个进程独占使用直到拿到结果"""
+
+    def __init__(self, workers: int, timeout: float):
+        self.timeout = timeout
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        self._workers: List[_ModelWorker] = [_ModelWorker(i, torch_threads) for i in range(workers)]
+        self._idle: "queue.Queue[_ModelWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._closed = False
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+            self._idle.put(worker)
+        logger.info(f"🧠 [AuditPool] 已启动 {len(self._workers)} 个模型进程")
+
+    def close(self) -> None:
+        self._closed = True
+        for worker in self._workers:
+            worker.stop()
+        logger.info("🧠 [AuditPool] 模型进程已关闭")
+
+    def audit_object(self, object_name: str) -> Dict[str, Any]:
+        """
+        审核对象 (阻塞调用，在线程池中执行)
+
+        Returns:
+            与 audit.check_image_safety 相同的结果字典
+
+        Raises:
+            Exception: 对象读取失败、模型进程出错 / 崩溃 / 超时
+        """
+        shm, size = load_into_shared_memory(object_name)
+        try:
+            result = self._dispatch((shm.name, size))
+        finally:
+            shm.close()
+            shm.unlink()
+        self._record(True)
+        return result
+
+    def encode_text(self, name: str, texts: List[str]):
+        """
+        在模型进程中计算文本的归一化 CLIP 向量 (阻塞调用，见 audit.encode_texts)
+
+        Raises:
+            ModelWorkerNotReady: 模型进程尚未全部就绪 (搜索请求不等待模型加载，直接失败)
+        """
+        if not self.ready():
+            raise ModelWorkerNotReady("模型进程仍在加载模型，请稍后重试")
+        return self._dispatch(("encode_text", name, list(texts)))["embeddings"]
+
+    def _dispatch(self, message: tuple) -> Dict[str, Any]:
+        """
+        取一个空闲模型进程执行任务；进程崩溃 / 超时时重启。
+        审核阶段超时抛出 audit.AuditStageTimeout (与本进程审核相同)，其他模型错误抛出 RuntimeError
+        """
+        worker = self._idle.get()
+        try:
+            result = worker.run(message, self.timeout)
+        except (EOFError, OSError, TimeoutError):
+            if not self._closed:
+                worker.restart()
+            self._record(False)
+            raise
+        except ModelWorkerNotReady:
+            self._record(False)
+            raise
+        finally:
+            self._idle.put(worker)
+
+        if "error" in result:
+            self._record(False)
+            if result.get("error_type") == "AuditStageTimeout":
+                raise audit.AuditStageTimeout(result["stage"], result.get("budget"))
+            raise RuntimeError(f"模型进程审核失败: {result['error']}")
+        return result
+
+    def ready(self) -> bool:
+        """全部模型进程都已完成加载 (审核队列在此之前不领取任务)"""
+        return all(worker.ready for worker in self._workers)
+
+    def readiness(self) -> List[Dict[str, Any]]:
+        """各模型进程的就绪状态与模型加载耗时，供 /ready 使用"""
+        return [
+            {
+                "index": worker.index,
+                "ready": worker.ready,
+                "alive": worker.process is not None and worker.process.is_alive(),
+                "ready_seconds": worker.ready_seconds,
+                "models": worker.models,
+            }
+            for worker in self._workers
+        ]
+
+    def _record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "idle": self._idle.qsize(),
+                "alive": sum(1 for w in self._workers if w.process is not None and w.process.is_alive()),
+                "restarts": sum(w.restarts for w in self._workers),
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+
+_pool: Optional[AuditPool] = None
+
+
+def get_pool() -> Optional[AuditPool]:
+    """当前进程的模型进程池，未启用时返回 None"""
+    return _pool
+
+
+def start_pool(workers: int) -> AuditPool:
+    global _pool
+    if _pool is None:
+        _pool = AuditPool(workers, config.AUDIT_MODEL_TIMEOUT_SECONDS)
+        _pool.start()
+    return _pool
+
+
+def stop_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
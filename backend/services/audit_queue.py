@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+持久化审核任务队列模块
+
+上传完成后只在 audit_jobs 表登记一条任务 (内容哈希 + 对象键)，不再把整个文件留在内存里等 BackgroundTasks：
+- worker 领取任务时加租约，处理期间定期续租；进程崩溃后租约过期，任务被重新领取
+- 审核所需的内容按对象键从缓存 / MinIO 读取，常驻内存只与并发数有关
+- 失败按指数退避重试，超过 AUDIT_JOB_MAX_ATTEMPTS 进入 dead，可在管理后台重新排队
+- 同一内容哈希只保留一个待处理任务 (幂等)
+- 审核结论按内容哈希 + 模型版本持久化 (audit_verdicts 表)，命中时不再运行模型；CLIP 图像向量存入向量存储；
+  同一进程内对同一哈希的并发审核合并为一次
+
+worker 作为 asyncio 任务运行在应用生命周期内 (或独立的 `python -m backend.audit_worker` 进程中)，
+启动时会继续处理上次未完成的任务。启用模型进程池 (services/audit_pool.py) 时模型不加载在本进程。
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Dict, List, Optional
+
+from .. import audit
+from .. import config
+from .. import database
+from .. import executors
+from .. import storage
+from . import audit_pool, embedding_store, metrics, phash
+
+logger = logging.getLogger(__name__)
+
+# 租约持有者标识: 主机名 + 进程号 + 随机后缀 (同一进程重启后也不会与旧租约混淆)
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+_tasks: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+# 进行中的模型审核: {内容哈希: Future}，同一哈希的并发审核共享一次结果
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def _run_models(object_name: str) -> dict:
+    """运行审核模型 (模型进程池或本进程推理，均在独立的审核线程池中等待)，返回 audit.check_image_safety 的结果"""
+    pool = audit_pool.get_pool()
+    with metrics.upload_stats.timed("audit"):
+        if pool is not None:
+            # 模型进程池: 内容直接读入共享内存
+            return await executors.run_audit(pool.audit_object, object_name)
+        content = await executors.run_io(storage.read_object_bytes, object_name)
+        return await executors.run_audit(audit.check_image_safety, content)
+
+
+def record_stage_outcomes(audit_res: dict) -> None:
+    """按审核结果中的阶段记录累计各阶段的结果与耗时 (模型进程池的结果同样回到本进程统计)"""
+    for entry in audit_res.get("details", {}).get("stages", []):
+        metrics.audit_stats.incr(f"{entry['stage']}_{entry['outcome']}")
+        metrics.audit_stats.observe(entry["stage"], entry["ms"] / 1000)
+
+
+def get_stage_stats() -> Dict[str, dict]:
+    """各阶段的进入次数与通过率 (pass_through: 进入下一阶段或最终放行的比例)，用于调整级联阈值"""
+    snapshot = metrics.audit_stats.stats()
+    counters = snapshot["counters"]
+    stages = {}
+    for stage in ("prescreen", "openai_clip", "nudenet", "chinese_clip"):
+        outcomes = {o: counters.get(f"{stage}_{o}", 0) for o in ("pass", "reject", "early_exit", "error", "timeout")}
+        entered = sum(outcomes.values())
+        stages[stage] = {
+            **outcomes,
+            "entered": entered,
+            "pass_through": round(outcomes["pass"] / entered, 4) if entered else None,
+            **snapshot["stages"].get(stage, {}),
+        }
+    return stages
+
+
+async def get_audit_result(fhash: str, object_name: str) -> dict:
+    """
+    获取内容的审核结果: 先查结论缓存 (版本一致才命中)，未命中时运行模型并写回缓存
+
+    同一进程内同一哈希的并发调用只运行一次模型；跨进程由 audit_jobs 的哈希唯一约束保证。
+    """
+    version = audit.verdict_version()
+    cached = await executors.run_io(database.get_audit_verdict, fhash, version)
+    if cached is not None:
+        metrics.upload_stats.incr("audit_verdict_cache_hit")
+        return cached
+
+    pending = _inflight.get(fhash)
+    if pending is not None:
+        metrics.upload_stats.incr("audit_coalesced")
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[fhash] = future
+    try:
+        metrics.upload_stats.incr("audit_verdict_cache_miss")
+        audit_res = await _run_models(object_name)
+        record_stage_outcomes(audit_res)
+        # 图像向量存入向量存储 (供标签变化后离线重评)，不进入结论缓存
+        embeddings = audit_res.pop("embeddings", None)
+        if embeddings and config.AUDIT_EMBEDDING_STORE_ENABLED:
+            await executors.run_io(embedding_store.save_embeddings, fhash, embeddings)
+        if audit.is_cacheable_result(audit_res):
+            await executors.run_io(database.save_audit_verdict, fhash, version, audit_res)
+        future.set_result(audit_res)
+        return audit_res
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # 没有其他等待者时避免 "exception was never retrieved"
+        raise
+    finally:
+        del _inflight[fhash]
+
+
+def apply_audit_result(
+    audit_res: dict,
+    filename: str,
+    fhash: str,
+    object_name: str,
+    user_id: int = None,
+    device_id: str = None
+) -> str:
+    """
+    处理审核结论: 违规时删除 MinIO 对象与数据库记录 (感知哈希加入黑名单) 并通知该内容的全部上传者
+    (相同内容的后续上传没有单独的审核任务，记录随本次清理一并删除)，通过时记录审核结论
+
+    Returns:
+        审核结论 ("passed" / "rejected")
+    """
+    if not audit_res["safe"]:
+        logger.warning(f"🚫 [BackAudit] 发现违规: {filename} - {audit_res['reason']}")
+
+        # 1. 删除 MinIO 文件
+        # 从 object_name 中提取文件名 (其实 object_name 就是文件名Key)
+        del_minio = storage.delete_from_minio(object_name)
+        if del_minio:
+            logger.info(f"🗑️ [BackAudit] MinIO 文件已清理: {object_name}")
+        else:
+            logger.error(f"❌ [BackAudit] MinIO 清理失败: {object_name}")
+
+        # 2. 感知哈希加入黑名单 (需在删除记录之前读取)，之后相似的副本在上传时即被拦截
+        phash.block_content(fhash, "audit_purge", reason=audit_res["reason"])
+
+        # 3. 删除数据库记录 (先记下全部上传者用于通知)
+        owners = database.get_image_owners_by_hash(fhash)
+        if (user_id or device_id) and not any(
+            o["user_id"] == user_id and o["device_id"] == device_id for o in owners
+        ):
+            owners.append({"user_id": user_id, "device_id": device_id, "filename": filename})
+        del_db = database.delete_image_by_hash_system(fhash)
+        if del_db:
+            logger.info(f"🗑️ [BackAudit] DB 记录已清理: {fhash}")
+        else:
+            logger.error(f"❌ [BackAudit] DB 清理失败: {fhash}")
+
+        # 4. [NEW] 发送通知给每个上传者
+        for owner in owners:
+            if not (owner["user_id"] or owner["device_id"]):
+                continue
+            database.create_notification(
+                user_id=owner["user_id"],
+                device_id=owner["device_id"],
+                type="moderation_reject",
+                title="图片已被系统删除",
+                message=f"您上传的图片 '{owner['filename'] or filename}' 因违规已被系统自动删除。原因：{audit_res['reason']}"
+            )
+            logger.info(f"📢 [BackAudit] 已发送通知: user={owner['user_id']}, device={owner['device_id']}")
+        return "rejected"
+
+    # 记录审核结论，之后相同内容的上传可以直接秒传
+    database.set_audit_status(fhash, "passed")
+    logger.info(f"✅ [BackAudit] 审核通过: {filename}")
+    return "passed"
+
+
+async def enqueue(fhash: str, object_name: str, filename: str, user_id: int = None, device_id: str = None) -> bool:
+    """登记审核任务并唤醒本进程的 worker (同一内容已有待处理任务时不重复登记)"""
+    created = await executors.run_io(database.enqueue_audit_job, fhash, object_name, filename, user_id, device_id)
+    if created:
+        metrics.upload_stats.incr("audit_enqueued")
+        if _wakeup is not None:
+            _wakeup.set()
+    else:
+        metrics.upload_stats.incr("audit_deduplicated")
+    return created
+
+
+def retry_delay(attempts: int) -> int:
+    """第 attempts 次失败后的退避时长 (指数增长，有上限)"""
+    delay = config.AUDIT_JOB_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1))
+    return min(delay, config.AUDIT_JOB_RETRY_MAX_SECONDS)
+
+
+async def _heartbeat(job_id: int) -> None:
+    """处理期间定期续租，防止长时间的审核被其他 worker 重复领取"""
+    interval = max(1, config.AUDIT_JOB_LEASE_SECONDS // 3)
+    while True:
+        await asyncio.sleep(interval)
+        if not await executors.run_io(database.heartbeat_audit_job, job_id, WORKER_ID, config.AUDIT_JOB_LEASE_SECONDS):
+            logger.warning(f"⚠️ [AuditQueue] 任务 {job_id} 的租约已失效")
+            return
+
+
+async def _process(job: dict) -> None:
+    job_id = job["id"]
+    args = (job["filename"], job["content_hash"], job["object_name"], job["user_id"], job["device_id"])
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        logger.info(f"🔍 [BackAudit] 开始后台审核: {job['filename']} ({job['content_hash']})")
+        try:
+            audit_res = await get_audit_result(job["content_hash"], job["object_name"])
+        except storage.ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404", "NotFound"):
+                raise
+            # 对象已被删除 (管理员删除 / 此前已判定违规)，没有可审核的内容
+            logger.info(f"💨 [AuditQueue] 对象已不存在，跳过审核: {job['object_name']}")
+            await executors.run_io(database.complete_audit_job, job_id, WORKER_ID, "missing")
+            return
+
+        # 结论在本进程执行删除 / 通知
+        verdict = await executors.run_io(apply_audit_result, audit_res, *args)
+        await executors.run_io(database.complete_audit_job, job_id, WORKER_ID, verdict)
+        metrics.upload_stats.incr(f"audit_{verdict}")
+    except Exception as e:
+        if isinstance(e, audit.AuditStageTimeout):
+            # 本进程审核与模型进程池 (按结构化错误重建) 都抛出 audit.AuditStageTimeout
+            metrics.audit_stats.incr(f"{e.stage}_timeout")
+        delay = retry_delay(job["attempts"])
+        status = await executors.run_io(
+            database.fail_audit_job, job_id, WORKER_ID, f"{type(e).__name__}: {e}",
+            config.AUDIT_JOB_MAX_ATTEMPTS, delay,
+        )
+        if status == "dead":
+            metrics.upload_stats.incr("audit_dead")
+            logger.error(f"☠️ [AuditQueue] 任务 {job_id} ({job['object_name']}) 多次失败，已进入 dead: {e}", exc_info=True)
+        else:
+            metrics.upload_stats.incr("audit_retries")
+            logger.warning(f"🔁 [AuditQueue] 任务 {job_id} 第 {job['attempts']} 次失败，{delay}s 后重试: {e}")
+    finally:
+        heartbeat.cancel()
+
+
+def _models_loading() -> bool:
+    """模型仍在加载 / 预热 (模型进程未完成就绪握手，或本进程的后台预热未结束)"""
+    pool = audit_pool.get_pool()
+    if pool is not None:
+        return not pool.ready()
+    return audit.warmup_pending()
+
+
+async def _worker_loop(index: int) -> None:
+    """
+    逐个领取并处理任务，队列为空时等待唤醒或轮询超时。
+    模型加载完成之前不领取任务: 期间登记的审核留在队列中，不会在审核路径上触发重复加载，也不会耗尽租约
+    """
+    logger.info(f"🧾 [AuditQueue] worker {index} 已启动 ({WORKER_ID})")
+    while True:
+        if _models_loading():
+            await asyncio.sleep(1)
+            continue
+        try:
+            jobs = await executors.run_io(
+                database.claim_audit_jobs, WORKER_ID, 1,
+                config.AUDIT_JOB_LEASE_SECONDS, config.AUDIT_JOB_MAX_ATTEMPTS,
+            )
+        except Exception as e:
+            logger.error(f"❌ [AuditQueue] 领取任务失败: {e}", exc_info=True)
+            jobs = []
+
+        if jobs:
+            await _process(jobs[0])
+            continue
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=config.AUDIT_QUEUE_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_workers(concurrency: Optional[int] = None) -> None:
+    """
+    启动审核 worker (在 lifespan 启动阶段调用)，之前未完成的任务会被继续处理
+
+    Args:
+        concurrency: 并发处理的任务数，默认 AUDIT_WORKER_CONCURRENCY
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+    concurrency = config.AUDIT_WORKER_CONCURRENCY if concurrency is None else concurrency
+    if concurrency <= 0:
+        logger.info("💡 [AuditQueue] 本进程不处理审核任务 (AUDIT_WORKER_CONCURRENCY=0)")
+        return
+    executors.get_audit_executor(concurrency)  # 审核线程数与并发数相同
+    for index in range(concurrency):
+        _tasks.append(asyncio.create_task(_worker_loop(index), name=f"audit-worker-{index}"))
+
+
+async def stop_workers() -> None:
+    """停止审核 worker (在 lifespan 关闭阶段调用)，处理中的任务交还队列，下次启动时继续"""
+    if not _tasks:
+        return
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    released = await executors.run_io(database.release_audit_jobs, WORKER_ID)
+    if released:
+        logger.info(f"🧾 [AuditQueue] 已交还 {released} 个未完成的审核任务")
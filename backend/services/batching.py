@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+推理微批处理模块
+
+多个审核线程同时提交单张图片时，由一个后台线程把它们合并成一次批量前向：
+- 收到第一条请求后最多再等待 max_wait_ms，或凑满 max_batch_size 条后立即执行
+- 批量调用的结果按顺序分发回各调用方，批量调用抛出的异常同样传给该批的每个调用方
+- max_batch_size <= 1 且不限时时不经过后台线程，直接在调用方线程执行
+- 调用方的超时从请求所在批次开始执行时计时，在队列中排在其他批次之后的时间不计入；
+  等待超时后取消请求，尚未执行的请求不再进入批次
+
+突发上传时一次前向处理多张图片，能更充分地利用 CPU 的 SIMD / 多线程吞吐。
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """将单条推理请求合并为批量调用 (batch_fn 接收列表，返回等长的结果列表)"""
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest = 0
+        self._timeouts = 0
+
+    def submit(self, item: Any, timeout: Optional[float] = None, queue_timeout: Optional[float] = None) -> Any:
+        """
+        提交一条请求并阻塞等待结果
+
+        Args:
+            timeout: 从请求开始执行起等待结果的秒数 (排队时间不计入)
+            queue_timeout: 排队等待开始执行的秒数上限，默认不限
+
+        Raises:
+            concurrent.futures.TimeoutError: 排队或执行超时 (尚未执行的请求被取消)
+        """
+        if self.max_batch_size == 1 and timeout is None:
+            self._record(1)
+            return self.batch_fn([item])[0]
+
+        self._ensure_started()
+        future: Future = Future()
+        started = threading.Event()
+        self._queue.put((item, future, started))
+        try:
+            if not started.wait(queue_timeout):
+                raise FutureTimeoutError()
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                    self._thread.start()
+
+    def _collect(self) -> List[tuple]:
+        """阻塞等待第一条请求，再在等待预算内尽量凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            # 跳过已超时取消的请求，其余标记为执行中 (之后不能再被取消)，调用方从此开始计算超时
+            batch = []
+            for item, future, started in self._collect():
+                if future.set_running_or_notify_cancel():
+                    started.set()
+                    batch.append((item, future))
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"批量结果数量不匹配: {len(results)} != {len(batch)}")
+            except Exception as e:
+                logger.error(f"❌ [Batcher:{self.name}] 批量推理失败 ({len(batch)} 条): {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self._record(len(batch))
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def _record(self, size: int) -> None:
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._largest = max(self._largest, size)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest,
+                "timeouts": self._timeouts,
+                "queued": self._queue.qsize(),
+            }
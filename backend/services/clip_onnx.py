@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+CLIP 图像塔的 ONNX Runtime 推理后端
+
+AUDIT_CLIP_BACKEND=onnx 时，Chinese-CLIP / OpenAI CLIP 的图像塔导出为 ONNX 并用 onnxruntime 在 CPU 上运行：
+- 首次使用时从 torch 模型导出 vision.onnx，可选再做动态 int8 量化 (vision.int8.onnx，只量化 MatMul 权重)
+- 标签文本向量与 logit_scale 随导出一起保存 (text-<标签哈希>.npz)，运行时不再加载 torch 模型与文本塔
+- 导出文件按模型 ID 存放在 AUDIT_ONNX_DIR 下，先写临时文件再原子替换，多个模型进程同时导出也不会读到半个文件
+
+导出与量化需要 torch + onnx (`pip install onnx`)，推理只需要 onnxruntime (NudeNet 已依赖) 与图像预处理器。
+任何一步失败都由 audit.py 回退到 torch 路径。
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+ONNX_OPSET = 17
+
+# onnxruntime 单个会话的线程数，0 表示由 onnxruntime 决定 (模型进程池按进程数分配)
+_intra_op_threads = 0
+
+
+def set_threads(threads: int) -> None:
+    """设置之后创建的会话的 intra-op 线程数 (需在加载前调用)"""
+    global _intra_op_threads
+    _intra_op_threads = max(0, threads)
+
+
+def labels_hash(labels: List[str]) -> str:
+    """标签列表的哈希 (标签变化时文本向量需要重新计算)"""
+    return hashlib.sha256("\n".join(labels).encode("utf-8")).hexdigest()
+
+
+def model_dir(model_id: str) -> str:
+    return os.path.join(config.AUDIT_ONNX_DIR, model_id.replace("/", "__"))
+
+
+def vision_path(model_id: str, quantize: bool) -> str:
+    return os.path.join(model_dir(model_id), "vision.int8.onnx" if quantize else "vision.onnx")
+
+
+def text_path(model_id: str, labels: List[str]) -> str:
+    return os.path.join(model_dir(model_id), f"text-{labels_hash(labels)[:16]}.npz")
+
+
+def _atomic_write(path: str, write: Callable[[str], None]) -> None:
+    """write(临时路径) 成功后原子替换到 path"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def export_vision_tower(model, processor, path: str) -> None:
+    """将 get_image_features 导出为 ONNX (输入 pixel_values，输出未归一化的 image_embeds，batch 维动态)"""
+    import torch
+    from PIL import Image
+
+    class _VisionTower(torch.nn.Module):
+        def __init__(self, clip_model):
+            super().__init__()
+            self.clip_model = clip_model
+
+        def forward(self, pixel_values):
+            return self.clip_model.get_image_features(pixel_values=pixel_values)
+
+    dummy = processor(images=[Image.new("RGB", (224, 224))] * 2, return_tensors="pt")["pixel_values"]
+    wrapper = _VisionTower(model).eval()
+
+    def write(tmp_path: str) -> None:
+        with torch.no_grad():
+            torch.onnx.export(
+                wrapper,
+                (dummy,),
+                tmp_path,
+                input_names=["pixel_values"],
+                output_names=["image_embeds"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                opset_version=ONNX_OPSET,
+                dynamo=False,
+            )
+
+    _atomic_write(path, write)
+
+
+def quantize_vision_tower(fp32_path: str, int8_path: str) -> None:
+    """动态 int8 量化 (权重 int8，激活运行时量化)；只量化 MatMul，卷积 patch embedding 保持 fp32"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    _atomic_write(int8_path, lambda tmp_path: quantize_dynamic(
+        fp32_path, tmp_path, weight_type=QuantType.QInt8, op_types_to_quantize=["MatMul"],
+    ))
+
+
+def save_text_embeddings(path: str, text_embeds: np.ndarray, logit_scale: float) -> None:
+    def write(tmp_path: str) -> None:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, text_embeds=text_embeds.astype(np.float32), logit_scale=np.float32(logit_scale))
+
+    _atomic_write(path, write)
+
+
+def export(model_id: str, labels: List[str], model, processor, text_embeds, quantize: bool) -> None:
+    """导出缺失的图像塔 / 量化模型 / 文本向量 (已存在的文件不重复生成)"""
+    fp32_path = vision_path(model_id, quantize=False)
+    if not os.path.exists(fp32_path):
+        logger.info(f"📦 [ClipOnnx] 导出图像塔: {model_id} -> {fp32_path}")
+        export_vision_tower(model, processor, fp32_path)
+    if quantize and not os.path.exists(vision_path(model_id, quantize=True)):
+        logger.info(f"📦 [ClipOnnx] int8 量化: {model_id}")
+        quantize_vision_tower(fp32_path, vision_path(model_id, quantize=True))
+
+    t_path = text_path(model_id, labels)
+    if not os.path.exists(t_path):
+        save_text_embeddings(t_path, text_embeds.cpu().numpy(), float(model.logit_scale.exp().item()))
+        with open(os.path.join(model_dir(model_id), "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"model_id": model_id, "opset": ONNX_OPSET, "labels": labels}, f, ensure_ascii=False, indent=2)
+
+
+def is_exported(model_id: str, labels: List[str], quantize: bool) -> bool:
+    return os.path.exists(vision_path(model_id, quantize)) and os.path.exists(text_path(model_id, labels))
+
+
+class OnnxVisionTower:
+    """onnxruntime 图像塔 + 预先计算的文本向量，输出与 torch 路径相同的标签概率"""
+
+    def __init__(self, model_id: str, labels: List[str], quantize: bool, image_processor=None):
+        import onnxruntime as ort
+
+        self.model_id = model_id
+        self.labels = list(labels)
+        self.quantize = quantize
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = _intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            vision_path(model_id, quantize), sess_options=options, providers=["CPUExecutionProvider"],
+        )
+        with np.load(text_path(model_id, labels)) as data:
+            self.text_embeds = data["text_embeds"]
+            self.logit_scale = float(data["logit_scale"])
+        if image_processor is None:
+            from transformers import AutoImageProcessor
+            image_processor = AutoImageProcessor.from_pretrained(model_id, use_fast=False)
+        self.image_processor = image_processor
+
+    def image_features(self, images: list) -> np.ndarray:
+        """归一化后的图像向量 (batch, dim)"""
+        pixel_values = self.image_processor(images=images, return_tensors="np")["pixel_values"]
+        embeds = self.session.run(None, {"pixel_values": pixel_values.astype(np.float32)})[0]
+        return embeds / np.linalg.norm(embeds, axis=-1, keepdims=True)
+
+    def scores(self, images: list) -> tuple:
+        """(每张图片在各标签上的 softmax 概率, 归一化图像向量)"""
+        image_embeds = self.image_features(images)
+        return softmax_probs(image_embeds, self.text_embeds, self.logit_scale).tolist(), image_embeds
+
+    def label_probs(self, images: list) -> list:
+        """每张图片在各标签上的 softmax 概率"""
+        return self.scores(images)[0]
+
+
+def softmax_probs(image_embeds: np.ndarray, text_embeds: np.ndarray, logit_scale: float) -> np.ndarray:
+    """归一化图像向量 [N, dim] × 文本向量 [L, dim] → 各标签概率 [N, L] (与 CLIP logits_per_image.softmax 相同)"""
+    logits = logit_scale * (image_embeds @ text_embeds.T)
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_vision_tower(
+    model_id: str,
+    labels: List[str],
+    load_torch: Callable[[], Tuple[object, object]],
+    get_text_embeds: Callable[[object, object], object],
+    quantize: bool,
+) -> Optional[OnnxVisionTower]:
+    """
+    加载 ONNX 图像塔，文件缺失时先用 torch 模型导出
+
+    Args:
+        load_torch: 返回 (model, processor)，只在需要导出时调用
+        get_text_embeds: (model, processor) -> 归一化文本向量 (torch.Tensor)
+    """
+    if not is_exported(model_id, labels, quantize):
+        model, processor = load_torch()
+        if model is None:
+            return None
+        export(model_id, labels, model, processor, get_text_embeds(model, processor), quantize)
+    tower = OnnxVisionTower(model_id, labels, quantize)
+    logger.info(f"✅ [ClipOnnx] {model_id} 使用 onnxruntime ({'int8' if quantize else 'fp32'})")
+    return tower
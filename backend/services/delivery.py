@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+图片分发策略模块
+
+/mycloud 路由完成鉴权与签名校验后，交给这里选定的策略决定如何把字节交给客户端：
+- proxy: 由应用自己读取并返回内容 (默认，策略返回 None 即回退到路由内的代理逻辑)
+- redirect: 跳转到 S3 预签名 URL，应用不再参与字节传输
+- accel: 返回 X-Accel-Redirect 头，nginx 以 sendfile 零拷贝发送本地缓存文件或内部 MinIO location
+- sendfile: 返回 X-Sendfile 头 (Apache mod_xsendfile / lighttpd)，前端服务器直接发送本地缓存文件
+
+通过 config.IMAGE_DELIVERY_MODE 选择，新增策略只需调用 register_strategy 注册。
+"""
+import os
+import logging
+from typing import Callable, Dict, Optional
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import RedirectResponse
+
+from .. import config
+from .. import storage
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryStrategy:
+    """
+    分发策略基类 (即 proxy 模式)
+
+    respond 返回 Response 表示由策略接管本次请求，返回 None 表示回退到代理逻辑。
+    回退前已经打开的 S3 响应放在 request.state.s3_object，代理逻辑会直接透传 (或关闭)。
+    """
+    name = "proxy"
+
+    def respond(
+        self,
+        request: Request,
+        object_name: str,
+        content_type: str,
+        headers: Dict[str, str],
+    ) -> Optional[Response]:
+        return None
+
+
+class RedirectDelivery(DeliveryStrategy):
+    """
+    预签名跳转模式
+
+    仅处理 GET：预签名 URL 的签名包含请求方法，HEAD 无法复用，仍由应用读取元数据返回。
+    注意该模式不会在跳转前确认对象存在，不存在的对象由 MinIO 返回 404。
+    """
+    name = "redirect"
+
+    def __init__(self, status_code: int = 302):
+        if status_code not in (302, 307):
+            logger.warning(f"⚠️ [Delivery] 不支持的跳转状态码 {status_code}，改用 302")
+            status_code = 302
+        self.status_code = status_code
+
+    def respond(self, request, object_name, content_type, headers):
+        if request.method != "GET":
+            return None
+        presigned = storage.get_presigned_url(object_name, content_type)
+        if presigned is None:
+            # 签名失败时回退到代理模式，保证图片可用
+            return None
+        url, max_age = presigned
+        return RedirectResponse(
+            url,
+            status_code=self.status_code,
+            headers={
+                # 跳转本身只能缓存到预签名 URL 失效之前
+                "Cache-Control": f"private, max-age={max_age}",
+                "X-Content-Type-Options": "nosniff",
+            },
+        )
+
+
+def _cached_file_path(request: Request, object_name: str, fetch: bool) -> Optional[str]:
+    """
+    获取对象在磁盘缓存中的文件路径
+
+    Args:
+        fetch: 未缓存时是否先回源写入缓存
+
+    Returns:
+        磁盘文件路径；对象只在内存层或无法缓存时返回 None
+    """
+    cached = storage.peek_cached_object(object_name)
+    if cached is None and fetch:
+        result = storage.get_cached_object(object_name)
+        if isinstance(result, storage.CachedObject):
+            cached = result
+        else:
+            # 超出缓存上限，只能由应用代理: 已打开的 S3 响应交给代理逻辑透传，不再重新 GET
+            request.state.s3_object = result
+    return cached.path if cached is not None else None
+
+
+class AccelRedirectDelivery(DeliveryStrategy):
+    """
+    nginx X-Accel-Redirect 模式
+
+    - 对象在磁盘缓存中: 指向 cache_prefix 下的相对路径，nginx 直接 sendfile
+    - 配置了 minio_prefix: 指向反向代理 MinIO 的 internal location
+    - 否则先回源写入缓存，落在磁盘层则同上，落在内存层回退到代理 (内存命中本身足够快)
+
+    nginx 会保留响应中的 Content-Type / Cache-Control 等头，因此这里照常返回完整的缓存头。
+    """
+    name = "accel"
+
+    def __init__(self, cache_dir: str, cache_prefix: str, minio_prefix: str = ""):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.cache_prefix = "/" + cache_prefix.strip("/") + "/"
+        self.minio_prefix = "/" + minio_prefix.strip("/") + "/" if minio_prefix else ""
+
+    def respond(self, request, object_name, content_type, headers):
+        path = _cached_file_path(request, object_name, fetch=not self.minio_prefix)
+        if path is not None:
+            relative = os.path.relpath(path, self.cache_dir).replace(os.sep, "/")
+            target = self.cache_prefix + quote(relative)
+        elif self.minio_prefix:
+            target = f"{self.minio_prefix}{quote(storage.MINIO_BUCKET_NAME)}/{quote(object_name)}"
+        else:
+            return None
+        return Response(
+            status_code=200,
+            media_type=content_type,
+            headers={**headers, "X-Accel-Redirect": target},
+        )
+
+
+class SendfileDelivery(DeliveryStrategy):
+    """
+    X-Sendfile 模式 (Apache mod_xsendfile / lighttpd)
+
+    只能指向本地文件，所以未缓存的对象会先回源写入磁盘缓存；落在内存层时回退到代理。
+    """
+    name = "sendfile"
+
+    def respond(self, request, object_name, content_type, headers):
+        path = _cached_file_path(request, object_name, fetch=True)
+        if path is None:
+            return None
+        return Response(
+            status_code=200,
+            media_type=content_type,
+            headers={**headers, "X-Sendfile": os.path.abspath(path)},
+        )
+
+
+_STRATEGY_FACTORIES: Dict[str, Callable[[], DeliveryStrategy]] = {
+    "proxy": DeliveryStrategy,
+    "redirect": lambda: RedirectDelivery(config.IMAGE_REDIRECT_STATUS),
+    "accel": lambda: AccelRedirectDelivery(
+        config.IMAGE_CACHE_DIR,
+        config.ACCEL_REDIRECT_CACHE_PREFIX,
+        config.ACCEL_REDIRECT_MINIO_PREFIX,
+    ),
+    "sendfile": SendfileDelivery,
+}
+_active_strategy: Optional[DeliveryStrategy] = None
+
+
+def register_strategy(name: str, factory: Callable[[], DeliveryStrategy]) -> None:
+    """注册新的分发策略"""
+    _STRATEGY_FACTORIES[name] = factory
+
+
+def get_delivery_strategy() -> DeliveryStrategy:
+    """按 IMAGE_DELIVERY_MODE 获取当前分发策略 (单例)"""
+    global _active_strategy
+    if _active_strategy is None:
+        factory = _STRATEGY_FACTORIES.get(config.IMAGE_DELIVERY_MODE)
+        if factory is None:
+            logger.warning(f"⚠️ [Delivery] 未知的分发模式 '{config.IMAGE_DELIVERY_MODE}'，使用 proxy")
+            factory = DeliveryStrategy
+        _active_strategy = factory()
+        logger.info(f"📦 [Delivery] 图片分发模式: {_active_strategy.name}")
+    return _active_strategy
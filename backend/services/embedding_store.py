@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+CLIP 图像向量存储模块
+
+审核时得到的 CLIP 图像向量 (已归一化) 按内容哈希持久化，标签变化后可以离线重新分类，不必重新下载图片、重跑图像塔：
+- 每个模型一组文件: <name>.f16 按行追加的 float16 向量 (内存映射读取)，<name>.idx 追加写的 "哈希 行号" 索引
+- 同一哈希只写一次 (内容不可变，向量也不变)
+- 追加时对索引文件加 flock，多个审核进程共享 AUDIT_EMBEDDING_DIR 时行号不会冲突；
+  读取方按索引文件的已读偏移增量刷新，看到的向量总是已经完整写入的
+
+每张图片每个模型 512 维 × 2 字节 = 1KB。
+"""
+import fcntl
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """单个模型的向量存储 (追加写，内存映射读)"""
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.vectors_path = os.path.join(directory, f"{name}.f16")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._hashes: List[str] = []
+        self._index_offset = 0
+        self._dim: Optional[int] = None
+        self._mmap = None
+        self._mmap_rows = 0
+
+    def _refresh(self) -> None:
+        """读取索引文件中新增的行 (调用方持有 _lock)"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="ascii") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # 另一个进程正在写的半行，下次再读
+                self._index_offset += len(line)
+                parts = line.split()
+                if len(parts) == 3:
+                    content_hash, row, dim = parts[0], int(parts[1]), int(parts[2])
+                    self._dim = dim
+                    if content_hash not in self._rows and row == len(self._hashes):
+                        self._rows[content_hash] = row
+                        self._hashes.append(content_hash)
+
+    def add(self, content_hash: str, vector: np.ndarray) -> bool:
+        """追加向量，已存在时跳过；返回是否写入"""
+        vector = np.asarray(vector, dtype=np.float16).reshape(-1)
+        with self._lock:
+            self._refresh()
+            if content_hash in self._rows:
+                return False
+            if self._dim is not None and vector.shape[0] != self._dim:
+                raise ValueError(f"{self.name} 向量维度不一致: {vector.shape[0]} != {self._dim}")
+            with open(self.index_path, "a+", encoding="ascii") as index_file:
+                fcntl.flock(index_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()  # 拿到锁后再读一次其他进程刚追加的条目
+                    if content_hash in self._rows:
+                        return False
+                    # 行号 = 已登记的条目数；崩溃遗留的未登记尾部直接截掉覆盖，行号始终与索引顺序一致
+                    row = len(self._hashes)
+                    with open(self.vectors_path, "ab") as f:
+                        f.truncate(row * vector.nbytes)
+                        f.write(vector.tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    # 向量落盘后再写索引，读取方看到索引行时向量一定完整
+                    index_file.write(f"{content_hash} {row} {vector.shape[0]}\n")
+                    index_file.flush()
+                finally:
+                    fcntl.flock(index_file, fcntl.LOCK_UN)
+            self._refresh()
+            return True
+
+    def matrix(self):
+        """
+        返回 (哈希列表, float16 向量矩阵 [N, dim])，矩阵是只读内存映射，第 i 行对应 hashes[i]
+
+        行号与索引顺序一致，因此 hashes 按行号排列。
+        """
+        with self._lock:
+            self._refresh()
+            rows = len(self._hashes)
+            if not rows:
+                return [], np.zeros((0, self._dim or 0), dtype=np.float16)
+            if self._mmap is None or self._mmap_rows < rows:
+                self._mmap = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(rows, self._dim))
+                self._mmap_rows = rows
+            return list(self._hashes), self._mmap[:rows]
+
+    def get(self, content_hash: str) -> Optional[np.ndarray]:
+        _, matrix = self.matrix()
+        row = self._rows.get(content_hash)
+        return None if row is None else np.asarray(matrix[row], dtype=np.float32)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(name: str) -> EmbeddingStore:
+    """按模型名 (chinese_clip / openai_clip) 获取向量存储"""
+    with _stores_lock:
+        store = _stores.get(name)
+        if store is None:
+            store = _stores[name] = EmbeddingStore(name, config.AUDIT_EMBEDDING_DIR)
+        return store
+
+
+def save_embeddings(content_hash: str, embeddings: Dict[str, np.ndarray]) -> None:
+    """保存一次审核得到的各模型图像向量 (阻塞调用，在 I/O 线程池中执行)"""
+    for name, vector in embeddings.items():
+        try:
+            get_store(name).add(content_hash, vector)
+        except Exception as e:
+            logger.error(f"❌ [EmbeddingStore] 保存 {name} 向量失败 ({content_hash}): {e}")
+
+
+def get_store_stats() -> Dict[str, int]:
+    return {name: len(store) for name, store in list(_stores.items())}
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+后台定时维护任务模块
+
+在应用生命周期内以 asyncio 任务周期性执行清理工作 (阻塞调用放到 S3 I/O 线程池)，
+关闭服务时统一取消。新增任务只需在 start_background_jobs 中登记。
+"""
+import asyncio
+import logging
+from typing import Any, Callable, List
+
+from .. import config
+from .. import executors
+from .. import storage
+from . import upload_spool
+
+logger = logging.getLogger(__name__)
+
+_tasks: List[asyncio.Task] = []
+
+
+async def _run_periodically(name: str, interval: int, func: Callable[..., Any], *args) -> None:
+    """每隔 interval 秒执行一次 func，单次失败不影响后续执行"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await executors.run_io(func, *args)
+        except Exception as e:
+            logger.error(f"❌ [Maintenance] {name} 执行失败: {e}", exc_info=True)
+
+
+def _schedule(name: str, interval: int, func: Callable[..., Any], *args) -> None:
+    if interval <= 0:
+        logger.info(f"💡 [Maintenance] {name} 已关闭")
+        return
+    _tasks.append(asyncio.create_task(_run_periodically(name, interval, func, *args), name=name))
+
+
+def start_background_jobs() -> None:
+    """启动所有定时维护任务 (在 lifespan 启动阶段调用)"""
+    _schedule(
+        "multipart-sweeper",
+        config.MULTIPART_SWEEP_INTERVAL_SECONDS,
+        storage.sweep_abandoned_multipart_uploads,
+        config.MULTIPART_ABANDON_SECONDS,
+    )
+    _schedule(
+        "upload-session-sweeper",
+        config.UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS,
+        upload_spool.sweep_expired_upload_sessions,
+    )
+
+
+async def stop_background_jobs() -> None:
+    """取消所有定时维护任务 (在 lifespan 关闭阶段调用)"""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
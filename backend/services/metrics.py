@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+运行时计数模块
+
+为上传、审核等流水线提供按阶段的计数与耗时统计，供 /admin/perf/stats 查看。
+只在进程内存中累计，重启后清零。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+
+
+class StageStats:
+    """按名称累计的计数器 + 按阶段累计的耗时 (次数 / 总耗时 / 最大耗时)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, list] = {}
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(stage, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        """统计代码块耗时 (异常时也计入)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "stages": {
+                    stage: {
+                        "count": count,
+                        "avg_ms": round(total / count * 1000, 2) if count else 0.0,
+                        "max_ms": round(peak * 1000, 2),
+                    }
+                    for stage, (count, total, peak) in self._timings.items()
+                },
+            }
+
+
+# 上传流水线 (接收 / 哈希 / 去重 / 图片信息 / MinIO / 入库 / 审核调度)
+upload_stats = StageStats()
+
+# 审核各阶段 (放行 / 拦截 / 提前结束 / 出错 / 超时 的次数与耗时)
+audit_stats = StageStats()
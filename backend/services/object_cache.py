@@ -0,0 +1,538 @@
+# -*- coding: utf-8 -*-
+"""
+对象缓存模块
+
+MinIO 前的两级读穿缓存，包括：
+- MemoryLRU: 按字节数限额的进程内 LRU，存放小对象
+- DiskLRU: 按字节数限额的本地磁盘 LRU，存放大对象，重启后从磁盘重建索引
+- ObjectCache: 组合两级缓存，支持 stale-while-revalidate 和命中/未命中/淘汰计数
+- SingleFlight: 按键合并并发回源请求
+- NegativeCache: 有界的 TTL 负缓存，记录已知不存在的键
+
+对象键是内容哈希 (见 routers/upload.py 的 calculate_hash)，内容不可变，
+所以缓存只需要在删除对象时失效。
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 从 S3 流读取时的块大小
+_READ_CHUNK_SIZE = 256 * 1024
+
+
+@dataclass
+class CachedObject:
+    """
+    缓存条目
+
+    data 和 path 二选一：内存层条目持有 data，磁盘层条目持有 path。
+    """
+    key: str
+    size: int
+    content_type: Optional[str] = None
+    last_modified: Optional[float] = None  # Unix 时间戳
+    fetched_at: float = field(default_factory=time.time)
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    def meta(self) -> Dict[str, Any]:
+        """可持久化的元数据 (不含内容)"""
+        return {
+            "key": self.key,
+            "size": self.size,
+            "content_type": self.content_type,
+            "last_modified": self.last_modified,
+            "fetched_at": self.fetched_at,
+        }
+
+
+class MemoryLRU:
+    """按字节数限额的进程内 LRU"""
+
+    def __init__(self, max_bytes: int, max_object_size: int):
+        self.max_bytes = max_bytes
+        self.max_object_size = max_object_size
+        self.current_bytes = 0
+        self.evictions = 0
+        self._items: "OrderedDict[str, CachedObject]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def accepts(self, size: int) -> bool:
+        return 0 < size <= self.max_object_size and size <= self.max_bytes
+
+    def get(self, key: str) -> Optional[CachedObject]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+            return entry
+
+    def put(self, entry: CachedObject) -> None:
+        with self._lock:
+            old = self._items.pop(entry.key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+            self._items[entry.key] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= evicted.size
+                self.evictions += 1
+
+    def pop(self, key: str) -> Optional[CachedObject]:
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+            return entry
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class DiskLRU:
+    """
+    按字节数限额的磁盘 LRU
+
+    每个对象对应两个文件: <digest>.bin (内容) 和 <digest>.json (元数据)，
+    文件名取对象键的 sha1，避免键中的 "/" 等字符影响目录结构。
+    LRU 顺序用文件 mtime 表示，重启时按 mtime 排序重建索引。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_object_size: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_size = max_object_size
+        self.current_bytes = 0
+        self.evictions = 0
+        self._items: "OrderedDict[str, CachedObject]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._rebuild_index()
+
+    def accepts(self, size: int) -> bool:
+        return 0 < size <= self.max_object_size and size <= self.max_bytes
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        subdir = os.path.join(self.directory, digest[:2])
+        return os.path.join(subdir, f"{digest}.bin"), os.path.join(subdir, f"{digest}.json")
+
+    def _rebuild_index(self) -> None:
+        """扫描缓存目录重建索引 (服务重启后缓存仍然有效)"""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                meta_path = os.path.join(root, name)
+                data_path = meta_path[:-5] + ".bin"
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        meta = json.load(f)
+                    stat = os.stat(data_path)
+                    if stat.st_size != meta.get("size"):
+                        raise ValueError("size mismatch")
+                    found.append((stat.st_mtime, CachedObject(path=data_path, **meta)))
+                except (OSError, ValueError, TypeError) as e:
+                    logger.warning(f"⚠️ [Cache] 丢弃损坏的缓存文件 {meta_path}: {e}")
+                    self._remove_files(data_path, meta_path)
+            # 清理写入中途崩溃残留的临时文件
+            for name in files:
+                if name.startswith(".tmp-"):
+                    self._remove_files(os.path.join(root, name))
+
+        for _, entry in sorted(found, key=lambda item: item[0]):
+            self._items[entry.key] = entry
+            self.current_bytes += entry.size
+        if self._items:
+            logger.info(f"✅ [Cache] 磁盘缓存索引已重建: {len(self._items)} 个对象, {self.current_bytes / 1024 / 1024:.1f}MB")
+        self._evict_locked()
+
+    @staticmethod
+    def _remove_files(*paths: str) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"⚠️ [Cache] 删除缓存文件失败 {path}: {e}")
+
+    def _evict_locked(self) -> None:
+        while self.current_bytes > self.max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self.current_bytes -= evicted.size
+            self.evictions += 1
+            data_path, meta_path = self._paths(evicted.key)
+            self._remove_files(data_path, meta_path)
+
+    def get(self, key: str) -> Optional[CachedObject]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            self._items.move_to_end(key)
+        try:
+            # 更新 mtime，保证重启后 LRU 顺序不丢
+            os.utime(entry.path)
+        except FileNotFoundError:
+            # 文件被外部删除，视为未命中
+            self.pop(key)
+            return None
+        except OSError:
+            pass
+        return entry
+
+    def put(self, entry: CachedObject, chunks: Iterable[bytes]) -> CachedObject:
+        """
+        将内容流写入磁盘 (先写临时文件再原子重命名，避免读到半截文件)
+
+        Returns:
+            写入后的磁盘条目 (path 已填充)
+        """
+        data_path, meta_path = self._paths(entry.key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(data_path))
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            if size != entry.size:
+                raise IOError(f"内容长度不一致: 期望 {entry.size}, 实际 {size}")
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(entry.meta(), f)
+            os.replace(tmp_path, data_path)
+        except BaseException:
+            self._remove_files(tmp_path, meta_path)
+            raise
+
+        stored = CachedObject(path=data_path, **entry.meta())
+        with self._lock:
+            old = self._items.pop(entry.key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+            self._items[entry.key] = stored
+            self.current_bytes += stored.size
+            self._evict_locked()
+        return stored
+
+    def touch(self, key: str, fetched_at: float) -> None:
+        """刷新条目的验证时间 (同步写回元数据文件)"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return
+            entry.fetched_at = fetched_at
+        _, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(entry.meta(), f)
+        except OSError as e:
+            logger.warning(f"⚠️ [Cache] 更新缓存元数据失败 {meta_path}: {e}")
+
+    def pop(self, key: str) -> Optional[CachedObject]:
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+        data_path, meta_path = self._paths(key)
+        self._remove_files(data_path, meta_path)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class ObjectCache:
+    """
+    两级读穿缓存 (内存 + 磁盘)
+
+    - 新鲜期内直接命中
+    - 过期但在 stale 窗口内: 先返回旧副本，同时在后台调用 revalidate 重新验证
+    - 超出 stale 窗口: 视为未命中，由调用方重新拉取
+    """
+
+    def __init__(
+        self,
+        memory: Optional[MemoryLRU],
+        disk: Optional[DiskLRU],
+        fresh_seconds: int,
+        stale_seconds: int,
+    ):
+        self.memory = memory
+        self.disk = disk
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "revalidations": 0,
+            "revalidation_failures": 0,
+            "invalidations": 0,
+            "bypass": 0,
+        }
+        self._counter_lock = threading.Lock()
+        self._revalidating: set = set()
+        self._revalidating_lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += n
+
+    def accepts(self, size: int) -> bool:
+        """对象大小是否可以进入任意一级缓存"""
+        return bool(
+            (self.memory is not None and self.memory.accepts(size))
+            or (self.disk is not None and self.disk.accepts(size))
+        )
+
+    def peek(self, key: str) -> Optional[CachedObject]:
+        """只查缓存，不计数、不触发重新验证 (用于 HEAD / Range 等辅助路径)"""
+        entry = self.memory.get(key) if self.memory is not None else None
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+        return entry
+
+    def get(self, key: str, revalidate: Optional[Callable[[str], Optional[bool]]] = None) -> Optional[CachedObject]:
+        """
+        读取缓存
+
+        Args:
+            key: 对象键
+            revalidate: 条目过期时在后台调用的验证函数，返回 False 表示对象已不存在
+
+        Returns:
+            命中的条目，未命中返回 None
+        """
+        entry = self.memory.get(key) if self.memory is not None else None
+        tier = "memory_hits"
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            tier = "disk_hits"
+        if entry is None:
+            self._count("misses")
+            return None
+
+        age = time.time() - entry.fetched_at
+        if age <= self.fresh_seconds:
+            self._count(tier)
+            return entry
+        if age <= self.fresh_seconds + self.stale_seconds:
+            self._count(tier)
+            self._count("stale_hits")
+            if revalidate is not None:
+                self._schedule_revalidate(key, revalidate)
+            return entry
+
+        # 超出 stale 窗口，按未命中处理 (旧条目由新写入覆盖)
+        self._count("misses")
+        return None
+
+    def _schedule_revalidate(self, key: str, revalidate: Callable[[str], Optional[bool]]) -> None:
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def _run():
+            try:
+                self._count("revalidations")
+                exists = revalidate(key)
+                if exists is False:
+                    self.invalidate(key)
+                elif exists:
+                    self.mark_fresh(key)
+            except Exception as e:
+                self._count("revalidation_failures")
+                logger.warning(f"⚠️ [Cache] 后台重新验证失败 {key}: {e}")
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=_run, name="cache-revalidate", daemon=True).start()
+
+    def mark_fresh(self, key: str) -> None:
+        now = time.time()
+        if self.memory is not None:
+            entry = self.memory.get(key)
+            if entry is not None:
+                entry.fetched_at = now
+        if self.disk is not None:
+            self.disk.touch(key, now)
+
+    def store(self, entry: CachedObject, stream: BinaryIO) -> Optional[CachedObject]:
+        """
+        将 S3 内容流写入合适的缓存层
+
+        Returns:
+            写入后的条目；对象超出缓存上限时返回 None (调用方应直接透传)
+        """
+        if self.memory is not None and self.memory.accepts(entry.size):
+            data = stream.read()
+            if len(data) != entry.size:
+                raise IOError(f"内容长度不一致: 期望 {entry.size}, 实际 {len(data)}")
+            entry.data = data
+            self.memory.put(entry)
+            return entry
+        if self.disk is not None and self.disk.accepts(entry.size):
+            chunks = iter(lambda: stream.read(_READ_CHUNK_SIZE), b"")
+            return self.disk.put(entry, chunks)
+        self._count("bypass")
+        return None
+
+    def invalidate(self, key: str) -> None:
+        """删除对象时调用，从两级缓存中移除"""
+        removed = False
+        if self.memory is not None and self.memory.pop(key) is not None:
+            removed = True
+        if self.disk is not None and self.disk.pop(key) is not None:
+            removed = True
+        if removed:
+            self._count("invalidations")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中 / 未命中 / 淘汰计数与当前容量"""
+        with self._counter_lock:
+            result: Dict[str, Any] = dict(self._counters)
+        hits = result["memory_hits"] + result["disk_hits"]
+        total = hits + result["misses"]
+        result["hit_ratio"] = round(hits / total, 4) if total else 0.0
+        if self.memory is not None:
+            result["memory"] = {
+                "objects": len(self.memory),
+                "bytes": self.memory.current_bytes,
+                "max_bytes": self.memory.max_bytes,
+                "evictions": self.memory.evictions,
+            }
+        if self.disk is not None:
+            result["disk"] = {
+                "objects": len(self.disk),
+                "bytes": self.disk.current_bytes,
+                "max_bytes": self.disk.max_bytes,
+                "evictions": self.disk.evictions,
+                "directory": self.disk.directory,
+            }
+        return result
+
+
+class SingleFlight:
+    """
+    按键合并并发调用
+
+    同一时刻同一个键只有一个调用真正执行 (leader)，其余调用阻塞等待并共享结果；
+    leader 抛出的异常同样会传递给所有等待者。
+    """
+
+    class _Call:
+        __slots__ = ("event", "result", "error")
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行或等待 fn
+
+        Returns:
+            (结果, 是否为共享结果)。共享结果来自其他线程的调用，
+            调用方需注意不要复用一次性资源 (如 S3 响应流)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class NegativeCache:
+    """
+    有界的 TTL 负缓存
+
+    记录最近确认不存在的键，扫描器反复请求随机键时可以直接返回 404，
+    不再访问 MinIO 和数据库。超出容量时淘汰最早写入的键。
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.additions = 0
+
+    def add(self, key: str) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = time.monotonic() + self.ttl_seconds
+            self.additions += 1
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            expires_at = self._items.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return False
+            self.hits += 1
+            return True
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "additions": self.additions}
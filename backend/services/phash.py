@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+感知哈希模块 (近重复图片)
+
+sha256 只能识别字节完全相同的文件；缩放、重新编码、轻微调色后的副本用 64 位 dHash 识别：
+- 灰度缩小到 9×8，比较每行相邻像素的明暗，得到 64 位指纹；两张图片的相似程度用汉明距离衡量
+- 上传时计算并存入 history.phash (16 位十六进制)
+- HammingIndex: 多索引哈希 (MIH)，64 位拆成 4 段 16 位分别建倒排表。半径 r 内的哈希至少有一段
+  的距离不超过 r // 4 (鸽巢原理)，查询只需枚举每段 r // 4 位以内的翻转，半径 ≤ 7 时每次只查几十个桶
+- 近重复索引按 history.id 增量同步 (与向量存储相同，多进程各自同步，不需要额外通知)
+- 黑名单: 被删除的违规图片的哈希 (phash_blocklist 表)，上传时在写入存储与审核之前按汉明半径比对
+
+dHash 对裁剪不敏感 (裁剪会改变缩略后的像素网格)，裁剪副本只能在裁剪量很小时命中。
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
+
+from .. import config
+from .. import database
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+_CHUNKS = 4
+_CHUNK_BITS = HASH_BITS // _CHUNKS
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+
+# 过于"平"的图片 (纯色、大片留白) 的 dHash 几乎全 0 或全 1，彼此距离很小但内容未必相同
+_MIN_INFORMATIVE_BITS = 8
+
+_SYNC_BATCH = 50000
+
+
+def dhash(image) -> int:
+    """64 位 dHash (PIL Image，任意模式)"""
+    from PIL import Image
+
+    small = image.convert("L").resize((9, 8), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def compute(source: BinaryIO) -> Optional[str]:
+    """
+    计算上传文件的 dHash (十六进制字符串)，非图片或解码失败时返回 None (阻塞调用，在 CPU 线程池中执行)
+
+    JPEG 用 draft 以 1/8 比例解码，与审核预处理一样先按 EXIF 方向旋转。
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        source.seek(0)
+        with Image.open(source) as img:
+            img.draft("L", (64, 64))
+            img = ImageOps.exif_transpose(img)
+            return to_hex(dhash(img))
+    except Exception as e:
+        logger.debug(f"计算感知哈希失败: {e}")
+        return None
+    finally:
+        source.seek(0)
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def is_informative(value: int) -> bool:
+    """排除纯色 / 低细节图片的哈希，这类哈希不用于自动关联"""
+    return _MIN_INFORMATIVE_BITS <= value.bit_count() <= HASH_BITS - _MIN_INFORMATIVE_BITS
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(max_flips: int) -> Tuple[int, ...]:
+    """16 位内翻转不超过 max_flips 位的全部掩码 (含 0)"""
+    masks = [0]
+    for flips in range(1, max_flips + 1):
+        for bits in itertools.combinations(range(_CHUNK_BITS), flips):
+            masks.append(sum(1 << b for b in bits))
+    return tuple(masks)
+
+
+class HammingIndex:
+    """64 位哈希 → 键集合，支持按汉明半径查询 (多索引哈希，线程安全)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Dict[int, Set[str]] = {}
+        self._tables: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in range(_CHUNKS)]
+
+    @staticmethod
+    def _chunks(value: int):
+        return [(value >> (i * _CHUNK_BITS)) & _CHUNK_MASK for i in range(_CHUNKS)]
+
+    def add(self, value: int, key: str) -> None:
+        with self._lock:
+            keys = self._items.get(value)
+            if keys is None:
+                keys = self._items[value] = set()
+                for table, chunk in zip(self._tables, self._chunks(value)):
+                    table[chunk].add(value)
+            keys.add(key)
+
+    def remove(self, value: int, key: Optional[str] = None) -> None:
+        """移除一个键 (key=None 时移除该哈希下的全部键)"""
+        with self._lock:
+            keys = self._items.get(value)
+            if keys is None:
+                return
+            if key is None:
+                keys.clear()
+            else:
+                keys.discard(key)
+            if keys:
+                return
+            del self._items[value]
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                bucket = table[chunk]
+                bucket.discard(value)
+                if not bucket:
+                    del table[chunk]
+
+    def query(self, value: int, radius: int) -> List[Tuple[int, int, Set[str]]]:
+        """半径内的全部条目 [(哈希, 距离, 键集合)]，按距离升序"""
+        masks = _flip_masks(max(0, radius) // _CHUNKS)
+        with self._lock:
+            candidates = set()
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                for mask in masks:
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+            hits = []
+            for candidate in candidates:
+                d = distance(value, candidate)
+                if d <= radius:
+                    hits.append((candidate, d, set(self._items[candidate])))
+        hits.sort(key=lambda hit: hit[1])
+        return hits
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+class NearDuplicateIndex:
+    """图库的感知哈希索引 (哈希 → 内容哈希)，按 history.id 增量同步 (补算旧记录后需重启进程才会重新加载)"""
+
+    def __init__(self):
+        self.index = HammingIndex()
+        self._sync_lock = threading.Lock()
+        self._last_id = 0
+
+    def refresh(self) -> None:
+        """读取上次同步之后新增的记录 (阻塞调用，在 I/O 线程池中执行)"""
+        with self._sync_lock:
+            while True:
+                rows = database.get_phash_entries_since(self._last_id, limit=_SYNC_BATCH)
+                for row_id, content_hash, value in rows:
+                    self.index.add(from_hex(value), content_hash)
+                    self._last_id = row_id
+                if len(rows) < _SYNC_BATCH:
+                    break
+
+    def query(self, value: str, radius: int) -> List[Tuple[str, int]]:
+        """半径内的内容哈希 [(内容哈希, 距离)]，按距离升序 (已删除的图片由调用方按数据库过滤)"""
+        self.refresh()
+        return [
+            (content_hash, d)
+            for _, d, keys in self.index.query(from_hex(value), radius)
+            for content_hash in sorted(keys)
+        ]
+
+    def stats(self) -> dict:
+        return {"hashes": len(self.index), "synced_id": self._last_id}
+
+
+_near_duplicates: Optional[NearDuplicateIndex] = None
+_near_duplicates_lock = threading.Lock()
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    global _near_duplicates
+    with _near_duplicates_lock:
+        if _near_duplicates is None:
+            _near_duplicates = NearDuplicateIndex()
+        return _near_duplicates
+
+
+class Blocklist:
+    """感知哈希黑名单 (内存中的多索引哈希)，按 PHASH_BLOCKLIST_REFRESH_SECONDS 检查数据库中的版本，变化时整体重新加载"""
+
+    def __init__(self):
+        self.index = HammingIndex()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+
+    def refresh(self, force: bool = False) -> None:
+        """阻塞调用 (在 I/O 线程池中执行)"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < config.PHASH_BLOCKLIST_REFRESH_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            version = database.get_phash_blocklist_version()
+            if version == self._version:
+                return
+            index = HammingIndex()
+            for entry_id, value in database.get_blocked_phashes():
+                index.add(from_hex(value), str(entry_id))
+            self.index = index
+            self._version = version
+
+    def match(self, value: str) -> Optional[Tuple[int, int]]:
+        """与 PHASH_BLOCKLIST_RADIUS 内最近的黑名单条目 (条目 id, 距离)，未命中时返回 None"""
+        self.refresh()
+        hits = self.index.query(from_hex(value), config.PHASH_BLOCKLIST_RADIUS)
+        if not hits:
+            return None
+        _, d, keys = hits[0]
+        return min(int(key) for key in keys), d
+
+    def stats(self) -> dict:
+        return {"entries": len(self.index), "radius": config.PHASH_BLOCKLIST_RADIUS}
+
+
+_blocklist: Optional[Blocklist] = None
+_blocklist_lock = threading.Lock()
+
+
+def get_blocklist() -> Blocklist:
+    global _blocklist
+    with _blocklist_lock:
+        if _blocklist is None:
+            _blocklist = Blocklist()
+        return _blocklist
+
+
+def block_content(content_hash: str, source: str, reason: str = None, created_by: int = None) -> Optional[str]:
+    """
+    将图片的感知哈希加入黑名单 (需在删除数据库记录之前调用，阻塞调用)
+
+    纯色 / 低细节图片的哈希不登记 (否则会误伤大量无关图片)。返回登记的哈希，未登记时返回 None。
+    """
+    if not config.PHASH_BLOCKLIST_ENABLED:
+        return None
+    image = database.get_image_by_hash(content_hash)
+    value = image.get("phash") if image else None
+    if not value or not is_informative(from_hex(value)):
+        return None
+    if database.add_blocked_phash(value, content_hash, reason, source, created_by) is None:
+        return None
+    get_blocklist().refresh(force=True)
+    logger.info(f"⛔ [Phash] 已加入黑名单: {value} ({content_hash}, {source})")
+    return value
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+标签重评模块
+
+修改 CLIP 标签 (SAFE / UNSAFE 列表或阈值) 后，用向量存储中已保存的图像向量重新分类全部图片：
+只计算一次新标签的文本向量，再按块做 float32 矩阵乘法 + softmax，不访问 MinIO、不运行图像塔。
+判定规则与 audit.py 中对应阶段相同 (TOP 标签为不安全标签且概率超过该标签的阈值)。
+"""
+import logging
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .. import audit
+from . import clip_onnx, embedding_store
+
+logger = logging.getLogger(__name__)
+
+# 向量存储名 -> (模型 ID, 加载函数, 全部标签, 不安全标签 -> 阈值)
+MODELS = {
+    "chinese_clip": (
+        audit.CHINESE_CLIP_MODEL_ID, audit.get_chinese_clip, audit.CHINESE_ALL_LABELS,
+        {l: audit.CHINESE_THRESHOLDS.get(l, audit.CHINESE_DEFAULT_THRESHOLD) for l in audit.CHINESE_UNSAFE_LABELS},
+    ),
+    "openai_clip": (
+        audit.OPENAI_CLIP_MODEL_ID, audit.get_openai_clip, audit.OPENAI_ALL_LABELS,
+        {l: audit.OPENAI_THRESHOLD for l in audit.OPENAI_UNSAFE_LABELS},
+    ),
+}
+
+
+def text_embeddings(name: str) -> Tuple[np.ndarray, float]:
+    """
+    当前标签的归一化文本向量与 logit_scale
+
+    ONNX 后端已导出这组标签的文本向量时直接读取，否则加载 torch 模型计算 (只运行文本塔)。
+    """
+    model_id, loader, labels, _ = MODELS[name]
+    path = clip_onnx.text_path(model_id, labels)
+    if os.path.exists(path):
+        with np.load(path) as data:
+            return data["text_embeds"].astype(np.float32), float(data["logit_scale"])
+
+    model, processor = loader()
+    if model is None:
+        raise RuntimeError(f"{model_id} 加载失败，无法计算文本向量")
+    text_embeds = audit.get_label_text_embeddings(model, processor, model_id, labels)
+    return text_embeds.cpu().numpy().astype(np.float32), float(model.logit_scale.exp().item())
+
+
+def rescore(name: str, chunk_rows: int = 65536) -> List[Dict]:
+    """
+    用当前标签重新分类向量存储中的全部图片
+
+    Returns:
+        新判定为违规的条目 [{"hash", "model", "label", "score"}]
+    """
+    _, _, labels, unsafe = MODELS[name]
+    hashes, matrix = embedding_store.get_store(name).matrix()
+    if not hashes:
+        return []
+    text, logit_scale = text_embeddings(name)
+    # 安全标签的阈值为无穷大，TOP 标签是安全标签时永远不会命中
+    thresholds = np.array([unsafe.get(label, np.inf) for label in labels], dtype=np.float32)
+
+    flagged = []
+    for start in range(0, len(hashes), chunk_rows):
+        block = np.asarray(matrix[start:start + chunk_rows], dtype=np.float32)
+        probs = clip_onnx.softmax_probs(block, text, logit_scale)
+        top = probs.argmax(axis=1)
+        top_probs = probs[np.arange(len(top)), top]
+        for i in np.nonzero(top_probs > thresholds[top])[0]:
+            flagged.append({
+                "hash": hashes[start + i],
+                "model": name,
+                "label": labels[top[i]],
+                "score": round(float(top_probs[i]), 4),
+            })
+    logger.info(f"🔁 [Rescore] {name}: {len(hashes)} 张图片，{len(flagged)} 张命中新标签")
+    return flagged
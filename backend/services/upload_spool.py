@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+流式上传接收模块
+
+直接从 request.stream() 增量解析 multipart 请求体：
+- 文件内容写入 SpooledTemporaryFile (小于 UPLOAD_SPOOL_MAX_MEMORY 时留在内存，超过后落到临时文件)
+- 读取过程中增量计算 sha256，不需要再把整个文件读进内存做哈希
+- 累计大小一旦超过上限立即中止，不再继续接收剩余数据
+
+单个上传的常驻内存因此只与 spool 阈值和网络块大小有关，与文件大小无关。
+
+断点续传 (routers/resumable.py) 的分块数据暂存在磁盘，相关的路径与过期清理也在这里。
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Optional
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import Headers
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from .. import config
+from .. import database
+
+logger = logging.getLogger(__name__)
+
+# multipart 边界、头部和普通表单字段的额外开销上限，用于按 Content-Length 提前拒绝
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def file_too_large_detail(max_size: int) -> str:
+    return f"文件过大，当前限制 {max_size // (1024*1024)}MB。请升级 VIP 解锁更大文件限制。"
+
+
+class UploadTooLarge(MultiPartException):
+    """文件超过大小上限"""
+
+
+def _check_parser_internals() -> None:
+    """
+    _HashingMultiPartParser 依赖 Starlette 解析器的私有属性 _current_part 和 on_part_data 回调
+
+    requirements.txt 固定了 starlette 的版本范围；升级后内部实现变化时在导入阶段直接失败，
+    而不是等到第一次上传才抛出 AttributeError。
+    """
+    probe = MultiPartParser(Headers({"content-type": "multipart/form-data; boundary=x"}), None)
+    part = getattr(probe, "_current_part", None)
+    if not hasattr(part, "file") or not callable(getattr(probe, "on_part_data", None)):
+        import starlette
+        raise ImportError(
+            f"starlette {starlette.__version__} 的 MultiPartParser 缺少 _current_part / on_part_data，"
+            "与 upload_spool 不兼容，请安装 requirements.txt 中固定的版本范围"
+        )
+
+
+_check_parser_internals()
+
+
+class _HashingMultiPartParser(MultiPartParser):
+    """在 Starlette 的 multipart 解析器上增加增量哈希与大小上限"""
+
+    def __init__(self, headers, stream, max_size: int):
+        super().__init__(headers, stream, max_files=1, max_fields=16)
+        self.spool_max_size = config.UPLOAD_SPOOL_MAX_MEMORY
+        self.max_size = max_size
+        self.digest = hashlib.sha256()
+        self.received = 0
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current_part.file is not None:
+            self.received += end - start
+            if self.received > self.max_size:
+                raise UploadTooLarge(file_too_large_detail(self.max_size))
+            self.digest.update(data[start:end])
+        super().on_part_data(data, start, end)
+
+
+@dataclass
+class SpooledUpload:
+    """已接收的上传文件 (内容在 spool 中，读取位置在开头)"""
+    file: Optional[BinaryIO]
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    fields: Dict[str, str] = field(default_factory=dict)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+async def receive_upload(request: Request, max_size: int, field_name: str = "file") -> SpooledUpload:
+    """
+    流式接收 multipart 上传
+
+    Args:
+        max_size: 文件大小上限 (字节)，超过时立即返回 400
+        field_name: 文件字段名
+
+    Returns:
+        SpooledUpload，调用方负责 close()
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + _MULTIPART_OVERHEAD:
+        # 请求体声明的大小已经超限，不读取任何数据
+        raise HTTPException(status_code=400, detail=file_too_large_detail(max_size))
+
+    if "multipart/form-data" not in request.headers.get("content-type", ""):
+        raise HTTPException(status_code=400, detail="请使用 multipart/form-data 上传文件")
+
+    parser = _HashingMultiPartParser(request.headers, request.stream(), max_size)
+    try:
+        form = await parser.parse()
+    except UploadTooLarge as e:
+        logger.info(f"⛔ [Upload] 超过大小上限，已中止接收 ({parser.received} > {max_size})")
+        raise HTTPException(status_code=400, detail=e.message)
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=f"上传数据格式错误: {e.message}")
+
+    fields = {}
+    upload = None
+    for name, value in form.multi_items():
+        if isinstance(value, str):
+            fields[name] = value
+        elif name == field_name and upload is None:
+            upload = value
+        else:
+            value.file.close()
+
+    if upload is None:
+        raise HTTPException(status_code=400, detail="缺少上传文件")
+
+    return SpooledUpload(
+        file=upload.file,
+        filename=upload.filename or "",
+        content_type=upload.content_type or "application/octet-stream",
+        size=parser.received,
+        sha256=parser.digest.hexdigest(),
+        fields=fields,
+    )
+
+
+# ==================== 断点续传暂存 ====================
+# 分块上传的数据按会话追加到 UPLOAD_SESSION_DIR/<session_id>.part，会话状态记录在 upload_sessions 表
+
+def staging_path(session_id: str) -> str:
+    return os.path.join(config.UPLOAD_SESSION_DIR, f"{session_id}.part")
+
+
+def create_staging_file(session_id: str) -> None:
+    """创建空的暂存文件 (阻塞调用)"""
+    os.makedirs(config.UPLOAD_SESSION_DIR, exist_ok=True)
+    open(staging_path(session_id), "wb").close()
+
+
+def open_staging_file(session_id: str, mode: str) -> BinaryIO:
+    """
+    打开暂存文件并加非阻塞的独占 flock (阻塞调用，关闭文件时释放)
+
+    多个 worker 进程共用同一个暂存目录，同一会话同时只允许一个请求写入或完成；
+    锁已被其他请求持有时抛出 BlockingIOError。
+    """
+    f = open(staging_path(session_id), mode)
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def remove_staging_file(session_id: str) -> None:
+    try:
+        os.remove(staging_path(session_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"⚠️ [Upload] 删除暂存文件失败 {session_id}: {e}")
+
+
+def hash_file(fileobj: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的 sha256 (完成后读取位置回到开头)"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def sweep_expired_upload_sessions() -> int:
+    """
+    清理过期的断点续传会话及其暂存文件，同时删除没有会话记录的孤儿暂存文件
+
+    Returns:
+        删除的暂存文件数量
+    """
+    removed = 0
+    for session_id in database.pop_expired_upload_sessions():
+        remove_staging_file(session_id)
+        removed += 1
+
+    if os.path.isdir(config.UPLOAD_SESSION_DIR):
+        known = set(database.get_upload_session_ids())
+        grace = time.time() - 3600  # 刚创建、尚未写入数据库的文件先保留
+        for name in os.listdir(config.UPLOAD_SESSION_DIR):
+            session_id, ext = os.path.splitext(name)
+            path = os.path.join(config.UPLOAD_SESSION_DIR, name)
+            if ext == ".part" and session_id not in known and os.path.getmtime(path) < grace:
+                remove_staging_file(session_id)
+                removed += 1
+
+    if removed:
+        logger.info(f"🧹 [Upload] 已清理 {removed} 个过期的断点续传暂存文件")
+    return removed
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+进程内向量索引模块 (图库语义搜索)
+
+基于向量存储 (services/embedding_store.py) 中的归一化 CLIP 图像向量，按内积 (余弦相似度) 返回 top-k：
+- 向量数不超过 VECTOR_INDEX_BRUTE_FORCE_MAX 时分块暴力计算 (float16 → float32 分块转换，不额外占内存)
+- 更多时使用 IVF 倒排索引: 球面 k-means 聚类出 nlist 个中心，查询时只扫描最近的 nprobe 个簇
+  (100 万张图片、nlist≈1000、nprobe=16 时每次约扫描 1.6 万条向量)
+- 新上传的向量先作为"尾部"参与暴力扫描；尾部超过阈值时并入倒排表 (只做分配与排序，不重新训练)；
+  总量比上次训练时翻倍后在后台线程重新训练，训练期间继续使用旧索引
+"""
+import logging
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .. import config
+from . import embedding_store
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_ROWS = 65536
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """每行最近 (内积最大) 的中心编号，分块计算"""
+    assign = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), _CHUNK_ROWS):
+        block = np.asarray(data[start:start + _CHUNK_ROWS], dtype=np.float32)
+        assign[start:start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return assign
+
+
+def _spherical_kmeans(sample: np.ndarray, nlist: int, iterations: int, seed: int = 0) -> np.ndarray:
+    """球面 k-means (中心归一化，按内积分配)，返回 [nlist, dim] 的中心"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroids(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums
+        # 空簇重新随机取点
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+class _IvfIndex:
+    """不可变的倒排表快照: 中心 + 按簇排序的行号"""
+
+    def __init__(self, centroids: np.ndarray, assign: np.ndarray):
+        self.centroids = centroids
+        self.rows = len(assign)
+        self.order = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=len(centroids))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.assign = assign
+
+    def extend(self, new_assign: np.ndarray) -> "_IvfIndex":
+        return _IvfIndex(self.centroids, np.concatenate((self.assign, new_assign)))
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = np.argpartition(-(self.centroids @ query), min(nprobe, len(self.centroids)) - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[p]:self.offsets[p + 1]] for p in probes])
+
+
+class VectorIndex:
+    """单个模型向量存储上的索引"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.store = embedding_store.get_store(name)
+        self._lock = threading.Lock()
+        self._ivf: Optional[_IvfIndex] = None
+        self._training = False
+        self._trained_rows = 0
+
+    def _maybe_update(self, hashes: list, matrix: np.ndarray) -> Optional[_IvfIndex]:
+        """按当前规模决定: 暴力扫描 / 并入尾部 / 后台重新训练"""
+        total = len(hashes)
+        with self._lock:
+            ivf = self._ivf
+            if total <= config.VECTOR_INDEX_BRUTE_FORCE_MAX:
+                return None
+            if (ivf is None or total >= 2 * self._trained_rows) and not self._training:
+                self._training = True
+                threading.Thread(target=self._train, args=(matrix,), name=f"ivf-train-{self.name}", daemon=True).start()
+            if ivf is not None and total - ivf.rows >= config.VECTOR_INDEX_TAIL_MAX:
+                tail = matrix[ivf.rows:total]
+                ivf = self._ivf = ivf.extend(_nearest_centroids(tail, ivf.centroids))
+            return ivf
+
+    def _train(self, matrix: np.ndarray) -> None:
+        started = time.perf_counter()
+        try:
+            total = len(matrix)
+            nlist = int(min(config.VECTOR_INDEX_MAX_LISTS, max(16, np.sqrt(total))))
+            rng = np.random.default_rng(0)
+            sample_size = min(total, nlist * 64)
+            sample = np.asarray(matrix[np.sort(rng.choice(total, sample_size, replace=False))], dtype=np.float32)
+            centroids = _spherical_kmeans(sample, nlist, iterations=10)
+            ivf = _IvfIndex(centroids, _nearest_centroids(matrix, centroids))
+            with self._lock:
+                self._ivf = ivf
+                self._trained_rows = total
+            logger.info(f"🧭 [VectorIndex] {self.name}: {total} 条向量，{nlist} 个簇，训练耗时 {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"❌ [VectorIndex] {self.name} 训练失败: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._training = False
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """返回 [(内容哈希, 相似度)]，按相似度降序 (阻塞调用，在 CPU 线程池中执行)"""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        hashes, matrix = self.store.matrix()
+        if not hashes:
+            return []
+        ivf = self._maybe_update(hashes, matrix)
+
+        if ivf is None:
+            rows = None  # 全量暴力扫描
+        else:
+            # 倒排表候选 + 尚未并入的尾部
+            rows = np.concatenate((ivf.candidates(query, config.VECTOR_INDEX_NPROBE), np.arange(ivf.rows, len(hashes))))
+
+        if rows is None:
+            scores = np.empty(len(hashes), dtype=np.float32)
+            for start in range(0, len(hashes), _CHUNK_ROWS):
+                block = np.asarray(matrix[start:start + _CHUNK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+            rows = np.arange(len(hashes))
+        else:
+            rows.sort()  # 按行号顺序读取内存映射，减少随机访问
+            scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(hashes[rows[i]], float(scores[i])) for i in top]
+
+    def stats(self) -> dict:
+        with self._lock:
+            ivf = self._ivf
+            return {
+                "vectors": len(self.store),
+                "mode": "ivf" if ivf is not None else "brute_force",
+                "lists": len(ivf.centroids) if ivf is not None else 0,
+                "indexed_rows": ivf.rows if ivf is not None else 0,
+                "training": self._training,
+            }
+
+
+def encode_text(name: str, text: str) -> np.ndarray:
+    """文本查询的归一化 CLIP 向量 (阻塞调用): 启用模型进程池时在模型进程中计算，否则在本进程加载文本塔"""
+    from .. import audit
+    from . import audit_pool
+
+    pool = audit_pool.get_pool()
+    if pool is not None:
+        return pool.encode_text(name, [text])[0]
+    return audit.encode_texts(name, [text])[0]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name: str) -> VectorIndex:
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None:
+            index = _indexes[name] = VectorIndex(name)
+        return index
+
+
+def get_index_stats() -> dict:
+    return {name: index.stats() for name, index in list(_indexes.items())}
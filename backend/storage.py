@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 import os
 import mimetypes
+from io import BytesIO
 import logging
-from typing import Any, Optional
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, BinaryIO, Optional, Tuple, Union
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import ClientError, EndpointConnectionError, NoCredentialsError
 
+from . import config
+from . import database
+from .services.object_cache import CachedObject, DiskLRU, MemoryLRU, NegativeCache, ObjectCache, SingleFlight
+
 logger = logging.getLogger(__name__)
 
 # 全局 S3 客户端实例
@@ -18,6 +28,24 @@ MINIO_BUCKET_NAME = "images"  # 默认值，会从环境变量更新
 # 注意: 这是懒加载的，需要先调用 get_s3_client() 初始化
 minio_client = None  # 将在 get_s3_client() 中更新
 
+# 图片读穿缓存 (懒加载，首次访问时从磁盘重建索引)
+_image_cache: Optional[ObjectCache] = None
+_image_cache_lock = threading.Lock()
+
+# 跨进程失效: 已处理到的 deleted_objects id 与轮询线程
+_deletions_last_id = 0
+_deletions_thread: Optional[threading.Thread] = None
+
+# 回源合并: 同一个键同时只有一个 get_object 在执行
+_fetch_flight = SingleFlight()
+# 负缓存: 最近确认不存在的键 (上传写入该键时失效)
+_missing_objects = NegativeCache(config.NEGATIVE_CACHE_MAX_ENTRIES, config.NEGATIVE_CACHE_TTL_SECONDS)
+
+# 预签名专用客户端 (使用浏览器可访问的公网地址) 与按键缓存的预签名 URL
+_presign_client: Optional[Any] = None
+_presigned_urls: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_presigned_lock = threading.Lock()
+
 
 def get_s3_client() -> Optional[Any]:
     """获取 S3 客户端实例（延迟初始化）"""
@@ -38,7 +66,11 @@ def get_s3_client() -> Optional[Any]:
             endpoint_url=minio_endpoint,
             aws_access_key_id=minio_access_key,
             aws_secret_access_key=minio_secret_key,
-            config=Config(signature_version="s3v4")
+            config=Config(
+                signature_version="s3v4",
+                # 连接池需覆盖 S3 I/O 线程池与分片并发上传，默认的 10 个连接会互相排队
+                max_pool_connections=max(10, config.S3_IO_WORKERS + config.MULTIPART_MAX_CONCURRENCY),
+            )
         )
         
         # [FIX] 确保存储桶存在
@@ -93,12 +125,32 @@ def _create_bucket_with_policy(s3_client, bucket_name):
     except EndpointConnectionError as e:
         logger.error(f"❌ 创建存储桶失败 (网络错误): {e}")
 
-def upload_to_minio(data: bytes, name: str, fhash: str) -> dict[str, Any]:
+def _payload_size(data: Union[bytes, BinaryIO]) -> int:
+    """上传内容的字节数 (文件对象通过 seek 到末尾获取)"""
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    data.seek(0, os.SEEK_END)
+    size = data.tell()
+    data.seek(0)
+    return size
+
+
+def get_transfer_config() -> TransferConfig:
+    """分片上传参数 (阈值 / 分片大小 / 并发数)"""
+    return TransferConfig(
+        multipart_threshold=config.MULTIPART_THRESHOLD,
+        multipart_chunksize=config.MULTIPART_CHUNK_SIZE,
+        max_concurrency=config.MULTIPART_MAX_CONCURRENCY,
+        use_threads=config.MULTIPART_MAX_CONCURRENCY > 1,
+    )
+
+
+def upload_to_minio(data: Union[bytes, BinaryIO], name: str, fhash: str) -> dict[str, Any]:
     """
     上传文件到 MinIO 存储
 
     Args:
-        data: 文件内容
+        data: 文件内容，或可 seek 的文件对象 (如上传 spool，从开头读取，不会整体读入内存)
         name: 原始文件名
         fhash: 文件哈希值
 
@@ -123,12 +175,34 @@ def upload_to_minio(data: bytes, name: str, fhash: str) -> dict[str, Any]:
             else:
                 content_type = "application/octet-stream"
 
-        s3.put_object(
-            Bucket=MINIO_BUCKET_NAME,
-            Key=key,
-            Body=data,
-            ContentType=content_type
-        )
+        # 写入前后都清除负缓存，避免并发的 404 查询把刚写入的键重新标记为不存在
+        _missing_objects.discard(key)
+        size = _payload_size(data)
+        if size < config.MULTIPART_THRESHOLD:
+            # 小文件: 单次 PUT，延迟最低
+            if hasattr(data, "seek"):
+                data.seek(0)
+            s3.put_object(
+                Bucket=MINIO_BUCKET_NAME,
+                Key=key,
+                Body=data,
+                ContentType=content_type
+            )
+        else:
+            # [Perf] 大文件: 分片并发上传，单个分片失败只重试该分片；
+            # 整体失败时 s3transfer 会 abort 未完成的分片上传，进程崩溃遗留的由 sweep_abandoned_multipart_uploads 清理
+            if isinstance(data, (bytes, bytearray)):
+                data = BytesIO(data)
+            data.seek(0)
+            s3.upload_fileobj(
+                data,
+                MINIO_BUCKET_NAME,
+                key,
+                ExtraArgs={"ContentType": content_type},
+                Config=get_transfer_config(),
+            )
+            logger.info(f"📦 [MyCloud] 分片上传完成: {key} ({size / 1024 / 1024:.1f}MB)")
+        _missing_objects.discard(key)
 
         url = f"/mycloud/{key}"  # 使用相对路径代理
 
@@ -171,12 +245,13 @@ def upload_to_minio(data: bytes, name: str, fhash: str) -> dict[str, Any]:
         }
 
 
-def get_minio_object(object_name: str) -> dict[str, Any]:
+def get_minio_object(object_name: str, byte_range: Optional[str] = None) -> dict[str, Any]:
     """
     从 MinIO 获取对象
 
     Args:
         object_name: 对象键名
+        byte_range: 可选的 HTTP Range 值 (如 "bytes=0-1023")，原样透传给 S3 做分段读取
 
     Returns:
         S3 对象响应
@@ -188,12 +263,17 @@ def get_minio_object(object_name: str) -> dict[str, Any]:
     if not s3:
         raise RuntimeError("MinIO 客户端未初始化")
 
+    params = {"Bucket": MINIO_BUCKET_NAME, "Key": object_name}
+    if byte_range:
+        params["Range"] = byte_range
+
     try:
-        obj = s3.get_object(Bucket=MINIO_BUCKET_NAME, Key=object_name)
+        obj = s3.get_object(**params)
         return obj
     except ClientError as e:
         error_code = e.response.get('Error', {}).get('Code', '')
         if error_code == 'NoSuchKey':
+            _missing_objects.add(object_name)
             logger.warning(f"❌ 对象不存在: {object_name}")
         else:
             logger.warning(f"❌ 读取对象失败 (S3 错误 {error_code}): {e}")
@@ -206,6 +286,38 @@ def get_minio_object(object_name: str) -> dict[str, Any]:
         raise
 
 
+def head_minio_object(object_name: str) -> dict[str, Any]:
+    """
+    获取 MinIO 对象的元数据 (HEAD 请求，不传输内容)
+
+    Args:
+        object_name: 对象键名
+
+    Returns:
+        S3 head_object 响应 (ContentLength / ContentType / LastModified / ETag 等)
+
+    Raises:
+        Exception: 对象不存在或请求失败时抛出
+    """
+    s3 = get_s3_client()
+    if not s3:
+        raise RuntimeError("MinIO 客户端未初始化")
+
+    try:
+        return s3.head_object(Bucket=MINIO_BUCKET_NAME, Key=object_name)
+    except ClientError as e:
+        error_code = e.response.get('Error', {}).get('Code', '')
+        if error_code in ('404', 'NoSuchKey', 'NotFound'):
+            _missing_objects.add(object_name)
+            logger.warning(f"❌ 对象不存在: {object_name}")
+        else:
+            logger.warning(f"❌ 读取对象元数据失败 (S3 错误 {error_code}): {e}")
+        raise
+    except EndpointConnectionError as e:
+        logger.error(f"❌ 读取对象元数据失败 (网络错误): {e}")
+        raise
+
+
 def delete_from_minio(object_name: str) -> bool:
     """
     从 MinIO 删除对象
@@ -223,6 +335,14 @@ def delete_from_minio(object_name: str) -> bool:
 
     try:
         s3.delete_object(Bucket=MINIO_BUCKET_NAME, Key=object_name)
+        # 删除是唯一需要让缓存失效的场景 (审核清理 / 管理员删除都经过这里)
+        invalidate_cached_object(object_name)
+        forget_presigned_url(object_name)
+        _missing_objects.add(object_name)
+        # 其他进程 (uvicorn worker / 独立审核进程) 的缓存由 deleted_objects 日志通知失效
+        database.record_deleted_object(
+            object_name, config.IMAGE_CACHE_FRESH_SECONDS + config.IMAGE_CACHE_STALE_SECONDS + 3600,
+        )
         return True
     except ClientError as e:
         error_code = e.response.get('Error', {}).get('Code', '')
@@ -234,3 +354,293 @@ def delete_from_minio(object_name: str) -> bool:
     except Exception as e:
         logger.error(f"❌ [MyCloud] 删除失败 (未知错误): {e}")
         return False
+
+
+
+def sweep_abandoned_multipart_uploads(max_age_seconds: int) -> int:
+    """
+    中止桶内发起时间超过 max_age_seconds 的未完成分片上传
+
+    进程在分片上传中途崩溃时，已上传的分片会一直占用 MinIO 空间，需要定期清理。
+
+    Returns:
+        中止的分片上传数量
+    """
+    s3 = get_s3_client()
+    if not s3:
+        return 0
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+    aborted = 0
+    try:
+        paginator = s3.get_paginator("list_multipart_uploads")
+        for page in paginator.paginate(Bucket=MINIO_BUCKET_NAME):
+            for upload in page.get("Uploads", []):
+                if upload["Initiated"] > cutoff:
+                    continue
+                try:
+                    s3.abort_multipart_upload(
+                        Bucket=MINIO_BUCKET_NAME, Key=upload["Key"], UploadId=upload["UploadId"]
+                    )
+                    aborted += 1
+                except ClientError as e:
+                    logger.warning(f"⚠️ [MyCloud] 中止分片上传失败 {upload['Key']}: {e}")
+    except (ClientError, EndpointConnectionError) as e:
+        logger.warning(f"⚠️ [MyCloud] 列出未完成的分片上传失败: {e}")
+    if aborted:
+        logger.info(f"🧹 [MyCloud] 已清理 {aborted} 个遗留的分片上传")
+    return aborted
+
+# ==================== 图片读穿缓存 ====================
+
+def get_image_cache() -> Optional[ObjectCache]:
+    """获取图片缓存实例（延迟初始化），未启用时返回 None"""
+    global _image_cache
+    if _image_cache is None and config.IMAGE_CACHE_ENABLED:
+        with _image_cache_lock:
+            if _image_cache is None:
+                try:
+                    disk = DiskLRU(
+                        config.IMAGE_CACHE_DIR,
+                        config.IMAGE_CACHE_DISK_MAX_BYTES,
+                        config.IMAGE_CACHE_DISK_MAX_OBJECT,
+                    )
+                except OSError as e:
+                    logger.error(f"❌ [Cache] 磁盘缓存目录不可用，仅启用内存缓存: {e}")
+                    disk = None
+                _image_cache = ObjectCache(
+                    memory=MemoryLRU(config.IMAGE_CACHE_MEMORY_MAX_BYTES, config.IMAGE_CACHE_MEMORY_MAX_OBJECT),
+                    disk=disk,
+                    fresh_seconds=config.IMAGE_CACHE_FRESH_SECONDS,
+                    stale_seconds=config.IMAGE_CACHE_STALE_SECONDS,
+                )
+                _start_deletion_sync()
+    return _image_cache
+
+
+def sync_deleted_objects() -> int:
+    """
+    读取 deleted_objects 中其他进程新登记的删除，把这些键移出本进程的缓存，返回处理的条目数
+
+    首次同步读取保留期内的全部条目: 重启后从磁盘重建的缓存索引里可能还有已删除的对象。
+    """
+    global _deletions_last_id
+    processed = 0
+    while True:
+        rows = database.get_deleted_objects_since(_deletions_last_id)
+        for row_id, object_name in rows:
+            invalidate_cached_object(object_name)
+            forget_presigned_url(object_name)
+            _deletions_last_id = row_id
+        processed += len(rows)
+        if len(rows) < 1000:
+            return processed
+
+
+def _start_deletion_sync() -> None:
+    """启动缓存失效轮询线程 (随缓存创建，每个进程一个)"""
+    global _deletions_thread
+
+    def _run():
+        while True:
+            try:
+                sync_deleted_objects()
+            except Exception as e:
+                logger.warning(f"⚠️ [Cache] 同步已删除对象失败: {e}")
+            time.sleep(config.IMAGE_CACHE_INVALIDATION_POLL_SECONDS)
+
+    _deletions_thread = threading.Thread(target=_run, name="cache-invalidation", daemon=True)
+    _deletions_thread.start()
+
+
+def object_exists(object_name: str) -> bool:
+    """通过 HEAD 判断对象是否仍然存在 (用于缓存后台重新验证)"""
+    try:
+        head_minio_object(object_name)
+        return True
+    except ClientError as e:
+        error_code = e.response.get('Error', {}).get('Code', '')
+        if error_code in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def get_cached_object(object_name: str) -> Union[CachedObject, dict[str, Any]]:
+    """
+    通过缓存读取对象 (读穿)
+
+    Args:
+        object_name: 对象键名
+
+    Returns:
+        命中或成功写入缓存时返回 CachedObject；
+        缓存未启用或对象超出缓存上限时返回原始 S3 响应 (调用方直接透传 Body)
+
+    Raises:
+        Exception: 对象不存在或读取失败时抛出 (同 get_minio_object)
+    """
+    cache = get_image_cache()
+    if cache is None:
+        return get_minio_object(object_name)
+
+    entry = cache.get(object_name, revalidate=object_exists)
+    if entry is not None:
+        return entry
+
+    # 并发未命中时只让一个请求回源，其余请求等待并共享写入缓存后的条目
+    result, shared = _fetch_flight.do(object_name, lambda: _fetch_into_cache(cache, object_name))
+    if shared and not isinstance(result, CachedObject):
+        # 超出缓存上限的对象只能透传，S3 响应流不能共享，各自回源
+        return get_minio_object(object_name)
+    return result
+
+
+def _fetch_into_cache(cache: ObjectCache, object_name: str) -> Union[CachedObject, dict[str, Any]]:
+    """回源读取对象并写入缓存，对象超出缓存上限时返回原始 S3 响应"""
+    obj = get_minio_object(object_name)
+    size = obj.get("ContentLength") or 0
+    if not cache.accepts(size):
+        return obj
+
+    last_modified = obj.get("LastModified")
+    entry = CachedObject(
+        key=object_name,
+        size=size,
+        content_type=obj.get("ContentType"),
+        last_modified=last_modified.timestamp() if last_modified else None,
+    )
+    body = obj["Body"]
+    try:
+        stored = cache.store(entry, body)
+    except Exception as e:
+        # 写缓存失败不影响本次请求，重新拉取一次直接透传
+        logger.warning(f"⚠️ [Cache] 写入缓存失败 {object_name}: {e}")
+        return get_minio_object(object_name)
+    finally:
+        body.close()
+    return stored if stored is not None else get_minio_object(object_name)
+
+
+def read_object_bytes(object_name: str) -> bytes:
+    """
+    读取对象的完整内容 (后台审核等内部使用)
+
+    已在缓存中时直接读取缓存，否则从 MinIO 读取；不回填缓存，避免待审核的图片挤占热点条目。
+
+    Raises:
+        Exception: 对象不存在或读取失败时抛出 (同 get_minio_object)
+    """
+    cached = peek_cached_object(object_name)
+    if cached is not None:
+        if cached.data is not None:
+            return cached.data
+        try:
+            with open(cached.path, "rb") as f:
+                return f.read()
+        except OSError:
+            pass  # 磁盘条目刚被淘汰，回源读取
+
+    body = get_minio_object(object_name)["Body"]
+    try:
+        return body.read()
+    finally:
+        body.close()
+
+
+def peek_cached_object(object_name: str) -> Optional[CachedObject]:
+    """只查询缓存，不回源"""
+    cache = get_image_cache()
+    return cache.peek(object_name) if cache else None
+
+
+def is_known_missing(object_name: str) -> bool:
+    """对象键是否在负缓存中 (最近确认不存在)"""
+    return _missing_objects.contains(object_name)
+
+
+def invalidate_cached_object(object_name: str) -> None:
+    """从缓存中移除对象"""
+    cache = get_image_cache()
+    if cache is not None:
+        cache.invalidate(object_name)
+
+
+def get_cache_stats() -> dict[str, Any]:
+    """缓存命中 / 未命中 / 淘汰统计"""
+    cache = get_image_cache()
+    stats: dict[str, Any] = {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
+    stats["single_flight"] = _fetch_flight.stats()
+    stats["negative_cache"] = _missing_objects.stats()
+    return stats
+
+
+# ==================== 预签名 URL (redirect 分发模式) ====================
+
+def get_presign_client() -> Optional[Any]:
+    """
+    获取用于生成预签名 URL 的 S3 客户端（延迟初始化）
+
+    预签名只做本地计算不发请求，但签名包含 Host，
+    所以要用浏览器实际访问的地址 (MINIO_PUBLIC_ENDPOINT) 创建客户端。
+    """
+    global _presign_client
+    if _presign_client is None:
+        if not get_s3_client():
+            return None
+        public_endpoint = config.MINIO_PUBLIC_ENDPOINT or os.getenv("MINIO_ENDPOINT")
+        _presign_client = boto3.client(
+            "s3",
+            endpoint_url=public_endpoint,
+            aws_access_key_id=os.getenv("MINIO_ACCESS_KEY"),
+            aws_secret_access_key=os.getenv("MINIO_SECRET_KEY"),
+            config=Config(signature_version="s3v4")
+        )
+    return _presign_client
+
+
+def get_presigned_url(object_name: str, content_type: Optional[str] = None) -> Optional[Tuple[str, int]]:
+    """
+    获取对象的预签名 GET URL (按键缓存，到期前 PRESIGNED_URL_REFRESH_MARGIN 秒重新签名)
+
+    Args:
+        object_name: 对象键名
+        content_type: 让 MinIO 返回的 Content-Type
+
+    Returns:
+        (预签名 URL, 剩余可用秒数)；客户端未初始化或签名失败时返回 None
+    """
+    now = time.time()
+    margin = config.PRESIGNED_URL_REFRESH_MARGIN
+    with _presigned_lock:
+        cached = _presigned_urls.get(object_name)
+        if cached is not None and cached[1] - margin > now:
+            _presigned_urls.move_to_end(object_name)
+            return cached[0], int(cached[1] - margin - now)
+
+    client = get_presign_client()
+    if not client:
+        return None
+
+    expires_in = config.PRESIGNED_URL_EXPIRES
+    params = {"Bucket": MINIO_BUCKET_NAME, "Key": object_name}
+    if content_type:
+        params["ResponseContentType"] = content_type
+    try:
+        url = client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+    except (ClientError, NoCredentialsError) as e:
+        logger.error(f"❌ [MyCloud] 生成预签名 URL 失败: {e}")
+        return None
+
+    expires_at = now + expires_in
+    with _presigned_lock:
+        _presigned_urls[object_name] = (url, expires_at)
+        _presigned_urls.move_to_end(object_name)
+        while len(_presigned_urls) > config.PRESIGNED_URL_CACHE_SIZE:
+            _presigned_urls.popitem(last=False)
+    return url, max(int(expires_in - margin), 0)
+
+
+def forget_presigned_url(object_name: str) -> None:
+    """对象删除后丢弃缓存的预签名 URL"""
+    with _presigned_lock:
+        _presigned_urls.pop(object_name, None)
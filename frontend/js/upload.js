@@ -58,6 +58,149 @@ function cleanUploadDataForExport(dataList) {
     return result;
 }
 
+// ============ 断点续传 (大文件分块上传) ============
+// 超过阈值的文件改用 /upload/sessions 分块上传，断网后从服务端记录的偏移继续
+var RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+var RESUMABLE_MAX_RETRIES = 8;
+
+function resumableHeaders(extra) {
+    var headers = extra || {};
+    var authToken = localStorage.getItem('token');
+    if (authToken) headers['Authorization'] = 'Bearer ' + authToken;
+    return headers;
+}
+
+async function readErrorDetail(resp) {
+    try {
+        var data = await resp.json();
+        return data.detail || data.error || ("服务器错误: " + resp.status);
+    } catch (e) {
+        return "服务器错误: " + resp.status;
+    }
+}
+
+function sleep(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+}
+
+// 分块上传文件，onProgress(0~1) 汇报进度，返回与 /upload 相同格式的结果
+async function uploadFileResumable(file, onProgress) {
+    // 同一文件 (名称 + 大小 + 修改时间) 的会话记在 localStorage，刷新页面后也能续传
+    var storeKey = 'uploadSession:' + file.name + ':' + file.size + ':' + file.lastModified;
+    var sessionId = localStorage.getItem(storeKey);
+    var chunkSize = 4 * 1024 * 1024;
+    var offset = 0;
+
+    if (sessionId) {
+        var probe = await fetch('/upload/sessions/' + sessionId, { headers: resumableHeaders() });
+        if (probe.ok) {
+            offset = (await probe.json()).offset;
+        } else {
+            sessionId = null;
+        }
+    }
+
+    if (!sessionId) {
+        var created = await fetch('/upload/sessions', {
+            method: 'POST',
+            headers: resumableHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({
+                filename: file.name,
+                size: file.size,
+                content_type: file.type || 'application/octet-stream',
+                shared_mode: !!window.uploadSharedMode
+            })
+        });
+        if (!created.ok) throw new Error(await readErrorDetail(created));
+        var session = await created.json();
+        sessionId = session.session_id;
+        chunkSize = session.chunk_size || chunkSize;
+        localStorage.setItem(storeKey, sessionId);
+    }
+
+    var retries = 0;
+    while (offset < file.size) {
+        onProgress(offset / file.size);
+        try {
+            var resp = await fetch('/upload/sessions/' + sessionId, {
+                method: 'PUT',
+                headers: resumableHeaders({ 'Upload-Offset': String(offset), 'Content-Type': 'application/offset+octet-stream' }),
+                body: file.slice(offset, offset + chunkSize)
+            });
+            if (resp.ok || resp.status === 409) {
+                // 409: 偏移不一致，以服务端记录为准
+                offset = (await resp.json()).offset;
+                retries = 0;
+                continue;
+            }
+            if (resp.status === 404) localStorage.removeItem(storeKey);
+            if (resp.status < 500) throw new Error(await readErrorDetail(resp));
+        } catch (e) {
+            if (!(e instanceof TypeError)) throw e; // 仅网络错误 (fetch 抛出 TypeError) 才重试
+        }
+
+        // 网络错误或 5xx: 指数退避后查询服务端偏移再继续
+        retries++;
+        if (retries > RESUMABLE_MAX_RETRIES) throw new Error("网络不稳定，请稍后重试 (已上传部分会保留)");
+        await sleep(Math.min(30000, 1000 * Math.pow(2, retries - 1)));
+        try {
+            var check = await fetch('/upload/sessions/' + sessionId, { headers: resumableHeaders() });
+            if (check.ok) offset = (await check.json()).offset;
+        } catch (e) {
+            // 仍然断网，下一轮继续重试
+        }
+    }
+
+    onProgress(1);
+    var done = await fetch('/upload/sessions/' + sessionId + '/complete', {
+        method: 'POST',
+        headers: resumableHeaders()
+    });
+    if (!done.ok) throw new Error(await readErrorDetail(done));
+    localStorage.removeItem(storeKey);
+    return await done.json();
+}
+
+// ============ 秒传 (哈希预检) ============
+// 上传前先提交浏览器计算的 sha256，服务端已有且审核通过的相同内容直接返回链接，不再传输文件
+// crypto.subtle.digest 不支持增量计算，需要把整个文件读入内存，超过阈值的文件跳过预检直接上传
+var INSTANT_UPLOAD_MAX_SIZE = 64 * 1024 * 1024;
+
+async function sha256Hex(file) {
+    var digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    var bytes = new Uint8Array(digest);
+    var hex = '';
+    for (var i = 0; i < bytes.length; i++) {
+        hex += ('0' + bytes[i].toString(16)).slice(-2);
+    }
+    return hex;
+}
+
+// 命中时返回与 /upload 相同格式的结果，否则返回 null (任何异常都回退为正常上传)
+async function tryInstantUpload(file) {
+    // crypto.subtle 仅在 HTTPS / localhost 下可用
+    if (!window.crypto || !window.crypto.subtle) return null;
+    if (file.size > INSTANT_UPLOAD_MAX_SIZE) return null;
+    try {
+        var hash = await sha256Hex(file);
+        var resp = await fetch('/upload/precheck', {
+            method: 'POST',
+            headers: resumableHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({
+                sha256: hash,
+                size: file.size,
+                filename: file.name,
+                shared_mode: !!window.uploadSharedMode
+            })
+        });
+        if (!resp.ok) return null;
+        var res = await resp.json();
+        return res.exists ? res : null;
+    } catch (e) {
+        return null;
+    }
+}
+
 document.addEventListener('DOMContentLoaded', function () {
     // DOM 引用
     var dropArea = document.getElementById('uploadArea');
@@ -439,6 +582,23 @@ document.addEventListener('DOMContentLoaded', function () {
         var bar = wrapper.querySelector('.batch-progress-bar');
 
         try {
+            // 秒传: 相同内容已存在时直接完成
+            var instant = await tryInstantUpload(file);
+            if (instant) {
+                handleUploadSuccess(instant);
+                return;
+            }
+
+            // 大文件走断点续传，弱网断线后不必从头再传
+            if (file.size >= RESUMABLE_UPLOAD_THRESHOLD) {
+                uploadFileResumable(file, function (ratio) {
+                    bar.style.width = (ratio * 100) + '%';
+                }).then(handleUploadSuccess, function (err) {
+                    handleUploadError(file.name, err.message);
+                });
+                return;
+            }
+
             var formData = new FormData();
             formData.append('file', file);
             // 添加上传模式参数（私有/共享）
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+为旧图片补算感知哈希 (history.phash)
+
+用法: python tools/backfill_phash.py [--limit 0]
+
+逐个读取 phash 为空、存放在 MinIO 的图片 (按内容哈希去重)，计算 dHash 后写回同一哈希的全部记录。
+对象已不存在或无法解码的图片跳过。补算完成后重启服务，近重复索引才会加载这些旧记录。
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import database, storage
+from backend.services import phash
+
+
+def pending_images(limit: int) -> list:
+    with database.get_db_connection() as conn:
+        c = conn.cursor()
+        sql = "SELECT hash, MIN(url) FROM history WHERE phash IS NULL AND url LIKE '/mycloud/%' GROUP BY hash"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        c.execute(sql)
+        return c.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为旧图片补算感知哈希")
+    parser.add_argument("--limit", type=int, default=0, help="最多处理的图片数，0 表示全部")
+    args = parser.parse_args()
+
+    images = pending_images(args.limit)
+    print(f"待补算 {len(images)} 张图片")
+    start = time.perf_counter()
+    done = skipped = 0
+    for content_hash, url in images:
+        object_name = url.rsplit("/mycloud/", 1)[-1]
+        try:
+            content = storage.read_object_bytes(object_name)
+        except Exception as e:
+            print(f"  跳过 {content_hash}: 读取失败 ({e})")
+            skipped += 1
+            continue
+        value = phash.compute(io.BytesIO(content))
+        if value is None:
+            skipped += 1
+            continue
+        database.set_phash(content_hash, value)
+        done += 1
+        if done % 500 == 0:
+            print(f"  已补算 {done} 张 ({time.perf_counter() - start:.0f}s)")
+
+    print(f"\n完成: 补算 {done} 张，跳过 {skipped} 张，耗时 {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+审核推理微批处理的吞吐 / 延迟基准
+
+用法: python tools/bench_audit_batching.py [--images 64] [--concurrency 8] [--batch-sizes 1,4,8] [--wait-ms 20]
+
+用 --concurrency 个线程并发提交合成图片 (模拟多个审核任务同时进行)，
+对每个批大小分别构造 MicroBatcher，统计吞吐 (张/秒) 与单张延迟的 p50 / p95。
+批大小 1 即不合并的基线。模型选择 --model chinese_clip / openai_clip / nudenet。
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import audit
+from backend.services.batching import MicroBatcher
+
+from bench_clip_text_cache import make_images
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def prepare(model: str, images: list):
+    """返回 (批量函数, 待提交的条目)，条目与 check_image_safety 提交的一致 (预处理后的数组)"""
+    prepared = []
+    for image in images:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG")
+        prepared.append(audit.prepare_image(buffer.getvalue()))
+    if model == "nudenet":
+        return audit._nudenet_batch, [p.bgr() for p in prepared]
+    if model == "chinese_clip":
+        return audit._chinese_clip_batch, [p.array for p in prepared]
+    return audit._openai_clip_batch, [p.array for p in prepared]
+
+
+def run(batch_fn, items: list, batch_size: int, wait_ms: float, concurrency: int) -> dict:
+    batcher = MicroBatcher(f"bench-{batch_size}", batch_fn, batch_size, wait_ms)
+    batcher.submit(items[0])  # 预热 (模型加载 / 文本向量缓存)
+
+    latencies = []
+
+    def one(item):
+        start = time.perf_counter()
+        batcher.submit(item)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, items))
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    return {
+        "throughput": len(items) / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "mean": statistics.mean(latencies),
+        "avg_batch": stats["avg_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="审核推理微批处理基准")
+    parser.add_argument("--model", choices=["chinese_clip", "openai_clip", "nudenet"], default="chinese_clip")
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=8, help="并发提交的线程数")
+    parser.add_argument("--batch-sizes", default="1,4,8", help="逗号分隔的批大小列表")
+    parser.add_argument("--wait-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    images = make_images(args.images, args.size)
+    batch_fn, items = prepare(args.model, images)
+    print(f"[{args.model}] {len(items)} 张图片, 并发 {args.concurrency}, 凑批等待 {args.wait_ms}ms")
+    print(f"{'批大小':>6} {'吞吐(张/s)':>12} {'p50(ms)':>10} {'p95(ms)':>10} {'平均批大小':>10}")
+    for batch_size in (int(x) for x in args.batch_sizes.split(",")):
+        r = run(batch_fn, items, batch_size, args.wait_ms, args.concurrency)
+        print(f"{batch_size:>6} {r['throughput']:>12.2f} {r['p50'] * 1000:>10.1f} {r['p95'] * 1000:>10.1f} {r['avg_batch']:>10}")
+
+
+if __name__ == "__main__":
+    main()
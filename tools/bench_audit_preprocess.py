@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+审核预处理 (单次解码) 的 CPU 时间与内存基准
+
+用法: python tools/bench_audit_preprocess.py [--width 4000] [--height 3000] [--repeat 5]
+
+不加载模型，只比较审核前的图片解码 / 转换开销:
+- 旧路径: 尺寸预检查 + 完整解码转 RGB 后重新编码为 JPEG 临时文件 + NudeNet 从临时文件再解码
+  (此处以 Pillow 解码代替 cv2.imread) + 两个 CLIP 各自 Image.open 完整解码并转 RGB
+- 新路径: audit.prepare_image 一次解码 (JPEG draft / reduce 缩小、EXIF 方向、RGB) + NudeNet 用的 BGR 副本
+
+对大尺寸 JPEG 与 PNG 分别统计每次的 CPU 时间 (process_time)，
+并在独立子进程中统计峰值 RSS 增量 (Pillow 的像素缓冲区不经过 tracemalloc，RSS 更能反映真实分配)。
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from backend import audit
+
+
+def make_content(fmt: str, width: int, height: int) -> bytes:
+    """平滑渐变 + 噪声的大图 (接近照片的压缩率)"""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                     np.full((height, width), 128, np.float32)], axis=-1)
+    array = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def old_path(content: bytes) -> None:
+    Image.open(io.BytesIO(content)).size
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as tmp:
+        img_pil = Image.open(io.BytesIO(content))
+        if img_pil.mode != "RGB":
+            img_pil = img_pil.convert("RGB")
+        img_pil.save(tmp, format="JPEG")
+        tmp.flush()
+        np.asarray(Image.open(tmp.name).convert("RGB"))
+    for _ in range(2):
+        np.asarray(Image.open(io.BytesIO(content)).convert("RGB"))
+
+
+def new_path(content: bytes) -> None:
+    prepared = audit.prepare_image(content)
+    prepared.bgr()
+
+
+PATHS = {"old": old_path, "new": new_path}
+
+
+def max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def rss_probe(args) -> None:
+    """子进程: 只运行一条路径，输出峰值 RSS 增量"""
+    content = make_content(args.format, args.width, args.height)
+    baseline = max_rss_mb()
+    PATHS[args.rss_probe](content)
+    print(json.dumps({"delta_mb": max_rss_mb() - baseline}))
+
+
+def measure_rss(args, fmt: str, path: str) -> float:
+    cmd = [sys.executable, os.path.abspath(__file__), "--rss-probe", path, "--format", fmt,
+           "--width", str(args.width), "--height", str(args.height)]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])["delta_mb"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="审核预处理基准")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--format", default="JPEG", help=argparse.SUPPRESS)
+    parser.add_argument("--rss-probe", choices=list(PATHS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_probe:
+        rss_probe(args)
+        return
+
+    for fmt in ("JPEG", "PNG"):
+        content = make_content(fmt, args.width, args.height)
+        prepared = audit.prepare_image(content)
+        print(f"\n[{fmt}] {args.width}x{args.height}, {len(content) / 1024 / 1024:.1f}MB -> 预处理后 {prepared.array.shape[1]}x{prepared.array.shape[0]}")
+        for name, func in PATHS.items():
+            func(content)  # 预热
+            cpu_times = []
+            for _ in range(args.repeat):
+                start = time.process_time()
+                func(content)
+                cpu_times.append(time.process_time() - start)
+            rss = measure_rss(args, fmt, name)
+            print(f"  {name}: CPU {statistics.mean(cpu_times) * 1000:8.1f}ms/张  峰值 RSS 增量 {rss:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+CLIP ONNX 后端的一致性检查与延迟 / 内存基准
+
+用法: python tools/bench_clip_onnx.py [--fixtures 图片目录] [--images 20] [--model all|chinese|openai]
+
+1. 按需导出图像塔 (fp32 + int8) 与文本向量到 AUDIT_ONNX_DIR
+2. 在 fixture 图片 (未指定目录时用合成图片) 上对比 torch / onnx fp32 / onnx int8 的标签概率:
+   最大差值与 top-1 标签一致率，超过阈值时以非零状态退出
+3. 统计三条路径的单张延迟 (平均 / p95)，并在独立子进程中只加载一种后端，报告峰值 RSS
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from backend import audit
+from backend.services import clip_onnx
+
+from bench_clip_text_cache import make_images
+
+MODELS = {
+    "chinese": (audit.CHINESE_CLIP_MODEL_ID, audit.CHINESE_ALL_LABELS, audit.get_chinese_clip),
+    "openai": (audit.OPENAI_CLIP_MODEL_ID, audit.OPENAI_ALL_LABELS, audit.get_openai_clip),
+}
+
+
+def load_fixtures(args) -> list:
+    if not args.fixtures:
+        return make_images(args.images, args.size)
+    images = []
+    for name in sorted(os.listdir(args.fixtures)):
+        try:
+            images.append(Image.open(os.path.join(args.fixtures, name)).convert("RGB"))
+        except Exception:
+            continue
+    return images
+
+
+def max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def make_scorer(key: str, backend: str):
+    """返回 images -> 概率列表 的函数 (backend: torch / fp32 / int8)"""
+    model_id, labels, loader = MODELS[key]
+    if backend == "torch":
+        model, processor = loader()
+        return lambda images: audit.clip_label_probs_batch(model, processor, model_id, images, labels)
+    tower = clip_onnx.OnnxVisionTower(model_id, labels, quantize=(backend == "int8"))
+    return tower.label_probs
+
+
+def timed(scorer, images) -> tuple:
+    scorer(images[:1])  # 预热
+    latencies, probs = [], []
+    for image in images:
+        start = time.perf_counter()
+        probs.append(scorer([image])[0])
+        latencies.append(time.perf_counter() - start)
+    return latencies, probs
+
+
+def rss_probe(args) -> None:
+    """子进程: 只加载一种后端跑完 fixture，输出峰值 RSS"""
+    images = load_fixtures(args)
+    baseline = max_rss_mb()
+    scorer = make_scorer(args.model, args.rss_probe)
+    for image in images:
+        scorer([image])
+    print(json.dumps({"baseline_mb": baseline, "peak_mb": max_rss_mb()}))
+
+
+def measure_rss(args, key: str, backend: str) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--rss-probe", backend, "--model", key,
+           "--images", str(args.images), "--size", str(args.size)]
+    if args.fixtures:
+        cmd += ["--fixtures", args.fixtures]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def check_model(args, key: str, images: list) -> bool:
+    model_id, labels, loader = MODELS[key]
+    model, processor = loader()
+    if model is None:
+        print(f"⚠️ [{key}] torch 模型不可用，跳过")
+        return True
+    clip_onnx.export(model_id, labels, model, processor,
+                     audit.get_label_text_embeddings(model, processor, model_id, labels), quantize=True)
+
+    print(f"\n[{model_id}] {len(labels)} 个标签, {len(images)} 张图片")
+    results = {backend: timed(make_scorer(key, backend), images) for backend in ("torch", "fp32", "int8")}
+    ref_probs = results["torch"][1]
+    ok = True
+    for backend, (latencies, probs) in results.items():
+        line = f"  {backend:<5} 平均 {statistics.mean(latencies) * 1000:7.1f}ms  p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:7.1f}ms"
+        if backend != "torch":
+            max_diff = max(abs(a - b) for ref, got in zip(ref_probs, probs) for a, b in zip(ref, got))
+            top1 = sum(ref.index(max(ref)) == got.index(max(got)) for ref, got in zip(ref_probs, probs)) / len(probs)
+            tolerance = args.tolerance if backend == "fp32" else args.int8_tolerance
+            passed = max_diff <= tolerance and top1 >= args.min_top1
+            ok &= passed
+            line += f"  概率最大差值 {max_diff:.2e} (阈值 {tolerance})  top-1 一致 {top1 * 100:.1f}% {'✅' if passed else '❌'}"
+        print(line)
+
+    if not args.skip_rss:
+        for backend in ("torch", "fp32", "int8"):
+            rss = measure_rss(args, key, backend)
+            print(f"  {backend:<5} 峰值 RSS {rss['peak_mb']:.0f}MB (导入后 {rss['baseline_mb']:.0f}MB)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP ONNX 后端一致性检查与基准")
+    parser.add_argument("--model", default="all", choices=["all", "chinese", "openai"])
+    parser.add_argument("--fixtures", help="fixture 图片目录 (默认使用合成图片)")
+    parser.add_argument("--images", type=int, default=20, help="合成图片数量")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="fp32 允许的概率最大差值")
+    parser.add_argument("--int8-tolerance", type=float, default=0.05, help="int8 允许的概率最大差值")
+    parser.add_argument("--min-top1", type=float, default=0.95, help="top-1 标签最低一致率")
+    parser.add_argument("--skip-rss", action="store_true", help="不测 RSS (省去子进程重新加载模型)")
+    parser.add_argument("--rss-probe", choices=["torch", "fp32", "int8"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_probe:
+        rss_probe(args)
+        return
+
+    images = load_fixtures(args)
+    keys = ["chinese", "openai"] if args.model == "all" else [args.model]
+    ok = all([check_model(args, key, images) for key in keys])
+    if not ok:
+        print("\n❌ ONNX 后端与 torch 路径不一致")
+        sys.exit(1)
+    print("\n✅ ONNX 后端与 torch 路径一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+CLIP 标签文本向量缓存的收益与等价性检查
+
+用法: python tools/bench_clip_text_cache.py [--images 20] [--size 512]
+
+对同一批合成图片分别运行:
+- 原路径: model(text=labels, images=image)，每张图片都重新编码全部标签
+- 新路径: audit.clip_label_probs，只运行图像塔，与缓存的文本向量做矩阵乘法
+统计每张图片的 CPU 时间 (process_time) 与墙钟时间，并检查两条路径的 softmax 概率最大差值。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backend import audit
+
+
+def make_images(count: int, size: int) -> list:
+    """噪声图 + 纯色图 + 渐变图，覆盖不同的图像分布"""
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            array = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        elif kind == 1:
+            array = np.full((size, size, 3), rng.integers(0, 256, 3), dtype=np.uint8)
+        else:
+            ramp = np.linspace(0, 255, size, dtype=np.uint8)
+            array = np.stack([np.tile(ramp, (size, 1)), np.tile(ramp[:, None], (1, size)), np.full((size, size), 128, np.uint8)], axis=-1)
+        images.append(Image.fromarray(array))
+    return images
+
+
+def full_forward_probs(model, processor, image, labels) -> list:
+    """原路径: 文本塔 + 图像塔完整前向"""
+    inputs = processor(text=labels, images=image, return_tensors="pt", padding=True)
+    with torch.no_grad():
+        outputs = model(**inputs)
+    return outputs.logits_per_image.softmax(dim=1)[0].tolist()
+
+
+def measure(func, images) -> tuple:
+    cpu_times, wall_times, results = [], [], []
+    for image in images:
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        results.append(func(image))
+        cpu_times.append(time.process_time() - cpu_start)
+        wall_times.append(time.perf_counter() - wall_start)
+    return cpu_times, wall_times, results
+
+
+def bench_model(name, model, processor, model_id, labels, images, tolerance) -> bool:
+    # 预热 (同时填充文本向量缓存)
+    full_forward_probs(model, processor, images[0], labels)
+    audit.clip_label_probs(model, processor, model_id, images[0], labels)
+
+    old_cpu, old_wall, old_probs = measure(lambda img: full_forward_probs(model, processor, img, labels), images)
+    new_cpu, new_wall, new_probs = measure(lambda img: audit.clip_label_probs(model, processor, model_id, img, labels), images)
+
+    max_diff = max(abs(a - b) for old, new in zip(old_probs, new_probs) for a, b in zip(old, new))
+    saved = 1 - statistics.mean(new_cpu) / statistics.mean(old_cpu)
+    print(f"\n[{name}] {len(labels)} 个标签, {len(images)} 张图片")
+    print(f"  完整前向: CPU {statistics.mean(old_cpu) * 1000:.1f}ms/张, 墙钟 {statistics.mean(old_wall) * 1000:.1f}ms/张")
+    print(f"  缓存文本: CPU {statistics.mean(new_cpu) * 1000:.1f}ms/张, 墙钟 {statistics.mean(new_wall) * 1000:.1f}ms/张")
+    print(f"  节省 CPU 时间: {saved * 100:.1f}%  概率最大差值: {max_diff:.2e}")
+    return max_diff <= tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP 标签文本向量缓存基准")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="允许的概率最大差值")
+    args = parser.parse_args()
+
+    images = make_images(args.images, args.size)
+    ok = True
+    model, processor = audit.get_chinese_clip()
+    if model is not None:
+        ok &= bench_model("Chinese-CLIP", model, processor, audit.CHINESE_CLIP_MODEL_ID, audit.CHINESE_ALL_LABELS, images, args.tolerance)
+    model, processor = audit.get_openai_clip()
+    if model is not None:
+        ok &= bench_model("OpenAI-CLIP", model, processor, audit.OPENAI_CLIP_MODEL_ID, audit.OPENAI_ALL_LABELS, images, args.tolerance)
+
+    if not ok:
+        print(f"\n❌ 概率差值超过 {args.tolerance}")
+        sys.exit(1)
+    print("\n✅ 两条路径的概率一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+感知哈希索引 (多索引哈希) 的查询延迟基准
+
+用法: python tools/bench_phash_index.py [--sizes 1000,100000,1000000] [--radius 6] [--queries 2000]
+
+对不同规模的随机 64 位哈希，对比 HammingIndex.query 与逐条比较的单次查询延迟，并核对两者结果一致。
+上传路径上的黑名单比对与近重复查询都使用该结构。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.phash import HammingIndex, distance
+
+
+def perturb(value: int, bits: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="感知哈希索引查询延迟")
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--radius", type=int, default=6)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for size in (int(s) for s in args.sizes.split(",")):
+        values = [rng.getrandbits(64) for _ in range(size)]
+        index = HammingIndex()
+        start = time.perf_counter()
+        for i, value in enumerate(values):
+            index.add(value, str(i))
+        build = time.perf_counter() - start
+
+        # 一半查询是库中哈希的轻微变形 (命中)，一半是随机哈希 (未命中)
+        queries = [
+            perturb(rng.choice(values), rng.randint(0, args.radius), rng) if i % 2 else rng.getrandbits(64)
+            for i in range(args.queries)
+        ]
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.query(query, args.radius)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        latencies.sort()
+
+        # 逐条比较只抽查少量查询 (大规模时太慢)，同时核对结果
+        linear = []
+        for query in queries[:20]:
+            start = time.perf_counter()
+            expected = {v for v in values if distance(query, v) <= args.radius}
+            linear.append((time.perf_counter() - start) * 1e6)
+            assert expected == {v for v, _, _ in index.query(query, args.radius)}
+
+        print(
+            f"{size:>9} 条: 建索引 {build:.2f}s  MIH 平均 {statistics.mean(latencies):.0f}µs "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.0f}µs  逐条比较 {statistics.mean(linear) / 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+慢客户端压测: 大量慢速下载 /mycloud 图片时，/history 是否仍能及时响应
+
+用法: python tools/bench_slow_readers.py [--readers 500] [--duration 15]
+
+- 使用内存中的假 S3 (botocore StreamingBody，每次读取模拟少量网络延迟)，无需 MinIO
+- 关闭图片缓存，保证每个下载都走 S3 流式代理路径
+- 慢客户端把接收缓冲区调小并每隔一段时间才读取少量数据，服务端会被 TCP 背压阻塞
+- 同时周期性请求 /history，统计延迟分位数
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+_TMP_DIR = tempfile.mkdtemp(prefix="slow-readers-")
+os.environ["DATA_DIR"] = _TMP_DIR
+os.environ.setdefault("SECRET_KEY", "slow-readers-bench")
+os.environ["IMAGE_CACHE_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from botocore.response import StreamingBody
+
+from backend import storage
+from backend.main import app
+
+OBJECT_KEY = "0123456789abcdef0123456789abcdef.jpg"
+OBJECT_SIZE = 4 * 1024 * 1024
+
+
+class SlowRaw(io.BytesIO):
+    """模拟 S3 网络读取延迟"""
+
+    def read(self, size=-1):
+        time.sleep(0.002)
+        return super().read(size)
+
+
+class FakeS3:
+    def __init__(self):
+        self.data = os.urandom(OBJECT_SIZE)
+
+    def get_object(self, Bucket, Key, Range=None):
+        return {
+            "Body": StreamingBody(SlowRaw(self.data), len(self.data)),
+            "ContentLength": len(self.data),
+            "ContentType": "image/jpeg",
+            "LastModified": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        }
+
+
+async def slow_reader(port: int, stop: asyncio.Event, stats: dict):
+    """只读取很少数据的慢客户端"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    try:
+        await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+        reader, writer = await asyncio.open_connection(sock=sock)
+        writer.write(f"GET /mycloud/{OBJECT_KEY} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+        await writer.drain()
+        stats["connected"] += 1
+        while not stop.is_set():
+            chunk = await reader.read(1024)
+            if not chunk:
+                break
+            stats["bytes"] += len(chunk)
+            await asyncio.sleep(0.2)
+        writer.close()
+    except OSError:
+        stats["errors"] += 1
+        sock.close()
+
+
+async def probe_history(port: int, stop: asyncio.Event, latencies: list):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+        while not stop.is_set():
+            start = time.perf_counter()
+            r = await client.get("/history")
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.1)
+
+
+async def run_bench(port: int, readers: int, duration: float):
+    stop = asyncio.Event()
+    stats = {"connected": 0, "bytes": 0, "errors": 0}
+    baseline, loaded = [], []
+
+    # 空载基线
+    probe = asyncio.create_task(probe_history(port, stop, baseline))
+    await asyncio.sleep(2)
+    stop.set()
+    await probe
+
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(slow_reader(port, stop, stats)) for _ in range(readers)]
+    await asyncio.sleep(2)  # 等待连接建立、服务端缓冲区写满
+    probe = asyncio.create_task(probe_history(port, stop, loaded))
+    await asyncio.sleep(duration)
+    stop.set()
+    await probe
+    await asyncio.gather(*tasks)
+    return stats, baseline, loaded
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="慢客户端下载 + /history 延迟压测")
+    parser.add_argument("--readers", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--port", type=int, default=18765)
+    parser.add_argument("--max-p95", type=float, default=0.5, help="/history p95 延迟上限 (秒)")
+    args = parser.parse_args()
+
+    # 每个慢客户端在本进程内占用两个 fd (客户端 + 服务端)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.readers * 2 + 256)), hard))
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    storage.get_s3_client = lambda fake=FakeS3(): fake
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    stats, baseline, loaded = asyncio.run(run_bench(args.port, args.readers, args.duration))
+    server.should_exit = True
+    thread.join(timeout=10)
+
+    print(f"\n慢客户端: {stats['connected']}/{args.readers} 已连接, 错误 {stats['errors']}, 共读取 {stats['bytes'] / 1024:.0f} KB")
+    for name, values in (("空载", baseline), ("负载", loaded)):
+        print(
+            f"/history {name}: {len(values)} 次, "
+            f"p50={statistics.median(values) * 1000:.1f}ms "
+            f"p95={percentile(values, 95) * 1000:.1f}ms "
+            f"max={max(values) * 1000:.1f}ms"
+        )
+
+    p95 = percentile(loaded, 95)
+    if stats["connected"] < args.readers or p95 > args.max_p95:
+        print(f"❌ 未通过 (p95 上限 {args.max_p95 * 1000:.0f}ms)")
+        sys.exit(1)
+    print("✅ 通过: 慢客户端没有拖慢 /history")
+
+
+if __name__ == "__main__":
+    main()
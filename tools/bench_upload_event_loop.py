@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+上传事件循环延迟回归测试: 大量并发上传时，事件循环是否仍能及时调度，/health 是否仍能及时响应
+
+用法: python tools/bench_upload_event_loop.py [--uploads 64] [--concurrency 16]
+
+- 使用内存中的假 S3 (put_object 模拟慢速 MinIO 写入)，无需 MinIO
+- 审核模型替换为直接通过，只测量上传路径本身
+- 在服务端事件循环中运行一个定时任务，统计实际唤醒时间与预期时间的差值 (事件循环延迟)
+- 同时周期性请求 /health，统计延迟分位数
+- 任何一个阻塞调用回到事件循环 (SQLite / PIL / put_object)，延迟都会接近单次调用的耗时，测试失败
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+_TMP_DIR = tempfile.mkdtemp(prefix="upload-loop-")
+os.environ["DATA_DIR"] = _TMP_DIR
+os.environ.setdefault("SECRET_KEY", "upload-loop-bench")
+os.environ["IMAGE_CACHE_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from PIL import Image
+
+from backend import audit, config, storage
+from backend.main import app
+
+
+class SlowS3:
+    """模拟慢速 MinIO 写入"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        Body.read()
+        time.sleep(self.delay)
+        return {"ETag": '"bench"'}
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": 0}
+
+
+def make_images(count: int, side: int) -> list:
+    """预先生成内容各不相同的 PNG (随机噪声)，避免命中去重快速路径"""
+    images = []
+    for _ in range(count):
+        buf = io.BytesIO()
+        Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buf, format="PNG")
+        images.append(buf.getvalue())
+    return images
+
+
+async def monitor_loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    """在服务端事件循环中运行: 记录每次 sleep 的超时量"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start - interval))
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        r = await client.get("/health")
+        r.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def run_uploads(client: httpx.AsyncClient, images: list, concurrency: int, results: dict):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload_one(index: int, content: bytes):
+        async with semaphore:
+            r = await client.post(
+                "/upload",
+                files={"file": (f"bench_{index}.png", content, "image/png")},
+                data={"shared_mode": "true"},
+            )
+            results["ok" if r.status_code == 200 else "failed"] += 1
+
+    await asyncio.gather(*(upload_one(i, content) for i, content in enumerate(images)))
+
+
+async def run_bench(port: int, images: list, concurrency: int, server_loop, loop_lags: list):
+    baseline, loaded = [], []
+    results = {"ok": 0, "failed": 0}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+        # 空载基线
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop, baseline))
+        await asyncio.sleep(1)
+        stop.set()
+        await probe
+
+        # 服务端事件循环延迟只在上传期间统计
+        monitor_stop = asyncio.Event()
+        monitor = asyncio.run_coroutine_threadsafe(monitor_loop_lag(monitor_stop, loop_lags), server_loop)
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop, loaded))
+        start = time.perf_counter()
+        await run_uploads(client, images, concurrency, results)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+
+        server_loop.call_soon_threadsafe(monitor_stop.set)
+        await asyncio.wrap_future(monitor)
+    return results, elapsed, baseline, loaded
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发上传 + 事件循环延迟 / /health 延迟回归测试")
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--side", type=int, default=768, help="测试图片边长 (像素)")
+    parser.add_argument("--put-delay", type=float, default=0.5, help="模拟单次 MinIO PUT 耗时 (秒)")
+    parser.add_argument("--port", type=int, default=18766)
+    parser.add_argument("--max-lag", type=float, default=0.1, help="事件循环最大延迟上限 (秒)")
+    parser.add_argument("--max-p95", type=float, default=0.25, help="/health p95 延迟上限 (秒)")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    storage.get_s3_client = lambda fake=SlowS3(args.put_delay): fake
+    audit.check_image_safety = lambda content: {"safe": True, "reason": ""}
+    config.UPLOAD_LIMIT_ANONYMOUS = args.uploads * 2
+
+    print(f"生成 {args.uploads} 张 {args.side}x{args.side} 测试图片...")
+    images = make_images(args.uploads, args.side)
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=server_loop.run_until_complete, args=(server.serve(),), daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    loop_lags = []
+    results, elapsed, baseline, loaded = asyncio.run(
+        run_bench(args.port, images, args.concurrency, server_loop, loop_lags)
+    )
+    server.should_exit = True
+    thread.join(timeout=10)
+
+    print(f"\n上传: 成功 {results['ok']}, 失败 {results['failed']}, 耗时 {elapsed:.1f}s")
+    print(
+        f"事件循环延迟: {len(loop_lags)} 次采样, "
+        f"p50={statistics.median(loop_lags) * 1000:.1f}ms "
+        f"p99={percentile(loop_lags, 99) * 1000:.1f}ms "
+        f"max={max(loop_lags) * 1000:.1f}ms"
+    )
+    for name, values in (("空载", baseline), ("负载", loaded)):
+        print(
+            f"/health {name}: {len(values)} 次, "
+            f"p50={statistics.median(values) * 1000:.1f}ms "
+            f"p95={percentile(values, 95) * 1000:.1f}ms "
+            f"max={max(values) * 1000:.1f}ms"
+        )
+
+    if results["failed"] or max(loop_lags) > args.max_lag or percentile(loaded, 95) > args.max_p95:
+        print(f"❌ 未通过 (事件循环延迟上限 {args.max_lag * 1000:.0f}ms, /health p95 上限 {args.max_p95 * 1000:.0f}ms)")
+        sys.exit(1)
+    print("✅ 通过: 并发上传没有阻塞事件循环")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+图片分发策略响应头自检 (无需 nginx / Apache / MinIO)
+
+用法: python tools/check_delivery_headers.py
+
+用内存中的假 S3 客户端替代 MinIO，逐个切换分发模式，
+检查 X-Accel-Redirect / X-Sendfile / 跳转等响应头是否正确。
+"""
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+# 测试数据放到临时目录，避免污染项目数据
+_TMP_DIR = tempfile.mkdtemp(prefix="delivery-check-")
+os.environ["DATA_DIR"] = _TMP_DIR
+os.environ.setdefault("SECRET_KEY", "delivery-check")
+os.environ["IMAGE_CACHE_MEMORY_MAX_OBJECT"] = "1024"  # 小于 1KB 的对象进内存层，其余落盘
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+
+from backend import config, storage
+from backend.main import app
+from backend.services import delivery
+
+LARGE_KEY = "0123456789abcdef0123456789abcdef.png"
+SMALL_KEY = "fedcba9876543210fedcba9876543210.png"
+OBJECTS = {LARGE_KEY: b"\x89PNG" + b"x" * 4096, SMALL_KEY: b"\x89PNG" + b"y" * 16}
+
+
+class FakeS3:
+    """只实现分发路径用到的几个方法"""
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Key not in OBJECTS:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        data = OBJECTS[Key]
+        return {
+            "Body": io.BytesIO(data),
+            "ContentLength": len(data),
+            "ContentType": "image/png",
+            "LastModified": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        }
+
+    def head_object(self, Bucket, Key):
+        if Key not in OBJECTS:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(OBJECTS[Key]), "ContentType": "image/png"}
+
+
+class TestDeliveryHeaders(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        storage.get_s3_client = lambda: FakeS3()
+        cls.client = TestClient(app)
+        cls.client.__enter__()  # 触发 lifespan，初始化数据库
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+        shutil.rmtree(_TMP_DIR, ignore_errors=True)
+
+    def use_mode(self, mode: str, **overrides):
+        for name, value in overrides.items():
+            setattr(config, name, value)
+        config.IMAGE_DELIVERY_MODE = mode
+        delivery._active_strategy = None
+        storage._image_cache = None
+        shutil.rmtree(config.IMAGE_CACHE_DIR, ignore_errors=True)
+
+    def assert_image_headers(self, response):
+        self.assertEqual(response.headers["content-type"], "image/png")
+        self.assertIn("immutable", response.headers["cache-control"])
+        self.assertEqual(response.headers["etag"], f'"{LARGE_KEY[:32]}"')
+
+    def test_accel_cache_file(self):
+        """accel: 大对象回源落盘后指向 internal cache location"""
+        self.use_mode("accel", ACCEL_REDIRECT_CACHE_PREFIX="/_image_cache/", ACCEL_REDIRECT_MINIO_PREFIX="")
+        r = self.client.get(f"/mycloud/{LARGE_KEY}")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, b"")
+        target = r.headers["x-accel-redirect"]
+        self.assertTrue(target.startswith("/_image_cache/"))
+        cached_file = os.path.join(config.IMAGE_CACHE_DIR, target[len("/_image_cache/"):])
+        with open(cached_file, "rb") as f:
+            self.assertEqual(f.read(), OBJECTS[LARGE_KEY])
+        self.assert_image_headers(r)
+
+    def test_accel_minio_location(self):
+        """accel: 未缓存且配置了 MinIO internal location 时直接指向 MinIO"""
+        self.use_mode("accel", ACCEL_REDIRECT_MINIO_PREFIX="/_minio/")
+        r = self.client.get(f"/mycloud/{LARGE_KEY}")
+        self.assertEqual(r.headers["x-accel-redirect"], f"/_minio/{storage.MINIO_BUCKET_NAME}/{LARGE_KEY}")
+        self.assert_image_headers(r)
+
+    def test_sendfile(self):
+        """sendfile: 指向磁盘缓存文件的绝对路径"""
+        self.use_mode("sendfile")
+        r = self.client.get(f"/mycloud/{LARGE_KEY}")
+        path = r.headers["x-sendfile"]
+        self.assertTrue(os.path.isabs(path))
+        self.assertTrue(path.startswith(os.path.abspath(config.IMAGE_CACHE_DIR)))
+        self.assert_image_headers(r)
+
+    def test_memory_tier_falls_back_to_proxy(self):
+        """小对象只在内存层，没有文件可交给前端服务器，回退为应用直接返回"""
+        self.use_mode("sendfile")
+        r = self.client.get(f"/mycloud/{SMALL_KEY}")
+        self.assertNotIn("x-sendfile", r.headers)
+        self.assertEqual(r.content, OBJECTS[SMALL_KEY])
+
+    def test_conditional_request_skips_strategy(self):
+        """条件请求命中时仍然直接 304，不经过分发策略"""
+        self.use_mode("accel")
+        r = self.client.get(f"/mycloud/{LARGE_KEY}", headers={"If-None-Match": f'"{LARGE_KEY[:32]}"'})
+        self.assertEqual(r.status_code, 304)
+        self.assertNotIn("x-accel-redirect", r.headers)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+标签变化后的离线重评
+
+用法: python tools/rescore_audit_labels.py [--model all|chinese_clip|openai_clip] [--report]
+
+用向量存储 (AUDIT_EMBEDDING_DIR) 中保存的 CLIP 图像向量和 audit.py 当前的标签 / 阈值重新分类全部图片，
+不访问 MinIO、不运行图像塔。只列出仍在图库中的图片；加 --report 时为每张命中的图片登记一条
+待处理举报，由管理员在后台复核删除 (已有待处理举报的图片不重复登记)。
+
+没有向量的图片不参与重评，每个模型会报告图库中缺少向量的图片数量：启用级联 (AUDIT_CASCADE_ENABLED) 时
+预筛提前放行的图片不运行 Chinese-CLIP，也就没有 chinese_clip 向量；向量存储启用之前审核的图片两个模型都没有。
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import database
+from backend.services import embedding_store, rescore
+
+
+def has_pending_report(image_hash: str) -> bool:
+    with database.get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM abuse_reports WHERE image_hash = ? AND status = 'pending' LIMIT 1", (image_hash,))
+        return c.fetchone() is not None
+
+
+def gallery_hashes() -> set:
+    with database.get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT DISTINCT hash FROM history WHERE hash IS NOT NULL")
+        return {row[0] for row in c.fetchall()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用已保存的 CLIP 图像向量按当前标签离线重评")
+    parser.add_argument("--model", default="all", choices=["all", *rescore.MODELS])
+    parser.add_argument("--report", action="store_true", help="为命中的图片登记待处理举报")
+    args = parser.parse_args()
+
+    names = list(rescore.MODELS) if args.model == "all" else [args.model]
+    gallery = gallery_hashes()
+    total = 0
+    for name in names:
+        start = time.perf_counter()
+        flagged = rescore.rescore(name)
+        print(f"\n[{name}] 重评耗时 {time.perf_counter() - start:.2f}s，命中 {len(flagged)} 张")
+        stored, _ = embedding_store.get_store(name).matrix()
+        missing = len(gallery.difference(stored))
+        if missing:
+            print(f"  ⚠️ 图库中 {missing}/{len(gallery)} 张图片没有 {name} 向量，未参与重评 (级联提前放行或早于向量存储)")
+        for item in flagged:
+            image = database.get_image_by_hash(item["hash"])
+            if image is None:
+                continue  # 已删除
+            total += 1
+            print(f"  {item['hash']}  {item['label']} ({item['score']:.2f})  {image['url']}")
+            if args.report and not has_pending_report(item["hash"]):
+                database.create_abuse_report(
+                    image_hash=item["hash"],
+                    image_url=image["url"],
+                    reason=f"标签重评 ({name}): {item['label']} ({item['score']:.2f})",
+                )
+
+    print(f"\n共 {total} 张图库中的图片命中当前标签" + (" (已登记举报)" if args.report and total else ""))
+
+
+if __name__ == "__main__":
+    main()